@@ -0,0 +1,251 @@
+import os
+import re
+import json
+import uuid
+import zlib
+import threading
+import numpy as np
+import pandas as pd
+from utils.atomic import atomic_write
+
+
+# Mersenne prime used for universal hashing of 32-bit shingle hashes
+_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_NUMBER = re.compile(r"\d[\d,.]*")
+_WORD = re.compile(r"\w+")
+
+
+def chunk_id(text: str) -> str:
+    """ID a chunk is stored under in the vector db"""
+    return str(uuid.uuid5(uuid.NAMESPACE_DNS, text))
+
+
+def shingles(text: str, size: int = 5) -> np.ndarray:
+    """
+    Hashed word `size`-grams of `text`.
+    Numbers are collapsed first so chunks differing only by dates or figures still match.
+    """
+    words = _WORD.findall(_NUMBER.sub("0", text.lower()))
+    if len(words) < size:
+        grams = [" ".join(words)]
+    else:
+        grams = [" ".join(words[i:i + size]) for i in range(len(words) - size + 1)]
+    return np.fromiter((zlib.crc32(gram.encode("utf-8")) for gram in grams), dtype=np.uint64, count=len(grams))
+
+
+def _lsh_params(threshold: float, num_perm: int) -> tuple[int, int]:
+    """Pick (bands, rows) whose LSH S-curve midpoint (1/b)^(1/r) is closest to `threshold`."""
+    candidates = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    return min(candidates, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class NearDuplicateIndex:
+    """
+    MinHash LSH index of stored chunks, used to drop near-duplicate chunks before embedding.
+
+    Chunks are only compared with chunks of the same company (`group_column`),
+    since one index is shared by every ticker. A chunk whose estimated Jaccard
+    similarity to an indexed chunk is at least `threshold` is dropped, and its ID
+    is mapped to the canonical chunk's ID in `provenance`.
+
+    Chunks kept by `filter()` are staged: they are matched against right away,
+    but only become part of the index once `commit()` is called after they are
+    stored in the vector db. `rollback()` drops them again if storing fails,
+    and `save()` only persists committed chunks. These methods are thread safe,
+    so they can run off the event loop for tickers ingested concurrently.
+    """
+    def __init__(self, path: str = None, threshold: float = 0.8, num_perm: int = 128, shingle_size: int = 5, seed: int = 1, group_column: str = "company_name"):
+        self.path = path or os.path.join(os.getcwd(), "chroma_db", "near_duplicates")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.group_column = group_column
+        self.bands, self.rows = _lsh_params(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 31, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, 1 << 31, size=num_perm).astype(np.uint64)
+
+        # Parallel per position; a rolled back position keeps None as its ID
+        self.ids = []
+        self.groups = []
+        self.provenance = {}
+        self._signatures = []
+        self._buckets = {}
+        self._positions = {}
+        # Positions staged by filter() and dropped chunk ID -> (canonical ID, group), not committed yet
+        self._pending = set()
+        self._pending_provenance = {}
+        self._lock = threading.Lock()
+        self._load()
+
+
+    def signature(self, text: str) -> np.ndarray:
+        hashes = shingles(text, self.shingle_size)
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+    def _band_keys(self, signature: np.ndarray, group: str | None) -> list[tuple[str | None, int, bytes]]:
+        return [(group, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+
+    def _groups(self, chunk_df: pd.DataFrame) -> list[str | None]:
+        if self.group_column not in chunk_df:
+            return [None] * len(chunk_df)
+        return [str(group) if pd.notna(group) else None for group in chunk_df[self.group_column]]
+
+
+    def _add(self, doc_id: str, signature: np.ndarray, group: str | None, pending: bool = False):
+        position = len(self.ids)
+        self.ids.append(doc_id)
+        self.groups.append(group)
+        self._signatures.append(signature)
+        self._positions[(group, doc_id)] = position
+        if pending:
+            self._pending.add(position)
+        for key in self._band_keys(signature, group):
+            self._buckets.setdefault(key, []).append(position)
+
+
+    def _remove(self, position: int):
+        group = self.groups[position]
+        for key in self._band_keys(self._signatures[position], group):
+            self._buckets[key].remove(position)
+        del self._positions[(group, self.ids[position])]
+        self._pending.discard(position)
+        self.ids[position] = None
+
+
+    def find(self, signature: np.ndarray, group: str | None = None) -> str | None:
+        """ID of the most similar indexed chunk of `group` at or above the threshold, if any."""
+        candidates = {position for key in self._band_keys(signature, group) for position in self._buckets.get(key, ())}
+        best, best_score = None, self.threshold
+        for position in candidates:
+            score = float(np.mean(self._signatures[position] == signature))
+            if score >= best_score:
+                best, best_score = position, score
+        return self.ids[best] if best is not None else None
+
+
+    def filter(self, chunk_df: pd.DataFrame, text_column: str = "content_chunk") -> tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Split `chunk_df` into kept chunks and near-duplicates, staging the kept ones.
+        Dropped rows carry `chunk_id` and the `canonical_id` they map to.
+        """
+        if chunk_df.empty:
+            return chunk_df, chunk_df.assign(chunk_id=[], canonical_id=[])
+
+        texts = chunk_df[text_column].tolist()
+        # MinHash outside the lock, so filters of other tickers only wait for the lookups
+        signatures = [self.signature(text) for text in texts]
+
+        keep, dropped_ids, canonical_ids = [], [], []
+        with self._lock:
+            for text, signature, group in zip(texts, signatures, self._groups(chunk_df)):
+                doc_id = chunk_id(text)
+                canonical = self.find(signature, group)
+
+                if canonical is None or canonical == doc_id:
+                    keep.append(True)
+                    if canonical is None:
+                        self._add(doc_id, signature, group, pending=True)
+                else:
+                    keep.append(False)
+                    canonical = self.provenance.get(canonical, canonical)
+                    self._pending_provenance[doc_id] = (canonical, group)
+                    dropped_ids.append(doc_id)
+                    canonical_ids.append(canonical)
+
+        keep = np.asarray(keep)
+        kept = chunk_df[keep].reset_index(drop=True)
+        dropped = chunk_df[~keep].reset_index(drop=True).assign(chunk_id=dropped_ids, canonical_id=canonical_ids)
+        return kept, dropped
+
+
+    def commit(self, chunk_df: pd.DataFrame = None, text_column: str = "content_chunk"):
+        """
+        Make the staged chunks of `chunk_df` (all staged chunks if None) part of the index,
+        once they are stored. Chunks of `chunk_df` that were never staged, e.g. of a filing
+        resumed after filter() ran in an earlier process, are indexed too.
+        """
+        with self._lock:
+            if chunk_df is None:
+                self._pending.clear()
+            elif not chunk_df.empty:
+                for text, group in zip(chunk_df[text_column], self._groups(chunk_df)):
+                    doc_id = chunk_id(text)
+                    position = self._positions.get((group, doc_id))
+                    if position is None:
+                        self._add(doc_id, self.signature(text), group)
+                    else:
+                        self._pending.discard(position)
+
+            # Duplicates resolve once their canonical chunk is committed
+            for doc_id, (canonical, group) in list(self._pending_provenance.items()):
+                position = self._positions.get((group, canonical))
+                if position is not None and position not in self._pending:
+                    self.provenance[doc_id] = canonical
+                    del self._pending_provenance[doc_id]
+
+
+    def rollback(self, chunk_df: pd.DataFrame = None, text_column: str = "content_chunk"):
+        """Unstage the staged chunks of `chunk_df` (all staged chunks if None), e.g. after storing them failed."""
+        with self._lock:
+            if chunk_df is None:
+                positions = set(self._pending)
+            elif chunk_df.empty:
+                positions = set()
+            else:
+                keys = zip(self._groups(chunk_df), map(chunk_id, chunk_df[text_column]))
+                positions = {self._positions.get(key) for key in keys} & self._pending
+
+            for position in positions:
+                self._remove(position)
+            self._pending_provenance = {
+                doc_id: (canonical, group) for doc_id, (canonical, group) in self._pending_provenance.items()
+                if (group, canonical) in self._positions
+            }
+
+
+    def _load(self):
+        try:
+            data = np.load(os.path.join(self.path, "signatures.npz"))
+            with open(os.path.join(self.path, "index.json"), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, OSError):
+            return
+
+        if (meta["num_perm"], meta["shingle_size"]) != (self.num_perm, self.shingle_size):
+            print("⚠️ Near-duplicate index settings changed, starting with an empty index.")
+            return
+
+        # Indexes saved before grouping have no groups; their chunks no longer match anything
+        groups = meta.get("groups", [None] * len(meta["ids"]))
+        for doc_id, group, signature in zip(meta["ids"], groups, data["signatures"]):
+            self._add(doc_id, signature, group)
+        self.provenance = meta["provenance"]
+
+
+    def save(self):
+        """Persist the committed signatures, IDs, groups and provenance atomically."""
+        with self._lock:
+            positions = [p for p, doc_id in enumerate(self.ids) if doc_id is not None and p not in self._pending]
+            if positions:
+                signatures = np.stack([self._signatures[p] for p in positions])
+            else:
+                signatures = np.empty((0, self.num_perm), dtype=np.uint32)
+            meta = {
+                "num_perm": self.num_perm,
+                "shingle_size": self.shingle_size,
+                "ids": [self.ids[p] for p in positions],
+                "groups": [self.groups[p] for p in positions],
+                "provenance": dict(self.provenance),
+            }
+
+            with atomic_write(os.path.join(self.path, "signatures.npz")) as f:
+                np.savez(f, signatures=signatures)
+            with atomic_write(os.path.join(self.path, "index.json"), "w") as f:
+                json.dump(meta, f)
@@ -1,54 +1,172 @@
-from typing import Any, List
-from FlagEmbedding import FlagModel
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Iterator, List
+import numpy as np
 from llama_index.core.embeddings import BaseEmbedding
-from llama_index.core.settings import Settings
 from typing_extensions import override
+from analysis.tokens import DEFAULT_MODEL_NAME, count_tokens
+
+
+# Special tokens added around an [instruction, text] pair: [CLS] ... [SEP] ... [SEP]
+PAIR_SPECIAL_TOKENS = 3
 
 
 class BAAIEmbeddings(BaseEmbedding):
+    """
+    BGE embeddings with a length-bucketed batching engine.
+
+    Texts are sorted by token length so each batch pads to similar lengths, and
+    batch sizes shrink as texts get longer so `batch_token_budget` (padded tokens
+    per batch) bounds peak memory. Inputs are processed in windows of
+    `window_size` texts, which are returned in their original order.
+
+    `precision` optionally selects a CPU-friendly model variant: "fp16" or
+    dynamically quantized "int8". None keeps FlagModel's default.
+    """
     _instruction: str
-    _model: FlagModel
+    _model: Any
     def __init__(
         self,
-        instructor_model_name: str = "BAAI/bge-base-en-v1.5",
+        instructor_model_name: str = DEFAULT_MODEL_NAME,
         instruction: str = "Represent this SEC filing for investment analysis, risk assessment, and financial insights:",
+        max_length: int = 512,
+        max_batch_size: int = 256,
+        batch_token_budget: int = 32768,
+        window_size: int = 4096,
+        precision: str = None,
+        query_cache_size: int = 1024,
         **kwargs: Any,
     ) -> None:
         super().__init__(**kwargs)
-        
+
+        model_kwargs = {}
+        if precision == "fp16":
+            model_kwargs["use_fp16"] = True
+        elif precision == "int8":
+            model_kwargs.update(use_fp16=False, devices="cpu")
+        elif precision is not None:
+            raise ValueError(f"Unknown precision '{precision}'. Use 'fp16', 'int8' or None.")
+
+        # Deferred so importing this module does not load torch
+        from FlagEmbedding import FlagModel
+
         self.__dict__["_instruction"] = instruction
+        self.__dict__["_model_name"] = instructor_model_name
         self.__dict__["_model"] = FlagModel(
             instructor_model_name,
             query_instruction_for_retrieval=instruction,
             query_instruction_format="{}{}",
+            **model_kwargs,
         )
 
+        if precision == "int8":
+            import torch
+            self._model.model = torch.quantization.quantize_dynamic(
+                self._model.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        self.__dict__["_max_length"] = max_length
+        self.__dict__["_max_batch_size"] = max_batch_size
+        self.__dict__["_batch_token_budget"] = batch_token_budget
+        self.__dict__["_window_size"] = window_size
+        self.__dict__["_instruction_tokens"] = count_tokens([instruction], instructor_model_name)[0]
+        # FlagModel is not safe to call from several threads at once
+        self.__dict__["_encode_lock"] = threading.Lock()
+        self.__dict__["_query_cache"] = OrderedDict()
+        self.__dict__["_query_cache_size"] = query_cache_size
+        self.__dict__["_query_cache_lock"] = threading.Lock()
+        self.__dict__["query_cache_hits"] = 0
+        self.__dict__["query_cache_misses"] = 0
+
+
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        with self._encode_lock:
+            embeddings = self._model.encode(
+                [[self._instruction, text] for text in texts],
+                batch_size=len(texts),
+                max_length=self._max_length,
+                convert_to_numpy=True,
+            )
+        return np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+
+
+    def _plan_batches(self, lengths: np.ndarray) -> list[np.ndarray]:
+        """Group text indices, longest first, into batches that fit the padded-token budget."""
+        order = np.argsort(-lengths, kind="stable")
+        batches = []
+        start = 0
+
+        while start < len(order):
+            padded_length = min(self._max_length, int(lengths[order[start]]) + self._instruction_tokens + PAIR_SPECIAL_TOKENS)
+            size = max(1, min(self._max_batch_size, self._batch_token_budget // padded_length))
+            batches.append(order[start:start + size])
+            start += size
+
+        return batches
+
+
+    def _encode_window(self, texts: List[str]) -> np.ndarray:
+        lengths = np.asarray(count_tokens(texts, self._model_name))
+        embeddings = None
+
+        for batch in self._plan_batches(lengths):
+            batch_embeddings = self._encode([texts[i] for i in batch])
+            if embeddings is None:
+                embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+            embeddings[batch] = batch_embeddings
+
+        return embeddings
+
+
+    def iter_text_embeddings(self, texts: List[str]) -> Iterator[np.ndarray]:
+        """Yield float32 embedding blocks of `window_size` texts, in the original order of `texts`."""
+        for start in range(0, len(texts), self._window_size):
+            yield self._encode_window(texts[start:start + self._window_size])
+
 
     @override
     def _get_query_embedding(self, query: str) -> List[float]:
-        embeddings = self._model.encode([[self._instruction, query]])
-        return embeddings[0]
+        """Query embeddings are memoised in an LRU of `query_cache_size` entries."""
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(query)
+            if embedding is not None:
+                self._query_cache.move_to_end(query)
+                self.__dict__["query_cache_hits"] += 1
+                return embedding
+            self.__dict__["query_cache_misses"] += 1
+
+        embedding = self._encode([query])[0]
+
+        with self._query_cache_lock:
+            self._query_cache[query] = embedding
+            while len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+        return embedding
 
 
     @override
     def _get_text_embedding(self, text: str) -> List[float]:
-        embeddings = self._model.encode([[self._instruction, text]])
-        return embeddings[0]
+        return self._encode([text])[0]
 
 
     @override
     def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
-        embeddings = self._model.encode(
-            [[self._instruction, text] for text in texts]
-        )
-        return embeddings
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.concatenate(list(self.iter_text_embeddings(texts)))
 
 
     @override
     async def _aget_query_embedding(self, query: str) -> List[float]:
-        return self._get_query_embedding(query)
+        return await asyncio.to_thread(self._get_query_embedding, query)
 
 
     @override
     async def _aget_text_embedding(self, text: str) -> List[float]:
-      return self._get_text_embedding(text)
\ No newline at end of file
+        return await asyncio.to_thread(self._get_text_embedding, text)
+
+
+    @override
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self._get_text_embeddings, texts)
@@ -0,0 +1,248 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+from utils.atomic import atomic_write
+
+
+# Keys are stored as hex so numpy's fixed-width bytes dtype never strips trailing NULs
+KEY_BYTES = 16
+KEY_DTYPE = f"S{KEY_BYTES * 2}"
+# One slot assignment of the index log; an empty key frees the slot
+LOG_DTYPE = np.dtype([("slot", "<i8"), ("key", KEY_DTYPE), ("last_used", "<i8")])
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by a hash of (model name, instruction, text).
+
+    Vectors live in a memory-mapped float32 matrix with one row per slot, and an
+    index maps each key to its slot. Single lookups return views into the map
+    without copying. Once all `capacity` slots are used, the least recently used
+    entries are evicted.
+
+    The index is an npz snapshot plus an append-only log of slot assignments
+    since it, folded into a new snapshot once the log holds `compact_every`
+    records. Evicted slots are logged as freed before their vectors are
+    overwritten, so a crash never leaves a key pointing at another text's
+    vector. Recency from lookups is only persisted with the snapshot.
+    """
+    def __init__(self, model_name: str, instruction: str, root: str = None, capacity: int = 262144, compact_every: int = 65536):
+        self.root = root or os.path.join(os.getcwd(), "embedding_cache")
+        self.capacity = capacity
+        self.compact_every = compact_every
+        self._logged = 0
+        self._namespace = f"{model_name}\0{instruction}\0".encode("utf-8")
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._slots = {}
+        self._keys = np.zeros(capacity, dtype=KEY_DTYPE)
+        self._last_used = np.zeros(capacity, dtype=np.int64)
+        self._clock = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(self.root, exist_ok=True)
+        self._load()
+
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.root, "meta.json")
+
+
+    @property
+    def _index_path(self) -> str:
+        return os.path.join(self.root, "index.npz")
+
+
+    @property
+    def _log_path(self) -> str:
+        return os.path.join(self.root, "index.log")
+
+
+    @property
+    def _vectors_path(self) -> str:
+        return os.path.join(self.root, "vectors.f32")
+
+
+    def _load(self):
+        try:
+            with open(self._meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta["capacity"] != self.capacity:
+                print("⚠️ Embedding cache capacity changed, starting with an empty cache.")
+                return
+            self._open_vectors(meta["dim"], mode="r+")
+        except (FileNotFoundError, json.JSONDecodeError, ValueError, OSError):
+            return
+
+        try:
+            index = np.load(self._index_path)
+            self._keys = index["keys"]
+            self._last_used = index["last_used"]
+        except FileNotFoundError:
+            pass
+        self._replay_log()
+        self._clock = int(self._last_used.max(initial=0))
+        self._slots = {key: slot for slot, key in enumerate(self._keys.tolist()) if key}
+
+
+    def _replay_log(self):
+        """Apply the slot assignments logged since the snapshot. A record torn by a crash is cut off the log."""
+        try:
+            f = open(self._log_path, "r+b")
+        except FileNotFoundError:
+            return
+
+        with f:
+            data = f.read()
+            end = len(data) - len(data) % LOG_DTYPE.itemsize
+            if end < len(data):
+                print(f"⚠️ Dropping a torn embedding cache index record at byte {end} of {self._log_path}.")
+                f.truncate(end)
+
+        records = np.frombuffer(data[:end], dtype=LOG_DTYPE)
+        # Later records win, as when they were logged
+        for slot, key, last_used in records.tolist():
+            self._keys[slot] = key
+            self._last_used[slot] = max(self._last_used[slot], last_used) if key else 0
+        self._logged = len(records)
+
+
+    def _open_vectors(self, dim: int, mode: str):
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(self.capacity, dim))
+
+
+    def key(self, text: str) -> bytes:
+        return hashlib.blake2b(self._namespace + text.encode("utf-8"), digest_size=KEY_BYTES).hexdigest().encode("ascii")
+
+
+    def get(self, text: str) -> np.ndarray | None:
+        """Zero-copy view of the cached embedding of `text`, or None on a miss."""
+        with self._lock:
+            slot = self._slots.get(self.key(text))
+            if slot is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._clock += 1
+            self._last_used[slot] = self._clock
+            return self._vectors[slot]
+
+
+    def get_many(self, texts: list[str]) -> tuple[np.ndarray | None, list[int]]:
+        """
+        Returns:
+            - a float32 (len(texts), dim) array with cached rows filled in, or None if nothing is cached yet
+            - indices of `texts` that missed the cache
+        """
+        keys = [self.key(text) for text in texts]
+
+        with self._lock:
+            if self._vectors is None:
+                self.misses += len(texts)
+                return None, list(range(len(texts)))
+
+            slots = [self._slots.get(key) for key in keys]
+            hit_positions = [i for i, slot in enumerate(slots) if slot is not None]
+            missing = [i for i, slot in enumerate(slots) if slot is None]
+
+            embeddings = np.zeros((len(texts), self._vectors.shape[1]), dtype=np.float32)
+            if hit_positions:
+                hit_slots = np.asarray([slots[i] for i in hit_positions])
+                embeddings[hit_positions] = self._vectors[hit_slots]
+                self._clock += 1
+                self._last_used[hit_slots] = self._clock
+
+            self.hits += len(hit_positions)
+            self.misses += len(missing)
+
+        return embeddings, missing
+
+
+    def _free_slots(self, count: int) -> np.ndarray:
+        """Return `count` slots, evicting the least recently used entries if needed."""
+        free = np.flatnonzero(self._keys == b"")
+        if len(free) >= count:
+            return free[:count]
+
+        evict_count = count - len(free)
+        occupied = np.flatnonzero(self._keys != b"")
+        evicted = occupied[np.argpartition(self._last_used[occupied], evict_count - 1)[:evict_count]]
+        for slot in evicted:
+            del self._slots[self._keys[slot]]
+            self._keys[slot] = b""
+            self._last_used[slot] = 0
+        # Freed on disk before the slots' vectors are overwritten
+        self._append_log(evicted, sync=True)
+        return np.concatenate([free, evicted])
+
+
+    def put_many(self, texts: list[str], embeddings: np.ndarray):
+        """Insert embeddings for `texts` and log their slots."""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        # Keep the newest entry when a batch repeats a text, and never store more than fits
+        unique = {self.key(text): i for i, text in enumerate(texts)}
+
+        with self._lock:
+            if self._vectors is None:
+                self._open_vectors(embeddings.shape[1], mode="w+")
+                self._write_meta(embeddings.shape[1])
+
+            new = [(key, i) for key, i in unique.items() if key not in self._slots][-self.capacity:]
+            if not new:
+                return
+
+            slots = self._free_slots(len(new))
+            self._clock += 1
+            for slot, (key, i) in zip(slots, new):
+                self._vectors[slot] = embeddings[i]
+                self._keys[slot] = key
+                self._last_used[slot] = self._clock
+                self._slots[key] = int(slot)
+
+            # Vectors reach disk before the keys that point at them
+            self._vectors.flush()
+            self._append_log(slots)
+            if self._logged >= self.compact_every:
+                self._write_index()
+
+
+    def _write_meta(self, dim: int):
+        with atomic_write(self._meta_path, "w") as f:
+            json.dump({"dim": dim, "capacity": self.capacity}, f)
+
+
+    def _append_log(self, slots: np.ndarray, sync: bool = False):
+        records = np.empty(len(slots), dtype=LOG_DTYPE)
+        records["slot"] = slots
+        records["key"] = self._keys[slots]
+        records["last_used"] = self._last_used[slots]
+        with open(self._log_path, "ab") as f:
+            f.write(records.tobytes())
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._logged += len(records)
+
+
+    def _write_index(self):
+        """Snapshot the index and start an empty log. Replaying the old log over the new snapshot gives the same index, so a crash in between is harmless."""
+        with atomic_write(self._index_path, fsync=True) as f:
+            np.savez(f, keys=self._keys, last_used=self._last_used)
+        with atomic_write(self._log_path):
+            pass
+        self._logged = 0
+
+
+    def save(self):
+        """Fold the log into a new snapshot, also persisting the recency of cache hits."""
+        with self._lock:
+            if self._vectors is not None:
+                self._write_index()
+
+
+    def __len__(self) -> int:
+        return len(self._slots)
@@ -0,0 +1,116 @@
+from lxml import html as lxml_html
+
+
+# Text inside these tags is not part of BeautifulSoup's get_text() output
+SKIPPED_TEXT_TAGS = {"script", "style", "template"}
+
+_PARSER = lxml_html.HTMLParser(encoding="utf-8")
+
+
+def _collect_text(element, parts: list, table_depth: int, suppress: bool, tables: list, top_level: bool = False):
+    """
+    Walk one subtree, appending its stripped strings to `parts` and every table to `tables`.
+
+    Text under a <td> that sits inside a <table> is suppressed, which mirrors the
+    bs4 engine decomposing table cells before reading page text. Like bs4, a
+    <script>, <style> or <template> keeps its text only when it is a direct
+    child of <body>.
+    """
+    tag = element.tag
+    if not isinstance(tag, str):
+        # Comments and processing instructions contribute no text, only their tail
+        return
+
+    tag = tag.lower()
+    if tag == "table":
+        tables.append(element)
+        table_depth += 1
+    elif tag == "td" and table_depth:
+        suppress = True
+
+    skip_own_text = suppress or (tag in SKIPPED_TEXT_TAGS and not top_level)
+
+    if element.text and not skip_own_text:
+        text = element.text.strip()
+        if text:
+            parts.append(text)
+
+    for child in element:
+        _collect_text(child, parts, table_depth, skip_own_text, tables)
+        if child.tail and not suppress:
+            text = child.tail.strip()
+            if text:
+                parts.append(text)
+
+
+def _cell_text(element) -> str:
+    """Text of a cell like bs4's get_text(): comments and nested script, style and template text left out."""
+    parts = [element.text or ""]
+    for child in element:
+        if isinstance(child.tag, str) and child.tag.lower() not in SKIPPED_TEXT_TAGS:
+            parts.append(_cell_text(child))
+        parts.append(child.tail or "")
+    return "".join(parts)
+
+
+def _table_cells(tables: list) -> list[tuple[int, int, int, str]]:
+    """(table_number, row, column, text) for every <td>, matching the bs4 engine's find_all semantics."""
+    return [
+        (i, x, y, _cell_text(data).strip())
+        for i, table in enumerate(tables)
+        for x, tr in enumerate(table.iter("tr"))
+        for y, data in enumerate(tr.iter("td"))
+    ]
+
+
+def extract(html: str) -> tuple[list[str], list[tuple[int, int, int, str]]]:
+    """
+    Extract page texts and table cells from a filing in one traversal of <body>.
+
+    Returns:
+        - pages: non-empty page texts, split on top-level <hr> elements
+        - cells: (table_number, row, column, text) for every table cell
+
+    Output matches the bs4 engine on well-formed markup. Where end tags are
+    left out, lxml builds the tree by the HTML rules and html.parser does not,
+    and the outputs differ on purpose:
+        - an <hr> after an unclosed <p> closes the <p> and starts a new page here,
+          while html.parser nests the <hr> and merges both pages into one
+        - an unclosed <td> ends at the next <td> here, while html.parser nests the
+          following cells inside it and repeats their text in every enclosing cell
+    """
+    # Encode first: lxml rejects str input that carries an <?xml encoding=...?> declaration
+    root = lxml_html.document_fromstring(html.encode("utf-8"), parser=_PARSER)
+    body = root.find("body")
+    if body is None:
+        return [], []
+
+    pages, tables = [], []
+    current = []
+
+    def add(text: str):
+        if text:
+            current.append(text.replace("\n", " ").strip())
+
+    if body.text:
+        add(body.text.strip())
+
+    for element in body:
+        if isinstance(element.tag, str) and element.tag.lower() == "hr":
+            page = " ".join(current).strip()
+            if page:
+                pages.append(page)
+            current = []
+        else:
+            parts = []
+            _collect_text(element, parts, 0, False, tables, top_level=True)
+            add(" ".join(parts))
+
+        if element.tail:
+            add(element.tail.strip())
+
+    page = " ".join(current).strip()
+    if page:
+        pages.append(page)
+
+    return pages, _table_cells(tables)
@@ -1,29 +1,23 @@
 from bs4 import BeautifulSoup
 from requests import Response
+import numpy as np
 import pandas as pd
 import re
-from llama_index.core.node_parser import TokenTextSplitter
 import asyncio
+from analysis import fast_extract, tokens
 
 
 async def clean_text(text: str) -> str:
     return text.replace("\n", " ").strip()
 
 
-async def clean_data(html: str, company_name: str, form_type: str, report_date: str, chunk_size=256, chunk_overlap=20) -> pd.DataFrame:
+async def _extract_bs4(html: str) -> tuple[list[str], list[tuple[int, int, int, str]]]:
+    """Extract page texts and table cells with BeautifulSoup's pure-Python html.parser."""
     soup = BeautifulSoup(html, "html.parser")
     tables = soup.find_all("table")
 
-    structured_tables = [
-        {
-            "company_name": company_name,
-            "form_type": form_type,
-            "date": report_date,
-            "table_number": i,
-            "row": x,
-            "column": y,
-            "data": str(data.get_text().strip())
-        }
+    cells = [
+        (i, x, y, str(data.get_text().strip()))
         for i, table in enumerate(tables)
         for x, tr in enumerate(table.find_all("tr"))
         for y, data in enumerate(tr.find_all("td"))
@@ -34,29 +28,17 @@ async def clean_data(html: str, company_name: str, form_type: str, report_date:
             for data in tr.find_all("td"):
                 data.decompose()
 
-    pages_and_texts = []
-    page_number = 0
+    pages = []
     current_page = []
     text_cleaning_tasks = []
-    
+
     for element in soup.body.children:
         if element.name == "hr":
             if text_cleaning_tasks:  # Ensure we have tasks to process
                 texts_list = await asyncio.gather(*text_cleaning_tasks)  # Await tasks
                 texts = " ".join(texts_list).strip()
                 if texts:  # Ensure texts are not empty
-                    pages_and_texts.append({
-                        "company_name": company_name,
-                        "form_type": form_type,
-                        "date": report_date,
-                        "page_number": page_number,
-                        "page_char_count": len(texts),
-                        "page_word_count": len(texts.split()),
-                        "page_sentence_count_raw": len(texts.split(". ")),
-                        "page_token_count": len(texts) / 4,
-                        "content": re.sub(r"\s*\d+\s*$", "", texts.strip())
-                    })
-                    page_number += 1
+                    pages.append(texts)
 
             # Reset lists after an HR tag
             current_page = []
@@ -70,8 +52,40 @@ async def clean_data(html: str, company_name: str, form_type: str, report_date:
 
     # Add the last page if there's remaining content
     if current_page:
-        texts = " ".join(await asyncio.gather(*text_cleaning_tasks)).strip()
-        pages_and_texts.append({
+        pages.append(" ".join(await asyncio.gather(*text_cleaning_tasks)).strip())
+
+    return pages, cells
+
+
+async def parse_filing(html: str, company_name: str, form_type: str, report_date: str, engine="bs4") -> tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Parse a filing into page text and table cell DataFrames.
+
+    `engine` selects the extraction backend: "bs4" (html.parser) or "lxml", a
+    single-pass extractor producing the same text_df and table_df schemas.
+    """
+    if engine == "lxml":
+        pages, cells = fast_extract.extract(html)
+    elif engine == "bs4":
+        pages, cells = await _extract_bs4(html)
+    else:
+        raise ValueError(f"Unknown extraction engine '{engine}'. Use 'bs4' or 'lxml'.")
+
+    structured_tables = [
+        {
+            "company_name": company_name,
+            "form_type": form_type,
+            "date": report_date,
+            "table_number": i,
+            "row": x,
+            "column": y,
+            "data": data
+        }
+        for i, x, y, data in cells
+    ]
+
+    pages_and_texts = [
+        {
             "company_name": company_name,
             "form_type": form_type,
             "date": report_date,
@@ -81,7 +95,9 @@ async def clean_data(html: str, company_name: str, form_type: str, report_date:
             "page_sentence_count_raw": len(texts.split(". ")),
             "page_token_count": len(texts) / 4,
             "content": re.sub(r"\s*\d+\s*$", "", texts.strip())
-        })
+        }
+        for page_number, texts in enumerate(pages)
+    ]
 
     text_df = pd.DataFrame(pages_and_texts)
     table_df = pd.DataFrame(structured_tables)
@@ -95,30 +111,100 @@ async def clean_data(html: str, company_name: str, form_type: str, report_date:
     table_df.dropna(how="any", inplace=True)
     table_df.reset_index(drop=True, inplace=True)
 
+    return text_df, table_df
+
+
+def _split_pages(splitter, contents: list[str]) -> list[list[str]]:
+    return [splitter.split_text(content) for content in contents]
+
+
+async def chunk_text(text_df: pd.DataFrame, company_name: str, form_type: str, report_date: str, chunk_size=256, chunk_overlap=20, min_tokens=0) -> pd.DataFrame:
+    """
+    Split page texts into token chunks for embedding.
+
+    Chunk statistics are computed column-wise, and `chunk_token_count` comes from
+    one batched pass of the embedding model's tokenizer. Chunks with fewer than
+    `min_tokens` tokens are dropped before they reach embedding.
+    """
+    if text_df.empty:
+        return pd.DataFrame()
+
+    # llama_index is only needed once there is text to chunk
+    from llama_index.core.node_parser import TokenTextSplitter
+
     splitter = TokenTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunk_results = await asyncio.to_thread(_split_pages, splitter, text_df["content"].tolist())
+
+    chunk_df = pd.DataFrame({
+        "page_number": text_df["page_number"].to_numpy(),
+        "content_chunk": chunk_results,
+    }).explode("content_chunk", ignore_index=True)
+    chunk_df = chunk_df.dropna(subset=["content_chunk"]).reset_index(drop=True)
+
+    if chunk_df.empty:
+        return pd.DataFrame()
+
+    chunks = chunk_df["content_chunk"].astype(str)
+    chunk_df = pd.DataFrame({
+        "company_name": company_name,
+        "form_type": form_type,
+        "date": report_date,
+        "page_number": chunk_df["page_number"].astype("int64"),
+        "chunk_char_count": chunks.str.len(),
+        # Same results as len(chunk.split()) and len(chunk.split(". ")), without a Python loop per chunk
+        "chunk_word_count": chunks.str.count(r"\S+"),
+        "chunk_sentence_count_raw": chunks.str.count(r"\. ") + 1,
+        "chunk_token_count": await asyncio.to_thread(tokens.count_tokens, chunks.tolist()),
+        "content_chunk": chunks,
+    })
+
+    if min_tokens:
+        chunk_df = chunk_df[chunk_df["chunk_token_count"] >= min_tokens].reset_index(drop=True)
+
+    return compact_chunks(chunk_df)
+
+
+CATEGORICAL_COLUMNS = ["company_name", "form_type", "date", "accession_number"]
+COUNT_COLUMNS = ["page_number", "chunk_char_count", "chunk_word_count", "chunk_sentence_count_raw", "chunk_token_count"]
+
+
+def compact_chunks(chunk_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store the per-filing metadata repeated on every chunk as categoricals and
+    the counts as int32. Call again after concatenating frames, since concat
+    falls back to object columns when categories differ.
+    """
+    for column in CATEGORICAL_COLUMNS:
+        if column in chunk_df.columns:
+            # Missing values stay NaN rather than becoming "None"/"nan" categories
+            chunk_df[column] = chunk_df[column].astype("category")
+    for column in COUNT_COLUMNS:
+        if column in chunk_df.columns:
+            chunk_df[column] = chunk_df[column].astype(np.int32)
+    return chunk_df
+
+
+async def clean_data(html: str, company_name: str, form_type: str, report_date: str, chunk_size=256, chunk_overlap=20, engine="bs4", min_tokens=0) -> pd.DataFrame:
+    """Split a filing into chunk, page text and table cell DataFrames."""
+    text_df, table_df = await parse_filing(html, company_name, form_type, report_date, engine)
+    chunk_text_df = await chunk_text(text_df, company_name, form_type, report_date, chunk_size, chunk_overlap, min_tokens)
+
+    return chunk_text_df, text_df, table_df
 
-    split_content = []
-    chunk_processing_tasks = []
 
-    for _, row in text_df.iterrows():
-        chunk_processing_tasks.append(asyncio.to_thread(splitter.split_text, row["content"]))
+def to_columns(df: pd.DataFrame) -> dict:
+    """Compact, picklable column arrays of a DataFrame, used to ship parse results between processes."""
+    return {
+        column: df[column].array if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column].to_numpy()
+        for column in df.columns
+    }
 
-    chunk_results = await asyncio.gather(*chunk_processing_tasks)
 
-    for row, chunks in zip(text_df.iterrows(), chunk_results):
-        for chunk in chunks:
-            split_content.append({
-                "company_name": company_name,
-                "form_type": form_type,
-                "date": report_date,
-                "page_number": row[1]["page_number"],
-                "chunk_char_count": len(chunk),
-                "chunk_word_count": len(chunk.split()),
-                "chunk_sentence_count_raw": len(chunk.split(". ")),
-                "chunk_token_count": len(chunk) / 4,
-                "content_chunk": chunk
-            })
+def from_columns(columns: dict) -> pd.DataFrame:
+    return pd.DataFrame(columns)
 
-    chunk_text_df = pd.DataFrame(split_content)
 
-    return chunk_text_df, text_df, table_df
\ No newline at end of file
+def parse_filing_columns(html: str, company_name: str, form_type: str, report_date: str, engine="bs4") -> tuple[dict, dict]:
+    """Synchronous parse_filing for worker processes, returning column arrays."""
+    text_df, table_df = asyncio.run(parse_filing(html, company_name, form_type, report_date, engine))
+    return to_columns(text_df), to_columns(table_df)
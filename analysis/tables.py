@@ -0,0 +1,166 @@
+import re
+import numpy as np
+import pandas as pd
+
+
+# Cells that only carry formatting for a neighbouring number
+_PREFIXES = {"$", "(", "$(", "($"}
+_SUFFIXES = {")", "%", ")%", "%)"}
+
+_NUMBER = r"-?(?:\d+\.?\d*|\.\d+)"
+_FORMATTING = r"[$,()%\s]"
+_DASHES = {"-", "—", "–"}
+
+# Column header naming a period: "2024", "Fiscal 2024", "FY2024", "September 28, 2024", "Sept. 28, 2024"
+_PERIOD = re.compile(
+    r"(?:(?:fiscal(?:\s+year)?|fy)\s*)?(?:(?P<month>[a-z]{3,9})\.?\s+\d{1,2},?\s+)?(?P<year>(?:19|20)\d{2})",
+    re.IGNORECASE,
+)
+_MONTHS = {name: number for number, name in enumerate(
+    ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"], start=1
+)}
+
+
+def parse_numbers(values: pd.Series) -> pd.Series:
+    """
+    Parse cell strings into float64.
+
+    Handles "$", thousands separators, "%" and parenthesised negatives, so
+    "$(1,234.5)" becomes -1234.5. Non-numeric cells become NaN.
+    """
+    text = values.astype("string").str.strip()
+    cleaned = text.str.replace(_FORMATTING, "", regex=True)
+    numeric = cleaned.str.fullmatch(_NUMBER).fillna(False).astype(bool)
+    negative = text.str.contains("(", regex=False).fillna(False).astype(bool)
+
+    parsed = pd.to_numeric(cleaned.where(numeric), errors="coerce")
+    return parsed.where(~negative, -parsed).astype("float64")
+
+
+def _compact_row(cells: list[str]) -> list[str]:
+    """Fold "$", "(", ")" and "%" cells into the number they format."""
+    compacted = []
+    pending = ""
+    for cell in cells:
+        cell = cell.strip()
+        if cell in _PREFIXES:
+            pending += cell
+        elif cell in _SUFFIXES and compacted:
+            compacted[-1] += cell
+        else:
+            compacted.append(pending + cell)
+            pending = ""
+    return compacted
+
+
+def parse_period(text: str) -> tuple[int, int | None] | None:
+    """
+    (year, month) named by a column header such as "2024", "Fiscal 2024" or
+    "September 28, 2024"; month is None for a bare year. None if `text` is not a period.
+    """
+    match = _PERIOD.fullmatch(str(text).strip())
+    if match is None:
+        return None
+    month = match.group("month")
+    if month is None:
+        return int(match.group("year")), None
+    month = _MONTHS.get(month[:3].lower())
+    return (int(match.group("year")), month) if month is not None else None
+
+
+def _is_number(cell: str) -> bool:
+    return re.fullmatch(_NUMBER, re.sub(_FORMATTING, "", cell)) is not None
+
+
+def _split_row(cells: list[str]) -> tuple[str | None, list[str]]:
+    """
+    Row label and value cells of one table row.
+
+    Blank cells are layout padding and dropped. The label is the first cell
+    unless that is a number, dash or period; every cell after it is a value
+    cell, so a dash keeps the position of the number it stands in for.
+    """
+    cells = [cell for cell in _compact_row(cells) if cell]
+    if cells and not (_is_number(cells[0]) or cells[0] in _DASHES or parse_period(cells[0])):
+        return cells[0], cells[1:]
+    return None, cells
+
+
+def positional_columns(columns: list[str], prefix: str) -> list[str]:
+    """The `prefix`0, `prefix`1, ... names among `columns`, in position order."""
+    columns = [column for column in columns if column.startswith(prefix) and column[len(prefix):].isdigit()]
+    return sorted(columns, key=lambda column: int(column[len(prefix):]))
+
+
+def reconstruct(table_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Pivot long-format cell rows back into typed table rows.
+
+    Returns one row per (table_number, row) with the row `label`, `width` (its
+    number of value cells) and one float64 `value_<i>` column per value cell
+    position. Dashes and text in a value position are NaN placeholders, so
+    numbers keep their column. Rows whose value cells are all periods ("2024",
+    "September 28, 2024") are `header` rows: their cells become the string
+    `column_<i>` labels of every following row of the table instead of data.
+    Company, form, date and accession columns are carried over once per row.
+    """
+    if table_df.empty:
+        return pd.DataFrame(columns=["table_number", "row", "label", "header", "width"])
+
+    keys = [column for column in ("company_name", "form_type", "date", "accession_number") if column in table_df.columns]
+    ordered = table_df.sort_values(["table_number", "row", "column"], kind="stable")
+    rows = ordered.groupby(["table_number", "row"], sort=False).agg(
+        {"data": list, **{key: "first" for key in keys}}
+    ).reset_index()
+
+    split = rows["data"].map(_split_row)
+    rows["label"] = split.str[0]
+    cells = split.str[1]
+    rows["width"] = cells.map(len).astype(np.int16)
+    rows["header"] = cells.map(lambda values: bool(values) and all(parse_period(value) for value in values))
+    width = int(rows["width"].max())
+
+    # Cell text by (row, position)
+    exploded = cells.explode().dropna()
+    row_index = exploded.index.to_numpy()
+    positions = exploded.groupby(level=0).cumcount().to_numpy()
+    is_header = rows["header"].to_numpy()[row_index]
+
+    values = np.full((len(rows), width), np.nan)
+    numbers = parse_numbers(exploded.astype(str)).to_numpy()
+    values[row_index[~is_header], positions[~is_header]] = numbers[~is_header]
+
+    header_labels = np.full((len(rows), width), None, dtype=object)
+    header_labels[row_index[is_header], positions[is_header]] = exploded.to_numpy()[is_header]
+    # Every row takes the labels of the last header row above it in its table
+    last_header = pd.Series(np.where(rows["header"], np.arange(len(rows)), np.nan)).groupby(rows["table_number"].to_numpy()).ffill()
+    labels = np.full((len(rows), width), None, dtype=object)
+    has_header = last_header.notna().to_numpy()
+    labels[has_header] = header_labels[last_header[has_header].astype(int).to_numpy()]
+
+    rows = rows.drop(columns="data")
+    rows[["table_number", "row"]] = rows[["table_number", "row"]].astype(np.int32)
+    positional = pd.concat([
+        pd.DataFrame(values, columns=[f"value_{i}" for i in range(width)]),
+        pd.DataFrame(labels, columns=[f"column_{i}" for i in range(width)]).astype("string"),
+    ], axis=1)
+    return pd.concat([rows[keys + ["table_number", "row", "label", "header", "width"]], positional], axis=1)
+
+
+def to_frame(rows: pd.DataFrame) -> pd.DataFrame:
+    """
+    2-D DataFrame of one reconstructed table: one row per line item, indexed
+    by label, with a float64 column per value position named by the table's
+    header row (or by position if it has none). Header rows and rows without
+    numbers (notes) are left out.
+    """
+    value_columns = positional_columns(rows.columns, "value_")
+    rows = rows[~rows["header"].astype(bool) & rows[value_columns].notna().any(axis=1)]
+    if rows.empty:
+        return pd.DataFrame()
+
+    width = int(rows["width"].max())
+    labels = rows[positional_columns(rows.columns, "column_")[:width]].iloc[0].tolist()
+    columns = [label if isinstance(label, str) else i for i, label in enumerate(labels)]
+    columns += list(range(len(columns), width))
+    return pd.DataFrame(rows[value_columns[:width]].to_numpy(), index=rows["label"].fillna("").tolist(), columns=columns)
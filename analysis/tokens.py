@@ -0,0 +1,26 @@
+from functools import lru_cache
+
+
+DEFAULT_MODEL_NAME = "BAAI/bge-base-en-v1.5"
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer(model_name: str = DEFAULT_MODEL_NAME):
+    """Load (once per process) the fast tokenizer that ships with the embedding model."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name, use_fast=True)
+
+
+def count_tokens(texts: list[str], model_name: str = DEFAULT_MODEL_NAME) -> list[int]:
+    """Token counts of `texts` under the embedding model's tokenizer, in one batched call."""
+    if not texts:
+        return []
+
+    encoded = get_tokenizer(model_name)(
+        list(texts),
+        add_special_tokens=False,
+        truncation=False,
+        return_attention_mask=False,
+        return_token_type_ids=False,
+    )
+    return [len(ids) for ids in encoded["input_ids"]]
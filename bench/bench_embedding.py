@@ -0,0 +1,61 @@
+"""
+CPU texts/sec of BAAIEmbeddings' length-bucketed engine against one plain
+FlagModel.encode call over the same texts (the pre-engine code path).
+
+    python -m bench.bench_embedding [--texts 2000] [--precision int8] [--budget 32768]
+
+Texts are filing-like chunks of 10 to 200 words drawn from the test sample
+filing, so lengths vary the way chunk_df's do.
+"""
+import sys
+import time
+import argparse
+import numpy as np
+from bench.bench_extract import SAMPLE
+from analysis import fast_extract
+from analysis.embedding import BAAIEmbeddings
+
+
+def sample_texts(count: int, seed: int = 0) -> list[str]:
+    with open(SAMPLE, "r", encoding="utf-8") as f:
+        pages, _ = fast_extract.extract(f.read())
+    words = " ".join(pages).split()
+
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(10, 200, size=count)
+    starts = rng.integers(0, len(words), size=count)
+    # Wrap around the sample so every text gets its full length
+    return [" ".join(words[(start + i) % len(words)] for i in range(length)) for start, length in zip(starts, lengths)]
+
+
+def timed(run) -> tuple[float, np.ndarray]:
+    start = time.perf_counter()
+    result = run()
+    return time.perf_counter() - start, np.asarray(result, dtype=np.float32)
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--precision", choices=["fp16", "int8"])
+    parser.add_argument("--budget", type=int, default=32768, help="batch_token_budget of the engine")
+    args = parser.parse_args(argv)
+
+    model = BAAIEmbeddings(precision=args.precision, batch_token_budget=args.budget)
+    texts = sample_texts(args.texts)
+    model._get_text_embeddings(texts[:32])  # warm up threads and allocator
+
+    baseline_seconds, baseline = timed(lambda: model._model.encode([[model._instruction, text] for text in texts]))
+    engine_seconds, engine = timed(lambda: model._get_text_embeddings(texts))
+
+    # Both paths must produce the same vectors, in the same order
+    similarity = np.sum(baseline * engine, axis=1) / (np.linalg.norm(baseline, axis=1) * np.linalg.norm(engine, axis=1))
+
+    print(f"{len(texts)} texts, precision={args.precision or 'default'}, batch_token_budget={args.budget}")
+    print(f"FlagModel.encode: {len(texts) / baseline_seconds:8.1f} texts/s ({baseline_seconds:.1f}s)")
+    print(f"bucketed engine:  {len(texts) / engine_seconds:8.1f} texts/s ({engine_seconds:.1f}s, {baseline_seconds / engine_seconds:.2f}x)")
+    print(f"min cosine similarity between the two: {similarity.min():.5f}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
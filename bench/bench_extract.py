@@ -0,0 +1,60 @@
+"""
+Time the bs4 and lxml extraction engines on one large filing.
+
+    python -m bench.bench_extract [filing.html] [--repeat N]
+
+Without a path, a ~10 MB 10-K is synthesised by repeating the pages of the
+test sample filing.
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from analysis import fast_extract, preprocessor
+
+
+SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests", "data", "filing_sample.html")
+
+
+def synthetic_filing(target_bytes: int = 10 * 2**20) -> str:
+    with open(SAMPLE, "r", encoding="utf-8") as f:
+        html = f.read()
+    head, rest = html.split("<body>", 1)
+    body, tail = rest.rsplit("</body>", 1)
+    copies = max(1, target_bytes // len(body))
+    return f"{head}<body>{body * copies}</body>{tail}"
+
+
+def best_of(repeat: int, run) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    if args.path:
+        with open(args.path, "r", encoding="utf-8", errors="replace") as f:
+            html = f.read()
+    else:
+        html = synthetic_filing()
+
+    bs4_seconds = best_of(args.repeat, lambda: asyncio.run(preprocessor._extract_bs4(html)))
+    lxml_seconds = best_of(args.repeat, lambda: fast_extract.extract(html))
+    pages, cells = fast_extract.extract(html)
+
+    print(f"{len(html) / 2**20:.1f} MB, {len(pages)} pages, {len(cells)} cells (best of {args.repeat})")
+    print(f"bs4:  {bs4_seconds:.2f}s")
+    print(f"lxml: {lxml_seconds:.2f}s ({bs4_seconds / lxml_seconds:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
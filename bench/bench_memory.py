@@ -0,0 +1,82 @@
+"""
+Resident bytes of chunk_df with its embeddings in the original layout
+(object metadata columns, int64 counts and an `embedding` column of per-row
+Python float lists) against compact_chunks plus one float32 array.
+
+    python -m bench.bench_memory [--chunks 20000] [--dim 768]
+
+Bytes are what tracemalloc sees allocated while each layout is alive, so the
+Python objects inside the list column are counted too. Build times are
+inflated by tracemalloc and only comparable with each other.
+"""
+import sys
+import time
+import argparse
+import tracemalloc
+import numpy as np
+import pandas as pd
+from analysis.preprocessor import compact_chunks
+
+
+def synthetic_chunks(count: int, seed: int = 0) -> pd.DataFrame:
+    """chunk_df as chunk_text builds it: repeated per-filing strings and int64 counts."""
+    rng = np.random.default_rng(seed)
+    filings = rng.integers(0, max(count // 200, 1), size=count)
+    return pd.DataFrame({
+        "company_name": [["aapl", "msft", "mstr", "nvda"][filing % 4] for filing in filings],
+        "form_type": [["10-K", "10-Q"][filing % 2] for filing in filings],
+        "date": [f"20{10 + filing % 15}-09-30" for filing in filings],
+        "accession_number": [f"0000320193-24-{filing:06d}" for filing in filings],
+        "page_number": rng.integers(0, 120, size=count),
+        "chunk_char_count": rng.integers(200, 1500, size=count),
+        "chunk_word_count": rng.integers(30, 250, size=count),
+        "chunk_token_count": rng.integers(40, 256, size=count),
+        "content_chunk": [f"chunk {i}: net sales and operating income for the period" for i in range(count)],
+    })
+
+
+def allocated(build) -> tuple[int, float]:
+    """Bytes still allocated once `build()` returns, and how long it took."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    seconds = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size, seconds
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20_000)
+    parser.add_argument("--dim", type=int, default=768)
+    args = parser.parse_args(argv)
+
+    output = np.random.default_rng(1).standard_normal((args.chunks, args.dim), dtype=np.float32)
+
+    def embed() -> np.ndarray:
+        """A fresh float32 (n_chunks, dim) array, as BAAIEmbeddings returns per call."""
+        return output.copy()
+
+    def original():
+        # The pre-compact embed_chunks, which also kept the wide frame as processor.embed_texts
+        chunk_df = synthetic_chunks(args.chunks)
+        embed_texts = pd.DataFrame(embed())
+        chunk_df["embedding"] = embed_texts.apply(lambda row: row.tolist(), axis=1)
+        return chunk_df, embed_texts
+
+    def compact():
+        chunk_df = compact_chunks(synthetic_chunks(args.chunks))
+        return chunk_df, np.ascontiguousarray(embed(), dtype=np.float32)
+
+    original_bytes, original_seconds = allocated(original)
+    compact_bytes, compact_seconds = allocated(compact)
+
+    print(f"{args.chunks} chunks x {args.dim} dims")
+    print(f"object columns + list embeddings: {original_bytes / 2**20:8.1f} MiB ({original_seconds:.2f}s)")
+    print(f"categoricals + float32 array:     {compact_bytes / 2**20:8.1f} MiB ({compact_seconds:.2f}s, {original_bytes / compact_bytes:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
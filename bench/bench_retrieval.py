@@ -0,0 +1,119 @@
+"""
+Per-query latency of FastFilterRetriever's rule-based filters against the
+LLM auto-retriever it falls back to, on a throwaway Chroma collection.
+
+    python -m bench.bench_retrieval [--chunks 5000] [--queries 20] [--llm-delay 0.0]
+
+The auto-retriever's LLM is a local stand-in for Ollama that answers every
+filter request with a fixed query spec after `--llm-delay` seconds, so its
+number is a lower bound: a real model adds its generation time on top.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from bench.bench_store import synthetic_chunks
+
+
+QUERIES = [
+    "AAPL net sales in the 10-K for fiscal 2024",
+    "MSFT operating income in Q2 2024",
+    "NVDA risk factors in the latest 10-Q",
+    "MSTR digital asset impairment in 2024",
+]
+
+# What the LLM is asked to produce: a VectorStoreQuerySpec as JSON
+SPEC = {
+    "query": "net sales",
+    "filters": [{"key": "company_name", "value": "aapl", "operator": "=="}, {"key": "form_type", "value": "10-K", "operator": "=="}],
+    "top_k": None,
+}
+
+
+def make_ollama_handler(delay: float, requests: list):
+    """Handler answering /api/show and non-streaming /api/chat requests as Ollama does. Chat requests are logged to `requests`."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/api/show":
+                body = {"model_info": {"llama.context_length": 8192}}
+            else:
+                requests.append(request)
+                time.sleep(delay)
+                content = f"```json\n{json.dumps(SPEC)}\n```"
+                body = {"model": "llama3.2", "created_at": "2024-11-01T00:00:00Z", "message": {"role": "assistant", "content": content}, "done": True, "done_reason": "stop"}
+
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def timed_queries(retriever, queries: list[str]) -> list[float]:
+    """Seconds per retrieve call, after one untimed warm-up query."""
+    retriever.retrieve(queries[0])
+    seconds = []
+    for query in queries:
+        start = time.perf_counter()
+        retriever.retrieve(query)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def summary(seconds: list[float]) -> str:
+    return f"median {np.median(seconds) * 1000:8.1f} ms, p95 {np.percentile(seconds, 95) * 1000:8.1f} ms"
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=20)
+    parser.add_argument("--dim", type=int, default=384)
+    # Seconds the stand-in LLM takes per filter request; set it to a real model's measured latency
+    parser.add_argument("--llm-delay", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    from llama_index.core.embeddings import MockEmbedding
+    from src.database import vectordb
+    from src.query_filters import FastFilterRetriever
+
+    requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_ollama_handler(args.llm_delay, requests))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            # vectordb keeps chroma_db and the BM25 index under the working directory
+            os.chdir(workdir)
+            db = vectordb(MockEmbedding(embed_dim=args.dim), llm_base_url=f"http://127.0.0.1:{server.server_port}", context_token_budget=0)
+            chunk_df, embeddings = synthetic_chunks(args.chunks, args.dim)
+            db.store_embeddings(chunk_df, embeddings)
+
+            fast = FastFilterRetriever(db.index, db._build_auto_retriever, db.known_tickers, similarity_top_k=20)
+            fast_seconds = timed_queries(fast, queries)
+            auto_seconds = timed_queries(db._build_auto_retriever(), queries)
+            assert fast.fallback_queries == 0, "a benchmark query took the LLM fallback"
+            assert len(requests) == len(queries) + 1, "the auto-retriever did not ask the LLM for filters"
+    finally:
+        server.shutdown()
+
+    print(f"{args.chunks} chunks, {args.queries} queries, stand-in LLM delay {args.llm_delay:.2f}s")
+    print(f"rule-based filters: {summary(fast_seconds)}")
+    print(f"LLM auto-retriever: {summary(auto_seconds)} ({np.median(auto_seconds) / np.median(fast_seconds):.1f}x the rule-based median)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+"""
+Chunks/sec of vectordb.store_embeddings' batched upserts against the
+per-chunk get + add loop it replaced, on a throwaway Chroma collection.
+
+    python -m bench.bench_store [--chunks 100000] [--row-chunks 2000] [--dim 768] [--worker-thread]
+
+The per-chunk loop is timed on `--row-chunks` chunks and extrapolated.
+A second bulk store of the same chunks measures the all-skipped path, and a
+bare upsert of the same vectors (no metadata, documents, existence checks or
+BM25) into a fresh collection is Chroma's own floor for the bulk number.
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+
+
+def synthetic_chunks(count: int, dim: int, seed: int = 0) -> tuple[pd.DataFrame, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    chunk_df = pd.DataFrame({
+        "company_name": pd.Categorical(rng.choice(["aapl", "msft", "mstr", "nvda"], size=count)),
+        "form_type": pd.Categorical(rng.choice(["10-K", "10-Q", "8-K"], size=count)),
+        "date": pd.Categorical(rng.choice(["2024-03-30", "2024-06-29", "2024-09-28"], size=count)),
+        "page_number": rng.integers(0, 120, size=count).astype(np.int32),
+        "content_chunk": [f"chunk {i}: net sales and operating income for the period" for i in range(count)],
+    })
+    embeddings = rng.standard_normal((count, dim), dtype=np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return chunk_df, embeddings
+
+
+def store_row_by_row(collection, chunk_df: pd.DataFrame, embeddings: np.ndarray):
+    """The original store_embeddings: two Chroma round-trips per chunk."""
+    from analysis.dedup import chunk_id
+
+    for position, row in enumerate(chunk_df.itertuples(index=False)):
+        doc_id = chunk_id(row.content_chunk)
+        if not collection.get(ids=[doc_id])["ids"]:
+            collection.add(
+                ids=[doc_id],
+                embeddings=[embeddings[position]],
+                metadatas=[{"company_name": row.company_name, "form_type": row.form_type, "date": row.date, "page_number": int(row.page_number)}],
+                documents=[row.content_chunk],
+            )
+
+
+def main(argv: list[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100_000)
+    parser.add_argument("--row-chunks", type=int, default=2000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--worker-thread", action="store_true")
+    args = parser.parse_args(argv)
+
+    from llama_index.core.embeddings import MockEmbedding
+    from src.database import vectordb
+
+    chunk_df, embeddings = synthetic_chunks(args.chunks, args.dim)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # vectordb keeps chroma_db and the BM25 index under the working directory
+        os.chdir(workdir)
+        db = vectordb(MockEmbedding(embed_dim=args.dim))
+
+        start = time.perf_counter()
+        stored = db.store_embeddings(chunk_df, embeddings, use_worker_thread=args.worker_thread)
+        bulk_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        skipped = db.store_embeddings(chunk_df, embeddings)
+        skip_seconds = time.perf_counter() - start
+
+        rows = chunk_df.head(args.row_chunks).assign(content_chunk=lambda df: "row " + df["content_chunk"])
+        start = time.perf_counter()
+        store_row_by_row(db.collection, rows, embeddings[:len(rows)])
+        row_seconds = (time.perf_counter() - start) * args.chunks / len(rows)
+
+        bare = db.chroma_client.create_collection(name="bench_floor", metadata={"hnsw:space": "ip"})
+        batch_size = db._max_batch_size()
+        start = time.perf_counter()
+        for offset in range(0, args.chunks, batch_size):
+            bare.upsert(ids=[str(i) for i in range(offset, min(offset + batch_size, args.chunks))], embeddings=embeddings[offset:offset + batch_size])
+        floor_seconds = time.perf_counter() - start
+
+    print(f"{args.chunks} chunks x {args.dim} dims")
+    print(f"bulk upsert:       {bulk_seconds:8.1f}s ({args.chunks / bulk_seconds:8.0f} chunks/s, {stored['inserted']} inserted)")
+    print(f"bulk, all skipped: {skip_seconds:8.1f}s ({skipped['skipped']} skipped)")
+    print(f"bare chroma upsert:{floor_seconds:8.1f}s ({args.chunks / floor_seconds:8.0f} chunks/s, ids and vectors only)")
+    print(f"get + add per row: {row_seconds:8.1f}s (extrapolated from {len(rows)} chunks, {row_seconds / bulk_seconds:.0f}x slower)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
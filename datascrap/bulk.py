@@ -0,0 +1,267 @@
+import io
+import os
+import re
+import json
+import asyncio
+import zipfile
+import threading
+from typing import Callable, Iterable, Iterator
+import pandas as pd
+from datascrap.sec_edgar import sec_edgar_api, select_filings, FORM_TYPES, FILINGS_PER_FORM
+from datascrap.ticker_index import TickerIndex
+
+
+_SUBMISSION_MEMBER = re.compile(r"^CIK(\d{10})(-submissions-\d+)?\.json$")
+_ACCESSION = re.compile(r"(\d{10}-\d{2}-\d{6})")
+_HEADER_TAG = re.compile(r"^<(TYPE|SEQUENCE|FILENAME|DESCRIPTION)>(.*)$")
+_WRAPPER_TAG = re.compile(r"^\s*</?XBRL>\s*$", re.IGNORECASE)
+
+
+def iter_documents(lines: Iterable[str], want: Callable[[dict], bool] = None) -> Iterator[dict]:
+    """
+    Split a full-submission .txt (SGML) stream into its <DOCUMENT> sections.
+
+    Yields one dict per document with its type, sequence, filename and
+    description. The body is only accumulated, as `text`, for documents
+    `want(header)` accepts, so unwanted exhibits and XBRL are skipped.
+    """
+    header, body, in_text, keep = None, None, False, False
+
+    for line in lines:
+        stripped = line.rstrip("\r\n")
+
+        if stripped == "<DOCUMENT>":
+            header, body, in_text, keep = {}, [], False, False
+        elif header is None:
+            continue
+        elif stripped == "</DOCUMENT>":
+            if keep:
+                header["text"] = "\n".join(body)
+            yield header
+            header = None
+        elif stripped == "<TEXT>":
+            in_text = True
+            keep = want is None or want(header)
+        elif stripped == "</TEXT>":
+            in_text = False
+        elif in_text:
+            if keep and not _WRAPPER_TAG.match(stripped):
+                body.append(stripped)
+        else:
+            match = _HEADER_TAG.match(stripped)
+            if match:
+                header[match.group(1).lower()] = match.group(2).strip()
+
+
+def primary_document(lines: Iterable[str], primary_filename: str = None, form_type: str = None) -> str:
+    """
+    HTML of a submission's primary document: the one named `primary_filename`,
+    or else the first HTML document of type `form_type`. Returns "" if neither is found.
+    """
+    def is_primary(header: dict) -> bool:
+        filename = header.get("filename", "")
+        if primary_filename:
+            return filename == primary_filename
+        return header.get("type") == form_type and filename.lower().endswith((".htm", ".html"))
+
+    for document in iter_documents(lines, want=is_primary):
+        if "text" in document:
+            return document["text"]
+    return ""
+
+
+class BulkArchive:
+    """
+    EDGAR bulk data on local disk.
+
+    `submissions_path` is the bulk submissions.zip (one CIK##########.json per
+    company plus -submissions-NNN.json pages of older filings).
+    `archives_path` is a directory of full-submission files named by accession
+    number (0000320193-24-000123.txt), or of .zip files containing them, or a
+    single such .zip. Members are read as streams and never extracted.
+    """
+    def __init__(self, submissions_path: str, archives_path: str, tickers_path: str = None):
+        self.submissions_path = submissions_path
+        self.archives_path = archives_path
+        self.tickers_path = tickers_path or os.path.join(os.getcwd(), "filing_cache", "company_tickers.json")
+        self._submission_members = None
+        self._filing_locations = None
+        self._ticker_index = None
+        self._submissions_zip = None
+        self._archive_zips = {}
+        # ZipFile handles are not safe to read from several threads at once
+        self._lock = threading.Lock()
+
+
+    def _submissions(self) -> zipfile.ZipFile:
+        if self._submissions_zip is None:
+            self._submissions_zip = zipfile.ZipFile(self.submissions_path)
+        return self._submissions_zip
+
+
+    def _members(self) -> dict[str, list[str]]:
+        """CIK -> its submissions.zip members, main file first."""
+        if self._submission_members is None:
+            members = {}
+            for name in self._submissions().namelist():
+                match = _SUBMISSION_MEMBER.match(name)
+                if match:
+                    members.setdefault(match.group(1), []).append(name)
+            self._submission_members = {cik: sorted(names, key=len) for cik, names in members.items()}
+        return self._submission_members
+
+
+    def _read_json(self, name: str) -> dict:
+        with self._lock, self._submissions().open(name) as f:
+            return json.load(f)
+
+
+    def ticker_index(self) -> TickerIndex:
+        """
+        Ticker index from the local company_tickers.json when there is one, otherwise
+        built by reading every company's tickers from submissions.zip (slow, once).
+        """
+        if self._ticker_index is not None:
+            return self._ticker_index
+
+        records = None
+        if os.path.exists(self.tickers_path):
+            with open(self.tickers_path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+
+        if records is None:
+            records = {}
+            for cik, names in self._members().items():
+                submission = self._read_json(names[0])
+                for ticker in submission.get("tickers") or []:
+                    records[str(len(records))] = {"cik_str": int(cik), "ticker": ticker, "title": submission.get("name", "")}
+
+        self._ticker_index = TickerIndex(records)
+        return self._ticker_index
+
+
+    def submissions(self, cik: str) -> pd.DataFrame:
+        """All filings of `cik` (recent and older pages) in the submissions "recent" layout."""
+        names = self._members().get(str(cik).zfill(10))
+        if not names:
+            return pd.DataFrame(columns=["accessionNumber", "form", "filingDate", "reportDate", "primaryDocument"])
+
+        frames = []
+        for name in names:
+            data = self._read_json(name)
+            # The main file nests its filings under filings.recent, older pages are the columns themselves
+            columns = data["filings"]["recent"] if "filings" in data else data
+            frames.append(pd.DataFrame.from_dict(columns))
+        return pd.concat(frames, ignore_index=True)
+
+
+    def _locations(self) -> dict[str, tuple[str, str | None]]:
+        """Accession number -> (file path, zip member or None) of every full submission under `archives_path`."""
+        if self._filing_locations is not None:
+            return self._filing_locations
+
+        paths = []
+        if os.path.isdir(self.archives_path):
+            for root, _, files in os.walk(self.archives_path):
+                paths.extend(os.path.join(root, name) for name in files)
+        else:
+            paths.append(self.archives_path)
+
+        locations = {}
+        for path in paths:
+            if path.lower().endswith(".zip"):
+                with zipfile.ZipFile(path) as archive:
+                    for member in archive.namelist():
+                        match = _ACCESSION.search(os.path.basename(member))
+                        if match and member.lower().endswith(".txt"):
+                            locations[match.group(1)] = (path, member)
+            elif path.lower().endswith(".txt"):
+                match = _ACCESSION.search(os.path.basename(path))
+                if match:
+                    locations[match.group(1)] = (path, None)
+
+        self._filing_locations = locations
+        return locations
+
+
+    def read_primary(self, accession_number: str, primary_filename: str = None, form_type: str = None) -> str:
+        """Stream one submission and return its primary document's HTML, or "" if it is not in the archives."""
+        location = self._locations().get(accession_number)
+        if location is None:
+            return ""
+
+        path, member = location
+        if member is None:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                return primary_document(f, primary_filename, form_type)
+
+        with self._lock:
+            archive = self._archive_zips.get(path)
+            if archive is None:
+                archive = self._archive_zips[path] = zipfile.ZipFile(path)
+            with archive.open(member) as raw:
+                return primary_document(io.TextIOWrapper(raw, encoding="utf-8", errors="replace"), primary_filename, form_type)
+
+
+    def close(self):
+        if self._submissions_zip is not None:
+            self._submissions_zip.close()
+        for archive in self._archive_zips.values():
+            archive.close()
+        self._archive_zips.clear()
+
+
+class BulkEdgarApi(sec_edgar_api):
+    """
+    sec_edgar_api served from a BulkArchive instead of the network.
+
+    Filing metadata comes from submissions.zip with the same form filters as
+    the online path, and filings are the primary documents of the local
+    full-submission files, so SECDataProcessor works on it unchanged.
+    """
+    def __init__(self, company_ticker, archive: BulkArchive, forms: list[str] = FORM_TYPES, per_form: int = FILINGS_PER_FORM):
+        self.archive = archive
+        self.forms = forms
+        self.per_form = per_form
+        self.downloader = None
+        self.cache = None
+        self.archives_url = None
+        self.submissions_url = None
+        self.company_tickers_url = None
+        self.ticker_index = archive.ticker_index()
+        self.filing_metadata = pd.DataFrame()
+        self.filings = []
+        self.cik = self.findCIK(company_ticker)
+
+
+    def retrieve_company_filing_metadata(self, exclude_accessions: set[str] = None):
+        self.filing_metadata = select_filings(self.archive.submissions(self.cik), exclude_accessions, self.forms, self.per_form)
+
+
+    async def fetch_company_filing_metadata(self, exclude_accessions: set[str] = None):
+        await asyncio.to_thread(self.retrieve_company_filing_metadata, exclude_accessions)
+
+
+    def _read_filing(self, index: int) -> str:
+        _, primary_document, form_type, _ = self.get_metadata(index)
+        accession_number = self.filing_metadata.iloc[index]['accessionNumber']
+        return self.archive.read_primary(accession_number, primary_document, form_type)
+
+
+    async def fetch_filing(self, index: int) -> str:
+        return await asyncio.to_thread(self._read_filing, index)
+
+
+    async def _get_filing_data(self) -> list[str]:
+        if self.filing_metadata.empty:
+            print("Filing metadata is empty")
+            return []
+        return await asyncio.to_thread(lambda: [self._read_filing(index) for index in range(len(self.filing_metadata))])
+
+
+    async def get_filings(self):
+        self.filings = await self._get_filing_data()
+
+        missing = sum(not filing for filing in self.filings)
+        if missing:
+            print(f"⚠️ Warning: {missing} filings are not in the local archives.")
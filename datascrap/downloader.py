@@ -0,0 +1,193 @@
+import asyncio
+import random
+import time
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# SEC fair-access policy allows at most 10 requests per second per client
+SEC_MAX_REQUESTS_PER_SECOND = 10.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token bucket that caps the request rate across all tasks and threads.
+
+    Each caller reserves a token up front and then waits until it is due, so
+    tokens are handed out in arrival order. The balance goes negative while
+    reservations are waiting for the refill.
+    """
+    def __init__(self, rate: float = SEC_MAX_REQUESTS_PER_SECOND, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+
+    def _reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+
+    async def acquire(self):
+        """Wait until a token is available and consume it."""
+        delay = self._reserve()
+        if delay:
+            await asyncio.sleep(delay)
+
+
+    def acquire_blocking(self):
+        """acquire() for code running on a worker thread."""
+        delay = self._reserve()
+        if delay:
+            time.sleep(delay)
+
+
+def fetch_with_selenium(url: str, render_wait: float = 5.0) -> str:
+    """Render a page with headless Chrome. Only used as an opt-in fallback."""
+    from selenium import webdriver
+    from selenium.webdriver.chrome.options import Options
+
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36"
+
+    options = Options()
+    options.add_argument("--headless")
+    options.add_argument("--disable-gpu")
+    options.add_argument("--no-sandbox")
+    options.add_argument("--disable-dev-shm-usage")
+    options.add_argument(f"user-agent={USER_AGENT}")
+
+    driver = webdriver.Chrome(options=options)
+    try:
+        driver.get(url)
+        time.sleep(render_wait)
+        return driver.page_source
+    finally:
+        driver.quit()
+
+
+class FilingDownloader:
+    """
+    Downloads SEC documents over one shared keep-alive connection pool.
+
+    Requests are rate limited with a token bucket, concurrency is capped by the
+    pool size and failed requests are retried with jittered exponential backoff.
+    """
+    def __init__(
+        self,
+        headers: dict = None,
+        rate: float = SEC_MAX_REQUESTS_PER_SECOND,
+        max_connections: int = 10,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        backoff_max: float = 8.0,
+        timeout: float = 30.0,
+        use_selenium_fallback: bool = False,
+    ):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+        self.bucket = TokenBucket(rate)
+        self.max_connections = max_connections
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.use_selenium_fallback = use_selenium_fallback
+        self._semaphore = asyncio.Semaphore(max_connections)
+
+
+    def _backoff(self, attempt: int, retry_after: str = None) -> float:
+        """Full-jitter exponential backoff, honouring Retry-After when the server sends it."""
+        if retry_after:
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+
+    def _get(self, url: str) -> requests.Response:
+        return self.session.get(url, timeout=self.timeout)
+
+
+    def get(self, url: str) -> requests.Response:
+        """Blocking GET through the shared session and rate limiter, without retries."""
+        self.bucket.acquire_blocking()
+        return self._get(url)
+
+
+    async def _request(self, url: str) -> requests.Response | None:
+        """Rate-limited GET with retries. Returns the 200 response, or None if every attempt failed."""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.acquire()
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    response = await asyncio.to_thread(self._get, url)
+
+                if response.status_code == 200:
+                    return response
+
+                if response.status_code not in RETRY_STATUS_CODES:
+                    print(f"❌ {url} returned HTTP {response.status_code}")
+                    break
+
+                retry_after = response.headers.get("Retry-After")
+                print(f"⚠️ {url} returned HTTP {response.status_code} (attempt {attempt + 1})")
+
+            except requests.exceptions.RequestException as e:
+                print(f"⚠️ Failed to fetch {url} (attempt {attempt + 1}): {e}")
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        return None
+
+
+    async def fetch(self, url: str) -> str:
+        """
+        Fetch a single document asynchronously.
+        Returns the document text, or an empty string if every attempt failed.
+        """
+        response = await self._request(url)
+        if response is not None:
+            return response.text
+
+        if self.use_selenium_fallback:
+            print(f"🔄 Falling back to Selenium for {url}")
+            try:
+                return await asyncio.to_thread(fetch_with_selenium, url)
+            except Exception as e:
+                print(f"❌ Selenium fallback failed for {url}: {e}")
+
+        return ""
+
+
+    async def fetch_json(self, url: str):
+        """Fetch and decode a JSON document. Raises requests.RequestException if every attempt failed."""
+        response = await self._request(url)
+        if response is None:
+            raise requests.exceptions.RequestException(f"Failed to fetch {url} after {self.max_retries} retries")
+        return response.json()
+
+
+    async def fetch_all(self, urls: list[str]) -> list[str]:
+        """Fetch every url concurrently. Results are returned in the order of `urls`."""
+        return await asyncio.gather(*(self.fetch(url) for url in urls))
+
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,113 @@
+import os
+import gzip
+import hashlib
+import threading
+from utils.atomic import atomic_write
+
+
+class FilingCache:
+    """
+    Persistent on-disk cache of raw filing HTML.
+
+    Filings are immutable once published, so entries are keyed by
+    (cik, accession_number, primary_document) and never go stale. Blobs are
+    stored gzip-compressed under a content-addressed path, written atomically,
+    and evicted least-recently-used first once `max_bytes` is exceeded.
+    """
+    def __init__(self, root: str = None, max_bytes: int = 2 * 1024 ** 3, compress_level: int = 6):
+        self.root = root or os.path.join(os.getcwd(), "filing_cache")
+        self.max_bytes = max_bytes
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        self._size = None
+        os.makedirs(self.root, exist_ok=True)
+
+
+    @staticmethod
+    def make_key(cik, accession_number: str, primary_document: str) -> str:
+        raw = f"{int(cik)}/{accession_number.replace('-', '')}/{primary_document}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.html.gz")
+
+
+    def get(self, cik, accession_number: str, primary_document: str) -> str | None:
+        """Return the cached filing, or None on a miss. A hit refreshes the entry's LRU position."""
+        path = self._path(self.make_key(cik, accession_number, primary_document))
+        try:
+            with gzip.open(path, "rb") as f:
+                html = f.read().decode("utf-8")
+        except (FileNotFoundError, EOFError, OSError):
+            return None
+
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return html
+
+
+    def put(self, cik, accession_number: str, primary_document: str, html: str):
+        """Atomically store a filing, then evict old entries if the cache is over budget."""
+        if not html:
+            return
+
+        path = self._path(self.make_key(cik, accession_number, primary_document))
+        blob = gzip.compress(html.encode("utf-8"), compresslevel=self.compress_level)
+
+        previous = os.path.getsize(path) if os.path.exists(path) else 0
+        with atomic_write(path, fsync=True) as f:
+            f.write(blob)
+
+        with self._lock:
+            if self._size is not None:
+                self._size += len(blob) - previous
+        self.evict()
+
+
+    def _entries(self) -> list[tuple[float, int, str]]:
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith(".html.gz"):
+                    continue
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+
+    def size(self) -> int:
+        """Total compressed bytes currently held in the cache."""
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            return self._size
+
+
+    def evict(self):
+        """Remove least-recently-used entries until the cache fits in `max_bytes`."""
+        if self.size() <= self.max_bytes:
+            return
+
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except FileNotFoundError:
+                    total -= size
+            self._size = total
+
+
+    def __contains__(self, key: tuple) -> bool:
+        return os.path.exists(self._path(self.make_key(*key)))
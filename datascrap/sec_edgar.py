@@ -1,92 +1,141 @@
 import requests
 import pandas as pd
 import os
-import time
-import asyncio
 import json
-from xhtml2pdf import pisa
-from selenium import webdriver
-from selenium.webdriver.chrome.options import Options
-from dotenv import load_dotenv
+from functools import lru_cache
+from datascrap.downloader import FilingDownloader
+from datascrap.filing_cache import FilingCache
+from datascrap.ticker_index import TickerIndex, load_ticker_index
 
 
-load_dotenv()
-headers_str = os.getenv("HEADERS")  # This is still a string
-headers = json.loads(headers_str)
+@lru_cache(maxsize=1)
+def load_headers() -> dict:
+    """SEC request headers from the HEADERS json in .env, read on first use rather than at import"""
+    from dotenv import load_dotenv
+
+    load_dotenv()
+    headers_str = os.getenv("HEADERS")  # This is still a string
+    if not headers_str:
+        raise ValueError("HEADERS is not set. Add the SEC request headers as json to .env.")
+    return json.loads(headers_str)
+
+ARCHIVES_URL = "https://www.sec.gov/Archives/edgar/data"
+SUBMISSIONS_URL = "https://data.sec.gov/submissions"
+COMPANY_TICKERS_URL = "https://www.sec.gov/files/company_tickers.json"
+
+# Forms ingested and how many of the most recent filings to keep per form
+FORM_TYPES = ["10-K", "10-Q", "8-K"]
+FILINGS_PER_FORM = 5
+
+
+def select_filings(df: pd.DataFrame, exclude_accessions: set[str] = None, forms: list[str] = FORM_TYPES, per_form: int = FILINGS_PER_FORM) -> pd.DataFrame:
+    """
+    Keep the `per_form` most recent filings of each form in `forms` from a
+    submissions "recent"-style frame. `per_form=None` keeps them all.
+    Filings whose accession number is in `exclude_accessions` are dropped.
+    """
+    df = df[df['form'].isin(forms)]
+    df = df.sort_values(by=['form', 'filingDate'], ascending=[True, False])
+    if per_form is not None:
+        df = df.groupby('form').head(per_form)
+
+    if exclude_accessions:
+        df = df[~df['accessionNumber'].isin(exclude_accessions)]
+
+    return df.reset_index(drop=True)
 
 
 class sec_edgar_api:
-    def __init__(self, company_ticker):
-        self.company_data = self.load_company_tickers()
+    """
+    Filing metadata and documents of one company from SEC EDGAR.
+
+    The archives, submissions and company_tickers.json URLs default to SEC's
+    and can be pointed at a local stand-in server.
+    """
+    def __init__(
+        self,
+        company_ticker,
+        downloader: FilingDownloader = None,
+        use_selenium: bool = False,
+        archives_url: str = ARCHIVES_URL,
+        cache: FilingCache = None,
+        use_cache: bool = True,
+        submissions_url: str = SUBMISSIONS_URL,
+        company_tickers_url: str = COMPANY_TICKERS_URL,
+    ):
+        self.downloader = downloader or FilingDownloader(load_headers(), use_selenium_fallback=use_selenium)
+        self.cache = (cache or FilingCache()) if use_cache else None
+        self.archives_url = archives_url
+        self.submissions_url = submissions_url
+        self.company_tickers_url = company_tickers_url
+        self.ticker_index = self.load_company_tickers()
         self.filing_metadata = pd.DataFrame()
         self.filings = []
         self.cik = self.findCIK(company_ticker)
     
 
-    def load_company_tickers(self):
-        """Load CIK json from SEC"""
-        try:
-            #get all companyTickers
-            companyTickers = requests.get(
-                "https://www.sec.gov/files/company_tickers.json",
-                headers=headers
-            )
-            companyTickers.raise_for_status()
+    def _fetch_company_tickers(self) -> dict:
+        """Download CIK json from SEC"""
+        companyTickers = self.downloader.get(self.company_tickers_url)
+        companyTickers.raise_for_status()
+        return companyTickers.json()
 
-            #dictionary to dataframe
-            company_data = pd.DataFrame.from_dict(companyTickers.json(), orient='index')
 
-            #add leading zeros to CIK
-            company_data['cik_str'] = company_data['cik_str'].astype(str).str.zfill(10)
+    def load_company_tickers(self) -> TickerIndex:
+        """Load the process-wide ticker index, refreshing the local copy of the CIK json when it expires"""
+        try:
+            return load_ticker_index(self._fetch_company_tickers)
 
-            return company_data
-        
         except requests.exceptions.RequestException as e:
             print(f"Failed to fetch company tickers: {e}")
-            return pd.DataFrame()
+            return TickerIndex({})
 
 
-    def findCIK(self, ticker: str) -> int:
+    def findCIK(self, ticker: str) -> str:
         """Find CIK that matches the ticker"""
-        if self.company_data.empty:
+        if not len(self.ticker_index):
             print('company_data is empty')
             return 0
-        
-        try:
-            # Find cik in the dataframe
-            result = self.company_data[self.company_data['ticker'] == ticker.upper()]['cik_str']
 
-            if not result.empty:
-                return result.iloc[0]
-            else:
-                return f"Ticker '{ticker}' not found in the data."
+        cik = self.ticker_index.cik(ticker)
 
-        except KeyError:
-            return "The 'ticker' or 'cik_str' column is missing in the DataFrame."
+        if cik is not None:
+            return cik
+        else:
+            return f"Ticker '{ticker}' not found in the data."
         
     
-    def retrieve_company_filing_metadata(self):
-        """Retrieve company filing from SEC EDGAR"""
+    def _select_filings(self, submissions: dict, exclude_accessions: set[str] = None):
+        # Create dataframe from a dictionary
+        df = pd.DataFrame.from_dict(submissions['filings']['recent'])
+
+        # Filter recent 5 "10-K", "10-Q", "8-K" forms
+        self.filing_metadata = select_filings(df, exclude_accessions)
+
+
+    def retrieve_company_filing_metadata(self, exclude_accessions: set[str] = None):
+        """
+        Retrieve company filing from SEC EDGAR
+        Filings whose accession number is in `exclude_accessions` are dropped.
+        """
         try:
-            filing_metadata = requests.get(
-                f'https://data.sec.gov/submissions/CIK{self.cik}.json',
-                headers=headers
-            )
-            # Create dataframe from a dictionary
-            df = pd.DataFrame.from_dict(filing_metadata.json()['filings']['recent'])
-
-            # Filter recent 5 "10-K", "10-Q", "8-K" forms
-            df = df[df['form'].isin(["10-K", "10-Q", "8-K"])]
-            df = df.sort_values(by=['form', 'filingDate'], ascending=[True, False])
-            df = df.groupby('form').head(5)
-            df = df.reset_index(drop=True)
-
-            self.filing_metadata = df
+            filing_metadata = self.downloader.get(f'{self.submissions_url}/CIK{self.cik}.json')
+            self._select_filings(filing_metadata.json(), exclude_accessions)
         
         except requests.exceptions.RequestException as e:
             print(f"Failed to fetch filings metadata for CIK {self.cik}: {e}")
 
 
+    async def fetch_company_filing_metadata(self, exclude_accessions: set[str] = None):
+        """retrieve_company_filing_metadata without blocking the event loop, with the downloader's retries."""
+        try:
+            submissions = await self.downloader.fetch_json(f'{self.submissions_url}/CIK{self.cik}.json')
+            self._select_filings(submissions, exclude_accessions)
+
+        except requests.exceptions.RequestException as e:
+            print(f"Failed to fetch filings metadata for CIK {self.cik}: {e}")
+
+
     def get_accession_number_by_index(self, index: int) -> str:
         """Retrieve accession_number from the dataframe"""
         if not self.filing_metadata.empty:
@@ -142,105 +191,85 @@ class sec_edgar_api:
         return self.get_accession_number_by_index(index), self.get_primary_document_by_index(index), self.get_form_type(index), self.get_report_date(index)
 
 
+    def get_filing_url(self, index: int) -> str:
+        """Build the EDGAR archive url of the filing at `index`"""
+        accession_number, primary_document, _, _ = self.get_metadata(index)
+        return f"{self.archives_url}/{int(self.cik)}/{accession_number}/{primary_document}"
+
+
     def get_filing_data(self, index) -> str:
         if self.filing_metadata.empty:
             print('company_data is empty')
             return 0
-        
-        accession_number, primary_document, _, _ = self.get_metadata(index)
 
-        url = f"https://www.sec.gov/Archives/edgar/data/{int(self.cik)}/{accession_number}/{primary_document}"
+        url = self.get_filing_url(index)
         print(url)
 
-        USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36"
+        return self.downloader.get(url).text
 
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")  
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument(f"user-agent={USER_AGENT}")
 
-        driver = webdriver.Chrome(options=options)
-        driver.get(url)
-
-        sec_document = driver.page_source
+    async def fetch_filing(self, index: int) -> str:
+        """Fetch a single filing, serving it from the local cache when possible."""
+        accession_number, primary_document, _, _ = self.get_metadata(index)
+        cached = self.cache.get(self.cik, accession_number, primary_document) if self.cache else None
+        if cached:
+            return cached
 
-        driver.quit()
+        url = self.get_filing_url(index)
+        print(f"Fetching: {url}")
+        html = await self.downloader.fetch(url)
 
-        return sec_document
+        if html and self.cache:
+            self.cache.put(self.cik, accession_number, primary_document, html)
+        return html
 
 
     async def _get_filing_data(self) -> list[str]:
         """
         Asynchronously fetches HTML filing data for all filings in self.filing_metadata.
-        Returns a list of HTML content.
+        Filings already in the local cache skip the network entirely.
+        Returns a list of HTML content in metadata order. Failed downloads are empty strings.
         """
         if self.filing_metadata.empty:
             print("Filing metadata is empty")
             return []
 
-        USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36"
-
-        options = Options()
-        options.add_argument("--headless")
-        options.add_argument("--disable-gpu")
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        options.add_argument(f"user-agent={USER_AGENT}")
+        results = [""] * len(self.filing_metadata)
+        missing = []
 
-        async def fetch_filing(index: int) -> str:
-            """
-            Fetches the SEC filing HTML document asynchronously for a given index.
-            """
+        for index in range(len(self.filing_metadata)):
             accession_number, primary_document, _, _ = self.get_metadata(index)
+            cached = self.cache.get(self.cik, accession_number, primary_document) if self.cache else None
+            if cached:
+                results[index] = cached
+            else:
+                missing.append(index)
 
-            url = f"https://www.sec.gov/Archives/edgar/data/{int(self.cik)}/{accession_number}/{primary_document}"
-            print(f"Fetching: {url}")
-
-            # Function to run Selenium in a separate thread
-            def fetch_html():
-                driver = webdriver.Chrome(options=options)
-                driver.get(url)
-                time.sleep(5)
-                page_source = driver.page_source
-                driver.quit()
-                return page_source
+        if len(missing) < len(results):
+            print(f"Loaded {len(results) - len(missing)} filings from cache")
 
-            return await asyncio.to_thread(fetch_html)  # Runs Selenium in a separate thread
+        urls = [self.get_filing_url(index) for index in missing]
+        for url in urls:
+            print(f"Fetching: {url}")
 
-        # Create a list of tasks for each filing
-        tasks = [fetch_filing(index) for index in range(len(self.filing_metadata))]
+        downloaded = await self.downloader.fetch_all(urls)
 
-        # Run all requests concurrently
-        results = await asyncio.gather(*tasks)
+        for index, html in zip(missing, downloaded):
+            results[index] = html
+            if html and self.cache:
+                accession_number, primary_document, _, _ = self.get_metadata(index)
+                self.cache.put(self.cik, accession_number, primary_document, html)
 
         return results
 
 
     async def get_filings(self):
-        self.filings =  await self._get_filing_data()
+        self.filings = await self._get_filing_data()
 
         missing_indices = [i for i, filing in enumerate(self.filings) if not filing]
 
         if missing_indices:
-            print(f"⚠️ Warning: {len(missing_indices)} filings failed to retrieve.")
-            await self._retry_missing_filings(missing_indices)
-
-
-    async def _retry_missing_filings(self, missing_indices):
-        """Reattempt downloading the missing filings asynchronously."""
-        print(f"🔄 Retrying {len(missing_indices)} missing filings...")
-
-        # Retry only the missing filings
-        tasks = [self._fetch_filing(i) for i in missing_indices]
-        results = await asyncio.gather(*tasks)
-
-        # Update `self.filings` with the retried results
-        for i, result in zip(missing_indices, results):
-            self.filings[i] = result
-
-        print(f"✅ Finished retrying. Missing filings recovered: {sum(bool(r) for r in results)}")
+            print(f"⚠️ Warning: {len(missing_indices)} filings failed to retrieve after {self.downloader.max_retries} retries.")
 
 
     def download_document(self, cik:str, accession_number:str, primary_document:str):
@@ -249,36 +278,26 @@ class sec_edgar_api:
             return 0
 
         try:
-            url = f"https://www.sec.gov/Archives/edgar/data/{int(cik)}/{accession_number}/{primary_document}"
+            url = f"{self.archives_url}/{int(cik)}/{accession_number}/{primary_document}"
             print(url)
 
-            USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36"
+            response = self.downloader.get(url)
+            response.raise_for_status()
+            sec_document = response.text
 
-            options = Options()
-            options.add_argument("--headless")
-            options.add_argument("--disable-gpu")  
-            options.add_argument("--no-sandbox")
-            options.add_argument("--disable-dev-shm-usage")
-            options.add_argument(f"user-agent={USER_AGENT}")
-
-            driver = webdriver.Chrome(options=options)
-            driver.get(url)
-
-            sec_document = driver.page_source
-
-            driver.quit()
-
-            # Retrieve ticker_id and form type from the dataframe
-            ticker_id = self.company_data[self.company_data['cik_str'] == cik]['ticker'].iloc[0]
+            # Retrieve ticker_id from the index and form type from the dataframe
+            ticker_id = self.ticker_index.ticker(cik)
             form_type = self.filing_metadata[self.filing_metadata['primaryDocument'] == primary_document]['form'].iloc[0]
 
             # Set filename and path
             pdf_filename = f"{ticker_id}_{cik}_{form_type}.pdf"
             file_path = os.path.join("./reports/sources/", pdf_filename)
 
+            from xhtml2pdf import pisa
+
             # Write the file in bytes
             with open(file_path, "wb") as pdf_file:
-                pisa_status = pisa.CreatePDF(sec_document.text, dest=pdf_file)
+                pisa_status = pisa.CreatePDF(sec_document, dest=pdf_file)
 
             if pisa_status.err:
                 print("❌ Error occurred while converting HTML to PDF")
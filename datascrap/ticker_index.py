@@ -0,0 +1,99 @@
+import os
+import json
+import time
+import threading
+from typing import Callable
+from utils.atomic import atomic_write
+
+
+DEFAULT_TTL = 24 * 60 * 60
+
+_index = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+class TickerIndex:
+    """Dict-backed ticker <-> CIK lookups built from SEC's company_tickers.json."""
+    def __init__(self, records: dict):
+        self._by_ticker = {}
+        self._by_cik = {}
+        self._titles = {}
+
+        for row in records.values():
+            cik = str(row["cik_str"]).zfill(10)
+            ticker = str(row["ticker"]).upper()
+            self._by_ticker.setdefault(ticker, cik)
+            # SEC lists a company's primary ticker first, keep that one for reverse lookups
+            self._by_cik.setdefault(cik, ticker)
+            self._titles.setdefault(cik, row.get("title", ""))
+
+
+    def cik(self, ticker: str) -> str | None:
+        """Return the zero-padded CIK of `ticker`, or None if unknown."""
+        return self._by_ticker.get(ticker.upper())
+
+
+    def ticker(self, cik) -> str | None:
+        """Return the primary ticker registered under `cik`, or None if unknown."""
+        return self._by_cik.get(str(cik).zfill(10))
+
+
+    def title(self, cik) -> str | None:
+        return self._titles.get(str(cik).zfill(10))
+
+
+    def __len__(self) -> int:
+        return len(self._by_ticker)
+
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker.upper() in self._by_ticker
+
+
+def _read(path: str) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _write(path: str, records: dict):
+    with atomic_write(path, "w") as f:
+        json.dump(records, f)
+
+
+def load_ticker_index(fetch: Callable[[], dict], path: str = None, ttl: float = DEFAULT_TTL) -> TickerIndex:
+    """
+    Return the process-wide TickerIndex.
+
+    The index is built once per process. Its source JSON is persisted at `path` and
+    only re-downloaded through `fetch` once the file is older than `ttl` seconds.
+    A stale copy is used if the refresh fails.
+    """
+    global _index, _loaded_at
+    path = path or os.path.join(os.getcwd(), "filing_cache", "company_tickers.json")
+
+    with _lock:
+        now = time.time()
+        if _index is not None and now - _loaded_at < ttl:
+            return _index
+
+        records = None
+        if os.path.exists(path) and now - os.path.getmtime(path) < ttl:
+            records = _read(path)
+
+        if records is None:
+            try:
+                records = fetch()
+                _write(path, records)
+            except Exception:
+                records = _read(path)
+                if records is None:
+                    raise
+                print("⚠️ Failed to refresh company tickers, using the cached copy.")
+
+        _index = TickerIndex(records)
+        _loaded_at = now
+        return _index
@@ -1,35 +1,39 @@
 import asyncio
+from concurrent.futures import ProcessPoolExecutor
 from src.sec_loader import SECDataProcessor
 from src.database import vectordb
+from src.pipeline import StreamingPipeline
+from src.run_manifest import RunManifest
+from analysis.dedup import NearDuplicateIndex
+from src.table_store import TableStore
+from src.fact_index import FactIndex
 
 
 async def main(company_ticker):
-    processor = SECDataProcessor(company_ticker)
+    facts = FactIndex()
+    processor = SECDataProcessor(company_ticker, incremental=True, min_chunk_tokens=16, near_duplicates=NearDuplicateIndex(), table_store=TableStore(facts=facts))
     processor.setup_embeddings()
-    db = vectordb(processor.embed_model)
+    db = vectordb(processor.embed_model, fact_index=facts)
 
     debug = False
     
     if debug:
-        await processor.fetch_filings()
-        await processor.process_filings()
-
-        processor.encode_texts()
-
-        print("Storing Embeddings to db...")
-        db.store_embeddings(processor.chunk_df)
-        print("Storing done")
+        # Checkpointed under runs/, so rerunning after a crash resumes each filing where it stopped
+        pipeline = StreamingPipeline(processor, db, manifest=RunManifest(processor.sec_api.cik))
+        with ProcessPoolExecutor() as parse_executor:
+            # Parses several filings at once in worker processes
+            processor.parse_executor = parse_executor
+            stats = await pipeline.run()
+        print(stats.to_string(index=False))
+        print(f"Storing done: {pipeline.inserted} inserted, {pipeline.chunks - pipeline.inserted} skipped")
 
-    processor.table_df.to_csv('tables.csv')
-    
     db.check_chroma_db()
 
     print("Generating Response...")
     prompt = "in thorough details. tell me the prospect of the company"
     #print(db.retrieved_query(prompt))
-    print(db.query(prompt))
-
-    # TODO - Need to remove chunks with low token
+    async for token in db.astream_query(prompt):
+        print(token, end="", flush=True)
 
 
 if __name__ == "__main__":
@@ -38,8 +42,6 @@ if __name__ == "__main__":
     processor = SECDataProcessor(company_ticker)
     processor.setup_embeddings()
     db = vectordb(processor.embed_model)
-    processor.table_df.to_csv('tables.csv')
-    
     db.check_chroma_db()
 
     print("Generating Response...")
@@ -0,0 +1,171 @@
+import sys
+import time
+import asyncio
+from typing import TYPE_CHECKING
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from tqdm import tqdm
+from datascrap.sec_edgar import load_headers
+from datascrap.downloader import FilingDownloader
+from datascrap.filing_cache import FilingCache
+from datascrap.bulk import BulkArchive, BulkEdgarApi
+from analysis.embedding_cache import EmbeddingCache
+from analysis.dedup import NearDuplicateIndex
+from src.sec_loader import SECDataProcessor
+from src.pipeline import StreamingPipeline
+from src.run_manifest import RunManifest
+from src.sync_state import SyncState
+from src.table_store import TableStore
+from src.fact_index import FactIndex
+
+if TYPE_CHECKING:
+    from analysis.embedding import BAAIEmbeddings
+    from src.database import vectordb
+
+
+class BatchIngestor:
+    """
+    Ingests a watchlist of tickers with shared resources.
+
+    One download pool (and its rate limiter), one filing cache, one embedding
+    model and one vector db are shared by every ticker, and filings are parsed
+    in one shared process pool. Each ticker streams through a StreamingPipeline,
+    so fetching and parsing of up to `concurrency` tickers overlap, while
+    embedding and storing are serialised on the shared model and Chroma client
+    off the event loop. With `checkpoint`, every ticker's run is checkpointed
+    in a RunManifest, and a rerun after a crash resumes each filing from its
+    last completed stage.
+
+    With an `archive`, filings are read from local EDGAR bulk files instead of
+    being downloaded, for offline backfills.
+    """
+    def __init__(self, concurrency: int = 8, incremental: bool = True, embed_model: "BAAIEmbeddings" = None, db: "vectordb" = None, parse_workers: int = None, near_duplicate_threshold: float = 0.8, archive: BulkArchive = None, checkpoint: bool = True):
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint
+        self.parse_executor = ProcessPoolExecutor(max_workers=parse_workers)
+        self.incremental = incremental
+        self.archive = archive
+        self.downloader = FilingDownloader(load_headers()) if archive is None else None
+        self.cache = FilingCache()
+        self.sync_state = SyncState() if incremental else None
+        self.table_store = TableStore(facts=FactIndex())
+        # Imported here so importing the module does not load llama_index, chromadb and the model stack
+        from llama_index.core.settings import Settings
+        from analysis.embedding import BAAIEmbeddings
+        from src.database import vectordb
+
+        self.embed_model = embed_model or BAAIEmbeddings()
+        Settings.embed_model = self.embed_model
+        self.embedding_cache = EmbeddingCache(self.embed_model._model_name, self.embed_model._instruction)
+        self.near_duplicates = NearDuplicateIndex(threshold=near_duplicate_threshold) if near_duplicate_threshold else None
+        self.db = db or vectordb(self.embed_model)
+
+        self._embed_lock = asyncio.Lock()
+        self._store_lock = asyncio.Lock()
+
+
+    def _processor(self, ticker: str) -> SECDataProcessor:
+        """
+        Build the processor of one ticker on the shared resources. Blocking (the
+        ticker index may be fetched or read from disk), so run it off the event loop.
+        """
+        return SECDataProcessor(
+            ticker,
+            incremental=self.incremental,
+            sync_state=self.sync_state,
+            downloader=self.downloader,
+            cache=self.cache,
+            embed_model=self.embed_model,
+            parse_executor=self.parse_executor,
+            embedding_cache=self.embedding_cache,
+            near_duplicates=self.near_duplicates,
+            table_store=self.table_store,
+            sec_api=BulkEdgarApi(ticker, self.archive) if self.archive is not None else None,
+        )
+
+
+    async def ingest_ticker(self, ticker: str) -> dict:
+        """Fetch, parse, embed and store one ticker. Returns a per-ticker report row."""
+        report = {"ticker": ticker, "status": "ok", "filings": 0, "chunks": 0, "inserted": 0, "error": None, "seconds": 0.0}
+        start = time.perf_counter()
+
+        try:
+            processor = await asyncio.to_thread(self._processor, ticker)
+            if processor.sec_api.ticker_index.cik(ticker) is None:
+                raise ValueError(f"Ticker '{ticker}' not found in the data.")
+
+            pipeline = StreamingPipeline(
+                processor,
+                self.db,
+                manifest=RunManifest(processor.sec_api.cik) if self.checkpoint else None,
+                embed_lock=self._embed_lock,
+                store_lock=self._store_lock,
+            )
+            await pipeline.run()
+            report["filings"] = len(processor.processed_accessions)
+            report["chunks"] = pipeline.chunks
+            report["inserted"] = pipeline.inserted
+
+            if not report["filings"]:
+                report["status"] = "up to date" if self.incremental else "no filings"
+
+        except Exception as e:
+            report["status"] = "failed"
+            report["error"] = f"{type(e).__name__}: {e}"
+
+        finally:
+            report["seconds"] = round(time.perf_counter() - start, 2)
+
+        return report
+
+
+    async def run(self, tickers: list[str]) -> pd.DataFrame:
+        """Ingest every ticker in `tickers` and return one report row per ticker."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        progress = tqdm(total=len(tickers), desc="Ingesting Tickers")
+
+        async def worker(ticker: str) -> dict:
+            async with semaphore:
+                report = await self.ingest_ticker(ticker)
+            progress.update(1)
+            if report["status"] == "failed":
+                progress.write(f"❌ {ticker}: {report['error']}")
+            else:
+                progress.write(f"✅ {ticker}: {report['status']} ({report['filings']} filings, {report['chunks']} chunks, {report['inserted']} new, {report['seconds']}s)")
+            return report
+
+        try:
+            reports = await asyncio.gather(*(worker(ticker) for ticker in tickers))
+        finally:
+            progress.close()
+
+        return pd.DataFrame(reports)
+
+
+    def close(self):
+        self.parse_executor.shutdown()
+        self.embedding_cache.save()
+        if self.downloader is not None:
+            self.downloader.close()
+        if self.archive is not None:
+            self.archive.close()
+
+
+def load_watchlist(path: str) -> list[str]:
+    """Read one ticker per line, ignoring blanks, comments and duplicates."""
+    with open(path, "r", encoding="utf-8") as f:
+        tickers = [line.split("#")[0].strip().lower() for line in f]
+    return list(dict.fromkeys(ticker for ticker in tickers if ticker))
+
+
+if __name__ == "__main__":
+    # python -m src.batch watchlist.txt [submissions.zip archives_dir]
+    watchlist = load_watchlist(sys.argv[1])
+    archive = BulkArchive(sys.argv[2], sys.argv[3]) if len(sys.argv) > 3 else None
+    ingestor = BatchIngestor(archive=archive)
+    try:
+        report = asyncio.run(ingestor.run(watchlist))
+    finally:
+        ingestor.close()
+    report.to_csv("batch_report.csv", index=False)
+    print(report["status"].value_counts().to_string())
@@ -0,0 +1,239 @@
+import os
+import re
+import asyncio
+import math
+import pickle
+import threading
+from collections import Counter, defaultdict
+from typing import List
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.indices.query.schema import QueryBundle
+from llama_index.core.schema import NodeWithScore, TextNode
+from src.query_filters import parse_filters
+
+
+# Keeps tokens like "10-k", "8-k" and "1,234.5" intact
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-.,][a-z0-9]+)*")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "is", "it",
+    "its", "of", "on", "or", "that", "the", "this", "to", "was", "were", "will", "with", "our", "we",
+}
+
+# Metadata kept per document so lexical hits can be filtered like vector hits
+FILTER_FIELDS = ("company_name", "form_type", "date", "year", "quarter")
+
+
+def tokenize(text: str) -> list[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incrementally maintained BM25 inverted index over stored chunks.
+
+    Postings map each term to {document position: term frequency}. Documents
+    are only ever appended, keyed by the same IDs as the Chroma collection.
+    The index is persisted next to chroma_db as an append-only log: `save()`
+    appends one pickled segment with the documents added since the last save,
+    so a store costs its own size rather than the size of the whole index.
+    """
+    def __init__(self, path: str = None, k1: float = 1.5, b: float = 0.75):
+        self.path = path or os.path.join(os.getcwd(), "chroma_db", "bm25.pkl")
+        self.k1 = k1
+        self.b = b
+        self.ids = []
+        self.positions = {}
+        self.lengths = []
+        self.metadata = []
+        self.postings = defaultdict(dict)
+        self.total_length = 0
+        # Term frequencies of the documents added since the last save
+        self._unsaved = []
+        self._lock = threading.Lock()
+        self._load()
+
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.positions
+
+
+    def add(self, ids: list[str], texts: list[str], metadatas: list[dict] = None):
+        """Index documents that are not indexed yet."""
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                if doc_id in self.positions:
+                    continue
+
+                terms = dict(Counter(tokenize(text)))
+                self._append(doc_id, terms, {key: metadata.get(key) for key in FILTER_FIELDS})
+                self._unsaved.append(terms)
+
+
+    def _append(self, doc_id: str, terms: dict, metadata: dict):
+        position = len(self.ids)
+        for term, frequency in terms.items():
+            self.postings[term][position] = frequency
+
+        length = sum(terms.values())
+        self.ids.append(doc_id)
+        self.positions[doc_id] = position
+        self.lengths.append(length)
+        self.metadata.append(metadata)
+        self.total_length += length
+
+
+    def _matches(self, position: int, filters: dict) -> bool:
+        metadata = self.metadata[position]
+        return all(metadata.get(key) in values for key, values in filters.items())
+
+
+    def search(self, query: str, top_k: int = 20, filters: dict = None) -> list[tuple[str, float]]:
+        """
+        Top `top_k` (id, score) pairs for `query`.
+        `filters` maps a metadata field to the allowed values.
+        """
+        if not self.ids:
+            return []
+
+        count = len(self.ids)
+        average_length = self.total_length / count
+        scores = defaultdict(float)
+
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, frequency in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / average_length)
+                scores[position] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+
+        if filters:
+            scores = {position: score for position, score in scores.items() if self._matches(position, filters)}
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+        return [(self.ids[position], score) for position, score in ranked]
+
+
+    def _load(self):
+        """Replay the saved segments. A segment torn by a crash mid-save is cut off the log."""
+        try:
+            f = open(self.path, "r+b")
+        except FileNotFoundError:
+            return
+
+        with f:
+            end = 0
+            while True:
+                try:
+                    segment = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception:
+                    # A torn record can fail to unpickle in arbitrary ways
+                    break
+
+                if "postings" in segment:
+                    self._load_snapshot(segment)
+                else:
+                    for doc_id, terms, metadata in zip(segment["ids"], segment["terms"], segment["metadata"]):
+                        self._append(doc_id, terms, metadata)
+                end = f.tell()
+
+            if end < os.fstat(f.fileno()).st_size:
+                print(f"⚠️ Dropping a torn BM25 segment at byte {end} of {self.path}.")
+                f.truncate(end)
+
+
+    def _load_snapshot(self, state: dict):
+        """Whole-index pickle written before the log format; later segments append to it."""
+        self.ids = state["ids"]
+        self.lengths = state["lengths"]
+        self.metadata = state["metadata"]
+        self.postings = defaultdict(dict, state["postings"])
+        self.positions = {doc_id: position for position, doc_id in enumerate(self.ids)}
+        self.total_length = sum(self.lengths)
+
+
+    def save(self):
+        """Append the documents added since the last save to the log."""
+        with self._lock:
+            if not self._unsaved:
+                return
+            start = len(self.ids) - len(self._unsaved)
+            segment = {
+                "ids": self.ids[start:],
+                "terms": self._unsaved,
+                "metadata": self.metadata[start:],
+            }
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                pickle.dump(segment, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            self._unsaved = []
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Fuses dense results from `vector_retriever` with BM25 results by reciprocal rank fusion.
+
+    Lexical hits are filtered with the same rule-based filters as the fast
+    vector path, and hits missing from the dense results are loaded from the
+    Chroma collection.
+    """
+    def __init__(self, vector_retriever: BaseRetriever, bm25: BM25Index, collection, known_tickers, similarity_top_k: int = 10, lexical_top_k: int = 20, rrf_k: int = 60):
+        super().__init__()
+        self._vector_retriever = vector_retriever
+        self._bm25 = bm25
+        self._collection = collection
+        self._known_tickers = known_tickers
+        self._similarity_top_k = similarity_top_k
+        self._lexical_top_k = lexical_top_k
+        self._rrf_k = rrf_k
+
+
+    def _lexical_filters(self, query: str) -> dict:
+        parsed = parse_filters(query, self._known_tickers())
+        filters = {
+            "company_name": parsed.tickers,
+            "form_type": parsed.forms,
+            "date": parsed.dates,
+            "year": parsed.years,
+            "quarter": parsed.quarters,
+        }
+        return {key: set(values) for key, values in filters.items() if values}
+
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        dense = self._vector_retriever.retrieve(query_bundle)
+        lexical = self._bm25.search(query_bundle.query_str, self._lexical_top_k, self._lexical_filters(query_bundle.query_str))
+
+        scores = defaultdict(float)
+        nodes = {}
+        for rank, node in enumerate(dense):
+            scores[node.node.node_id] += 1 / (self._rrf_k + rank + 1)
+            nodes[node.node.node_id] = node.node
+        for rank, (doc_id, _) in enumerate(lexical):
+            scores[doc_id] += 1 / (self._rrf_k + rank + 1)
+
+        fused = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:self._similarity_top_k]
+
+        missing = [doc_id for doc_id, _ in fused if doc_id not in nodes]
+        if missing:
+            found = self._collection.get(ids=missing, include=["documents", "metadatas"])
+            for doc_id, document, metadata in zip(found["ids"], found["documents"], found["metadatas"]):
+                nodes[doc_id] = TextNode(id_=doc_id, text=document, metadata=metadata or {})
+
+        return [NodeWithScore(node=nodes[doc_id], score=score) for doc_id, score in fused if doc_id in nodes]
+
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Embedding and Chroma calls are blocking; run them on a worker thread instead of the event loop
+        return await asyncio.to_thread(self._retrieve, query_bundle)
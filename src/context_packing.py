@@ -0,0 +1,120 @@
+import re
+from typing import List, Optional
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.indices.query.schema import QueryBundle
+from llama_index.core.schema import NodeWithScore, TextNode
+from analysis.tokens import count_tokens
+
+
+_WORD = re.compile(r"\w+")
+
+
+def _filing_key(node: NodeWithScore) -> tuple:
+    metadata = node.node.metadata or {}
+    filing = metadata.get("accession_number") or (metadata.get("company_name"), metadata.get("form_type"), metadata.get("date"))
+    return filing, metadata.get("page_number")
+
+
+def _merge_overlap(first: str, second: str, min_overlap: int) -> str | None:
+    """`first` + `second` without their shared boundary text, if `first` ends where `second` begins."""
+    head = second[:min_overlap]
+    if len(head) < min_overlap:
+        return None
+
+    start = first.rfind(head)
+    while start >= 0:
+        tail = first[start:]
+        if second.startswith(tail):
+            return first + second[len(tail):]
+        start = first.rfind(head, 0, start)
+    return None
+
+
+def _jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a and b else 0.0
+
+
+class ContextPacker(BaseNodePostprocessor):
+    """
+    Packs retrieved chunks into a token budget before synthesis.
+
+    Chunks from the same filing and page are merged when one continues the
+    other (the splitter's overlap is removed), near-identical chunks are
+    dropped, and the remaining chunks are added greedily by score until
+    `token_budget` tokens are used. `last_stats` reports the tokens saved.
+    """
+    token_budget: int = Field(default=3000, description="Maximum tokens of context passed to the LLM.")
+    min_overlap_chars: int = Field(default=40, description="Shortest boundary overlap treated as adjacent chunks.")
+    duplicate_threshold: float = Field(default=0.9, description="Word-set Jaccard at which a chunk counts as a duplicate.")
+    last_stats: dict = Field(default_factory=dict)
+
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "ContextPacker"
+
+
+    def _merge_adjacent(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        merged = []
+        groups = {}
+
+        for node in nodes:
+            key = _filing_key(node)
+            text = node.node.get_content()
+
+            for i in groups.get(key, []):
+                current = merged[i]
+                current_text = current.node.get_content()
+                combined = _merge_overlap(current_text, text, self.min_overlap_chars) or _merge_overlap(text, current_text, self.min_overlap_chars)
+                if combined is not None:
+                    merged[i] = NodeWithScore(
+                        node=TextNode(id_=current.node.node_id, text=combined, metadata=current.node.metadata),
+                        score=max(current.score or 0.0, node.score or 0.0),
+                    )
+                    break
+            else:
+                groups.setdefault(key, []).append(len(merged))
+                merged.append(node)
+
+        return merged
+
+
+    def _drop_duplicates(self, nodes: List[NodeWithScore]) -> List[NodeWithScore]:
+        kept, kept_words = [], []
+        for node in nodes:
+            words = set(_WORD.findall(node.node.get_content().lower()))
+            if any(_jaccard(words, other) >= self.duplicate_threshold for other in kept_words):
+                continue
+            kept.append(node)
+            kept_words.append(words)
+        return kept
+
+
+    def _postprocess_nodes(self, nodes: List[NodeWithScore], query_bundle: Optional[QueryBundle] = None) -> List[NodeWithScore]:
+        if not nodes:
+            self.last_stats = {"nodes_before": 0, "nodes_after": 0, "tokens_before": 0, "tokens_after": 0, "tokens_saved": 0}
+            return nodes
+
+        tokens_before = sum(count_tokens([node.node.get_content() for node in nodes]))
+
+        ranked = sorted(nodes, key=lambda node: node.score or 0.0, reverse=True)
+        candidates = self._drop_duplicates(self._merge_adjacent(ranked))
+        lengths = count_tokens([node.node.get_content() for node in candidates])
+
+        packed, used = [], 0
+        for node, length in zip(candidates, lengths):
+            # Always keep the best chunk, even if it alone exceeds the budget
+            if packed and used + length > self.token_budget:
+                continue
+            packed.append(node)
+            used += length
+
+        self.last_stats = {
+            "nodes_before": len(nodes),
+            "nodes_after": len(packed),
+            "tokens_before": tokens_before,
+            "tokens_after": used,
+            "tokens_saved": tokens_before - used,
+        }
+        return packed
@@ -1,19 +1,42 @@
 import chromadb
 from llama_index.core import VectorStoreIndex
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.llms.ollama import Ollama
 from llama_index.core.retrievers import VectorIndexAutoRetriever
 from llama_index.core.query_engine import RetrieverQueryEngine
 from llama_index.core.indices.query.schema import QueryBundle
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.prompts.default_prompts import DEFAULT_TEXT_QA_PROMPT
+from llama_index.core.schema import MetadataMode
 from llama_index.core.settings import Settings
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core.vector_stores.types import MetadataInfo, VectorStoreInfo
 import os
 import uuid
+import asyncio
+import threading
+from typing import AsyncIterator
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from src.query_cache import TTLCache, response_key
+from src.query_filters import FastFilterRetriever
+from src.bm25 import BM25Index, HybridRetriever
+from src.context_packing import ContextPacker
+from src.fact_index import FactIndex
+
+
+# Fallback for chroma clients that cannot report their own limit
+DEFAULT_MAX_BATCH_SIZE = 5461
+
+# Chunk columns stored as Chroma metadata
+STORED_METADATA = ["company_name", "form_type", "date", "year", "quarter", "page_number", "accession_number"]
 
 
 class vectordb:
-    def __init__(self, embed_model):
+    def __init__(self, embed_model, response_cache: TTLCache = None, retriever_mode: str = "fast", bm25: BM25Index = None, context_token_budget: int = 3000, llm_base_url: str = "http://localhost:11434", request_timeout: float = 60.0, fact_index: FactIndex = None):
+        self.embed_model = embed_model
+        self.fact_index = fact_index
+        self.response_cache = response_cache if response_cache is not None else TTLCache(maxsize=256, ttl=3600.0)
         self.chroma_client = chromadb.PersistentClient(path=os.path.join(os.getcwd(), "chroma_db"))
         self.collection = self.chroma_client.get_or_create_collection(name="sec_filings", metadata={"hnsw:space": "ip"})
         print(self.collection.count())
@@ -64,6 +87,16 @@ class vectordb:
                     type="int",
                     description="The number of tokens in this chunk, useful for NLP processing."
                 ),
+                MetadataInfo(
+                    name="year",
+                    type="int",
+                    description="The calendar year of the report date."
+                ),
+                MetadataInfo(
+                    name="quarter",
+                    type="int",
+                    description="The calendar quarter (1-4) of the report date."
+                ),
             ],
         )
 
@@ -97,37 +130,286 @@ class vectordb:
 - If a required data point is **not found in the retrieved documents**, **omit** it instead of making assumptions.
 """
 
-        self._llm = Ollama(model="llama3.2", request_timeout=60.0, system_prompt=self.system_prompt)
-        Settings.llm = self._llm
-        self.retriever = VectorIndexAutoRetriever(index=self.index, llm=self._llm, prompt_template_str=self.system_prompt, vector_store_info=self.vector_store_info, similarity_top_k=20)
-        self.query_engine = RetrieverQueryEngine(retriever=self.retriever)
+        if retriever_mode not in ("fast", "hybrid", "auto"):
+            raise ValueError(f"Unknown retriever_mode '{retriever_mode}'. Use 'fast', 'hybrid' or 'auto'.")
+        self.retriever_mode = retriever_mode
+        self.llm_base_url = llm_base_url
+        self.request_timeout = request_timeout
+        self.last_stream_stats = {}
+        self._known_tickers = None
+        self.bm25 = bm25 or BM25Index()
+        # Merges overlapping chunks and trims the context to the token budget; None passes chunks through
+        self.context_packer = ContextPacker(token_budget=context_token_budget) if context_token_budget else None
 
-    
-    def store_embeddings(self, df):
-        for _, row in df.iterrows():
-            doc_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, row["content_chunk"]))  # Unique ID
-
-            # Check if ID already exists
-            existing_docs = self.collection.get(ids=[doc_id])
-            
-            if not existing_docs["ids"]:  # If the ID doesn't exist, insert it
-                self.collection.add(
-                    ids=[doc_id],
-                    embeddings=[row["embedding"]],
-                    metadatas=[{
-                        "company_name": row["company_name"],
-                        "form_type": row["form_type"],
-                        "date": row["date"],
-                        "page_number": row["page_number"],
-                    }],
-                    documents=[row["content_chunk"]],
+        # The LLM, retriever and query engine are built on first query, so ingestion-only runs never create them
+        self._llm = None
+        self._retriever = None
+        self._query_engine = None
+        self._build_lock = threading.RLock()
+
+
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._build_lock:
+                if self._llm is None:
+                    from llama_index.llms.ollama import Ollama
+                    self._llm = Ollama(model="llama3.2", base_url=self.llm_base_url, request_timeout=self.request_timeout, system_prompt=self.system_prompt)
+                    Settings.llm = self._llm
+        return self._llm
+
+
+    @property
+    def retriever(self):
+        if self._retriever is None:
+            with self._build_lock:
+                if self._retriever is None:
+                    self._retriever = self._build_retriever()
+        return self._retriever
+
+
+    @property
+    def query_engine(self) -> RetrieverQueryEngine:
+        if self._query_engine is None:
+            with self._build_lock:
+                if self._query_engine is None:
+                    node_postprocessors = [self.context_packer] if self.context_packer else []
+                    self._query_engine = RetrieverQueryEngine.from_args(retriever=self.retriever, llm=self.llm, node_postprocessors=node_postprocessors)
+        return self._query_engine
+
+
+    def _build_retriever(self):
+        if self.retriever_mode == "fast":
+            # Rule-based filters by default, LLM auto-retrieval only for ambiguous queries
+            return FastFilterRetriever(self.index, self._build_auto_retriever, self.known_tickers, similarity_top_k=20)
+        if self.retriever_mode == "hybrid":
+            # BM25 recovers exact-term matches, so fewer fused chunks reach the LLM
+            self.sync_bm25()
+            dense = FastFilterRetriever(self.index, self._build_auto_retriever, self.known_tickers, similarity_top_k=20)
+            return HybridRetriever(dense, self.bm25, self.collection, self.known_tickers, similarity_top_k=10)
+        return self._build_auto_retriever()
+
+
+    def _build_auto_retriever(self) -> VectorIndexAutoRetriever:
+        return VectorIndexAutoRetriever(index=self.index, llm=self.llm, prompt_template_str=self.system_prompt, vector_store_info=self.vector_store_info, similarity_top_k=20)
+
+
+    def known_tickers(self) -> set[str]:
+        """Tickers present in the collection, read once and kept up to date by store_embeddings."""
+        if self._known_tickers is None:
+            tickers = set()
+            page_size = self._max_batch_size()
+            for offset in range(0, self.collection.count(), page_size):
+                page = self.collection.get(include=["metadatas"], limit=page_size, offset=offset)
+                tickers.update(str(metadata.get("company_name", "")).lower() for metadata in page["metadatas"])
+            tickers.discard("")
+            self._known_tickers = tickers
+        return self._known_tickers
+
+
+    def sync_bm25(self):
+        """Add chunks stored before the BM25 index existed (or by other clients) to it."""
+        if len(self.bm25) >= self.collection.count():
+            return
+
+        page_size = self._max_batch_size()
+        for offset in range(0, self.collection.count(), page_size):
+            page = self.collection.get(include=["documents", "metadatas"], limit=page_size, offset=offset)
+            self.bm25.add(page["ids"], page["documents"], page["metadatas"])
+        self.bm25.save()
+
+
+    def _max_batch_size(self) -> int:
+        try:
+            return self.chroma_client.get_max_batch_size()
+        except AttributeError:
+            return DEFAULT_MAX_BATCH_SIZE
+
+
+    def _upsert(self, batch: dict) -> int:
+        """Write one batch, then index it for BM25, so a failed write leaves no lexical-only documents."""
+        self.collection.upsert(**batch)
+        self.bm25.add(batch["ids"], batch["documents"], batch["metadatas"])
+        return len(batch["ids"])
+
+
+    def store_embeddings(self, df, embeddings: np.ndarray = None, batch_size: int = None, use_worker_thread: bool = False) -> dict:
+        """
+        Bulk-insert chunks that are not in the collection yet.
+
+        `embeddings` is a float32 (len(df), dim) array aligned with the rows of
+        `df`; batches are sliced from it directly. Without it, embeddings are
+        read from an `embedding` column of per-row lists.
+
+        IDs are computed up front, existence is checked one batch at a time and new
+        chunks are written with batched upserts no larger than Chroma's max batch
+        size. With `use_worker_thread` each write runs on a worker thread while the
+        next batch is being prepared.
+
+        Returns the number of inserted and skipped chunks.
+        """
+        if df.empty:
+            return {"inserted": 0, "skipped": 0}
+
+        if embeddings is None:
+            embeddings = np.asarray(df["embedding"].tolist(), dtype=np.float32)
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) != len(df):
+            raise ValueError(f"Got {len(embeddings)} embeddings for {len(df)} chunks.")
+
+        batch_size = min(batch_size or self._max_batch_size(), self._max_batch_size())
+
+        ids = [str(uuid.uuid5(uuid.NAMESPACE_DNS, chunk)) for chunk in df["content_chunk"]]  # Unique ID
+        # Identical chunks within df share an ID, only the first one is written
+        seen = set()
+        first_positions = [i for i, doc_id in enumerate(ids) if not (doc_id in seen or seen.add(doc_id))]
+
+        if "date" in df.columns:
+            # Numeric period metadata, since Chroma can only range-filter numbers
+            dates = pd.to_datetime(df["date"], errors="coerce")
+            df = df.assign(year=dates.dt.year.fillna(0).astype(int), quarter=dates.dt.quarter.fillna(0).astype(int))
+
+        metadata_columns = [column for column in STORED_METADATA if column in df.columns]
+        inserted = 0
+        executor = ThreadPoolExecutor(max_workers=1) if use_worker_thread else None
+        pending = None
+
+        try:
+            for start in range(0, len(first_positions), batch_size):
+                positions = first_positions[start:start + batch_size]
+                batch_ids = [ids[i] for i in positions]
+
+                # Check which IDs already exist, one round-trip per batch
+                existing = set(self.collection.get(ids=batch_ids, include=[])["ids"])
+                positions = [i for i, doc_id in zip(positions, batch_ids) if doc_id not in existing]
+                if not positions:
+                    continue
+
+                rows = df.iloc[positions]
+                batch = dict(
+                    ids=[ids[i] for i in positions],
+                    embeddings=embeddings[positions],
+                    metadatas=rows[metadata_columns].to_dict("records"),
+                    documents=rows["content_chunk"].tolist(),
                 )
+                if executor is None:
+                    inserted += self._upsert(batch)
+                else:
+                    if pending is not None:
+                        inserted += pending.result()
+                    pending = executor.submit(self._upsert, batch)
+
+            if pending is not None:
+                inserted += pending.result()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+            # Persist the batches that made it into Chroma, even if a later one failed
+            self.bm25.save()
+
+        if self._known_tickers is not None and "company_name" in df.columns:
+            self._known_tickers.update(df["company_name"].astype(str).str.lower().unique())
+
+        return {"inserted": inserted, "skipped": len(ids) - inserted}
     
 
-    def query(self, query_text: str):
+    def query(self, query_text: str, use_cache: bool = True):
+        """
+        Answer `query_text` from the retrieved filings.
+
+        Responses are cached by normalized prompt plus the IDs of the retrieved
+        nodes, so a repeated prompt skips LLM synthesis until new filings change
+        what is retrieved. With a `fact_index`, plain figure lookups ("AAPL
+        revenue over the last five 10-Qs") are answered from parsed tables
+        without retrieval or the LLM.
+        """
+        if self.fact_index is not None:
+            answer = self.fact_index.answer(query_text, self.known_tickers())
+            if answer is not None:
+                return answer
+
         query_bundle = QueryBundle(query_text)
-        response = self.query_engine.query(query_bundle)
+        if not use_cache:
+            response = self.query_engine.query(query_bundle)
+            self._report_packing()
+            return response
+
+        nodes = self.query_engine.retrieve(query_bundle)
+        self._report_packing()
+        key = response_key(query_text, [node.node.node_id for node in nodes])
+
+        response = self.response_cache.get(key)
+        if response is None:
+            response = self.query_engine.synthesize(query_bundle, nodes)
+            self.response_cache.put(key, response)
         return response
+
+
+    async def astream_query(self, query_text: str, timeout: float = None) -> AsyncIterator[str]:
+        """
+        Answer `query_text` token by token as Ollama generates it.
+
+        `timeout` (seconds, defaults to `request_timeout`) bounds the whole
+        answer; on expiry the stream is closed and asyncio.TimeoutError raised.
+        Cancelling the consuming task or leaving the loop early closes the
+        Ollama stream too. Time to first token is kept in `last_stream_stats`.
+        """
+        timeout = self.request_timeout if timeout is None else timeout
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        deadline = started + timeout
+
+        query_bundle = QueryBundle(query_text)
+        # Building the engine, embedding the query and Chroma lookups are all blocking, so keep them off the event loop
+        nodes = await asyncio.wait_for(asyncio.to_thread(lambda: self.query_engine.retrieve(query_bundle)), timeout)
+        self._report_packing()
+
+        context = "\n\n".join(node.node.get_content(metadata_mode=MetadataMode.LLM) for node in nodes)
+        messages = [
+            ChatMessage(role=MessageRole.SYSTEM, content=self.system_prompt),
+            ChatMessage(role=MessageRole.USER, content=DEFAULT_TEXT_QA_PROMPT.format(context_str=context, query_str=query_text)),
+        ]
+
+        stats = {"time_to_first_token": None, "seconds": None, "chunks": 0, "completed": False}
+        self.last_stream_stats = stats
+        stream = await asyncio.wait_for(self.llm.astream_chat(messages), max(deadline - loop.time(), 0))
+        try:
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(anext(stream), max(deadline - loop.time(), 0))
+                except StopAsyncIteration:
+                    break
+
+                if not chunk.delta:
+                    continue
+                if stats["time_to_first_token"] is None:
+                    stats["time_to_first_token"] = loop.time() - started
+                stats["chunks"] += 1
+                yield chunk.delta
+            stats["completed"] = True
+        finally:
+            stats["seconds"] = loop.time() - started
+            await stream.aclose()
+            if stats["time_to_first_token"] is not None:
+                print(f"\nTime to first token: {stats['time_to_first_token']:.2f}s, total: {stats['seconds']:.2f}s")
+
+
+    def _report_packing(self):
+        if self.context_packer is None or not self.context_packer.last_stats:
+            return
+        stats = self.context_packer.last_stats
+        print(f"Context: {stats['nodes_before']} -> {stats['nodes_after']} chunks, {stats['tokens_before']} -> {stats['tokens_after']} tokens ({stats['tokens_saved']} saved)")
+
+
+    def cache_stats(self) -> dict:
+        """Hit/miss counters of the query embedding LRU and the response cache"""
+        return {
+            "query_embedding": {
+                "hits": getattr(self.embed_model, "query_cache_hits", 0),
+                "misses": getattr(self.embed_model, "query_cache_misses", 0),
+            },
+            "response": self.response_cache.stats(),
+        }
     
 
     def retrieved_query(self, query_text: str):
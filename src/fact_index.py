@@ -0,0 +1,295 @@
+import os
+import re
+import pickle
+import difflib
+import threading
+from collections import defaultdict
+import pandas as pd
+from analysis.tables import parse_period, positional_columns
+from utils.atomic import atomic_write
+
+
+_FOOTNOTE = re.compile(r"\(\s*(?:\d{1,2}|[a-z])\s*\)")
+_NON_WORD = re.compile(r"[^a-z0-9%]+")
+_LAST_N = re.compile(r"\b(?:last|past|previous|recent)\s+(\d+|two|three|four|five|six|seven|eight|nine|ten|twelve)\b", re.IGNORECASE)
+_NUMBER_WORDS = {"two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "twelve": 12}
+
+# Questions asking for judgement rather than figures stay with the LLM
+_ANALYSIS_CUES = re.compile(r"\b(?:why|explain|prospect|outlook|risk|should|recommend|forecast|compare|analy[sz]e|summar)", re.IGNORECASE)
+
+# Columns of a lookup result
+LOOKUP_COLUMNS = ["ticker", "label", "period", "value", "form_type", "accession_number"]
+
+# Common line-item spellings mapped to one label
+LABEL_SYNONYMS = {
+    "net sales": "revenue",
+    "net revenue": "revenue",
+    "net revenues": "revenue",
+    "revenues": "revenue",
+    "sales": "revenue",
+    "total net sales": "revenue",
+    "total revenue": "revenue",
+    "total revenues": "revenue",
+    "net income loss": "net income",
+    "net loss": "net income",
+    "net earnings": "net income",
+    "gross profit": "gross margin",
+    "income from operations": "operating income",
+    "operating income loss": "operating income",
+    "loss from operations": "operating income",
+    "diluted": "diluted eps",
+    "diluted earnings per share": "diluted eps",
+    "earnings per share diluted": "diluted eps",
+    "diluted net income per share": "diluted eps",
+    "basic": "basic eps",
+    "basic earnings per share": "basic eps",
+    "earnings per share basic": "basic eps",
+    "basic net income per share": "basic eps",
+    "eps": "diluted eps",
+    "earnings per share": "diluted eps",
+}
+
+
+def normalize_label(label: str) -> str:
+    """Lower case, drop footnote markers, punctuation and a leading "total", then map known synonyms."""
+    text = _FOOTNOTE.sub(" ", str(label).lower())
+    text = _NON_WORD.sub(" ", text).strip()
+    text = LABEL_SYNONYMS.get(text, text)
+    if text.startswith("total "):
+        text = LABEL_SYNONYMS.get(text[6:], text[6:])
+    return text
+
+
+def _current_column(labels, report_date: str, width: int) -> int | None:
+    """
+    Position of the header column naming the filing's own period (same year,
+    and same month when the header has a date), or None if the header does not
+    name it or the row's `width` value cells do not line up with the header.
+    """
+    labels = [label for label in labels if isinstance(label, str)]
+    if not labels or len(labels) != width:
+        return None
+
+    year, month = int(report_date[:4]), int(report_date[5:7])
+    for position, label in enumerate(labels):
+        period = parse_period(label)
+        if period is not None and period[0] == year and period[1] in (None, month):
+            return position
+    return None
+
+
+class FactAnswer:
+    """A figure lookup answered from the fact index; prints like a query response."""
+    def __init__(self, facts: pd.DataFrame):
+        self.facts = facts
+        self.source_nodes = []
+        self.response = facts.to_string(index=False)
+
+
+    def __str__(self) -> str:
+        return self.response
+
+
+class FactIndex:
+    """
+    (ticker, normalized line-item label, period) -> value, built from reconstructed tables.
+
+    The period is the filing's report date. The value is taken from the
+    column whose header names that period ("2024" or "September 28, 2024"),
+    in the first table row carrying the label; comparative columns are indexed
+    from their own filings. Rows whose period column cannot be resolved (no
+    header, or fewer value cells than header columns) or whose cell is a dash
+    are skipped. Lookups are dictionary reads. The index is a log of pickled
+    segments next to the table store: each save appends the facts added since
+    the previous one, so saving after every filing stays cheap as it grows.
+    """
+    def __init__(self, path: str = None, fuzzy_cutoff: float = 0.85):
+        self.path = path or os.path.join(os.getcwd(), "table_store", "_facts.pkl")
+        self.fuzzy_cutoff = fuzzy_cutoff
+        self.facts = defaultdict(dict)
+        self.labels = defaultdict(set)
+        # (ticker, label, period, fact) added since the last save
+        self._unsaved = []
+        self._lock = threading.Lock()
+        self._load()
+
+
+    def __len__(self) -> int:
+        return sum(len(periods) for periods in self.facts.values())
+
+
+    def add(self, rows: pd.DataFrame) -> int:
+        """Index table rows as produced by TableStore.read (one row per table line). Returns the number of new facts."""
+        if rows.empty:
+            return 0
+
+        rows = rows[rows["label"].notna() & ~rows["header"].astype(bool)]
+        rows = rows.sort_values(["ticker", "accession_number", "table_number", "row"], kind="stable")
+        value_columns = positional_columns(rows.columns, "value_")
+        label_columns = positional_columns(rows.columns, "column_")
+
+        added = 0
+        with self._lock:
+            for row, values, labels in zip(
+                rows.itertuples(index=False), rows[value_columns].to_numpy(), rows[label_columns].to_numpy()
+            ):
+                position = _current_column(labels, row.date, row.width)
+                if position is None or pd.isna(values[position]):
+                    continue
+                label = normalize_label(row.label)
+                if not label:
+                    continue
+                periods = self.facts[(row.ticker, label)]
+                if row.date in periods:
+                    continue
+                periods[row.date] = {
+                    "value": float(values[position]),
+                    "form_type": row.form_type,
+                    "accession_number": row.accession_number,
+                    "table_number": int(row.table_number),
+                    "source_label": row.label,
+                }
+                self.labels[row.ticker].add(label)
+                self._unsaved.append((row.ticker, label, row.date, periods[row.date]))
+                added += 1
+        return added
+
+
+    def rebuild(self, store):
+        """Re-index everything in `store` (a TableStore), e.g. for tables written before the index existed."""
+        with self._lock:
+            self.facts.clear()
+            self.labels.clear()
+            self._unsaved = []
+        self.add(store.read())
+
+        # A new log starting with a snapshot of the whole index
+        with self._lock:
+            with atomic_write(self.path, fsync=True) as f:
+                pickle.dump({"facts": dict(self.facts)}, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self._unsaved = []
+
+
+    def resolve_label(self, ticker: str, text: str, fuzzy: bool = True) -> str | None:
+        """Known label for `ticker` matching `text`, exactly after normalization or else fuzzily."""
+        labels = self.labels.get(ticker)
+        if not labels:
+            return None
+        label = normalize_label(text)
+        if label in labels:
+            return label
+        if not fuzzy:
+            return None
+        matches = difflib.get_close_matches(label, labels, n=1, cutoff=self.fuzzy_cutoff)
+        return matches[0] if matches else None
+
+
+    def lookup(self, ticker: str, label: str, form_type: str | list = None, years: list[int] = None, limit: int = None) -> pd.DataFrame:
+        """Values of one line item by period, newest first."""
+        resolved = self.resolve_label(ticker, label)
+        if resolved is None:
+            return pd.DataFrame(columns=LOOKUP_COLUMNS)
+
+        forms = {form_type} if isinstance(form_type, str) else set(form_type or [])
+        facts = [
+            {"ticker": ticker, "label": resolved, "period": period, **fact}
+            for period, fact in self.facts[(ticker, resolved)].items()
+            if (not forms or fact["form_type"] in forms) and (not years or int(period[:4]) in years)
+        ]
+        if not facts:
+            return pd.DataFrame(columns=LOOKUP_COLUMNS)
+
+        df = pd.DataFrame(facts).sort_values("period", ascending=False)
+        if limit:
+            df = df.head(limit)
+        return df[LOOKUP_COLUMNS].reset_index(drop=True)
+
+
+    def _find_label(self, ticker: str, question: str) -> str | None:
+        """Longest run of question words that resolves to a known label, trying exact matches before fuzzy ones."""
+        words = _NON_WORD.sub(" ", question.lower()).split()
+        for fuzzy in (False, True):
+            for size in range(min(6, len(words)), 0, -1):
+                for start in range(len(words) - size + 1):
+                    label = self.resolve_label(ticker, " ".join(words[start:start + size]), fuzzy=fuzzy)
+                    if label is not None:
+                        return label
+        return None
+
+
+    def answer(self, question: str, known_tickers: set[str]) -> FactAnswer | None:
+        """
+        Answer a figure lookup such as "AAPL revenue over the last five 10-Qs".
+        Returns None when the question is not a plain lookup, so it can go to the LLM.
+        """
+        if _ANALYSIS_CUES.search(question):
+            return None
+
+        # Imported here so ingestion, which only adds facts, does not load llama_index
+        from src.query_filters import parse_filters
+
+        parsed = parse_filters(question, known_tickers)
+        if len(parsed.tickers) != 1:
+            return None
+        ticker = parsed.tickers[0]
+
+        label = self._find_label(ticker, question)
+        if label is None:
+            return None
+
+        last = _LAST_N.search(question)
+        limit = None
+        if last:
+            count = last.group(1).lower()
+            limit = int(count) if count.isdigit() else _NUMBER_WORDS[count]
+
+        facts = self.lookup(ticker, label, form_type=parsed.forms, years=parsed.years, limit=limit)
+        return FactAnswer(facts) if not facts.empty else None
+
+
+    def _load(self):
+        """Replay the saved segments. A segment torn by a crash mid-save is cut off the log."""
+        try:
+            f = open(self.path, "r+b")
+        except FileNotFoundError:
+            return
+
+        with f:
+            end = 0
+            while True:
+                try:
+                    segment = pickle.load(f)
+                except EOFError:
+                    break
+                except Exception:
+                    # A torn record can fail to unpickle in arbitrary ways
+                    break
+
+                if "facts" in segment:
+                    # Whole-index snapshot, written by rebuild() and before the log format
+                    for key, periods in segment["facts"].items():
+                        self.facts[key].update(periods)
+                else:
+                    for ticker, label, period, fact in segment["added"]:
+                        self.facts[(ticker, label)].setdefault(period, fact)
+                end = f.tell()
+
+            if end < os.fstat(f.fileno()).st_size:
+                print(f"⚠️ Dropping a torn fact index segment at byte {end} of {self.path}.")
+                f.truncate(end)
+
+        for ticker, label in self.facts:
+            self.labels[ticker].add(label)
+
+
+    def save(self):
+        """Append the facts added since the last save to the log."""
+        with self._lock:
+            if not self._unsaved:
+                return
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "ab") as f:
+                pickle.dump({"added": self._unsaved}, f, protocol=pickle.HIGHEST_PROTOCOL)
+                f.flush()
+                os.fsync(f.fileno())
+            self._unsaved = []
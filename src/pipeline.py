@@ -0,0 +1,354 @@
+import time
+import asyncio
+from contextlib import nullcontext
+from typing import TYPE_CHECKING
+from collections import deque
+import numpy as np
+import pandas as pd
+from analysis import preprocessor
+from src.sec_loader import SECDataProcessor
+from src.run_manifest import RunManifest, STAGES
+
+if TYPE_CHECKING:
+    from src.database import vectordb
+
+
+_DONE = object()
+# Stands in for the output of a stage a previous run already completed
+_RESUMED = object()
+
+FETCHED, PARSED, CHUNKED, EMBEDDED, STORED = range(len(STAGES))
+
+
+class StageStats:
+    """Item count and busy time of one pipeline stage."""
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.busy_seconds = 0.0
+
+
+    @property
+    def throughput(self) -> float:
+        """Items per second of busy time"""
+        return self.items / self.busy_seconds if self.busy_seconds else 0.0
+
+
+    def as_dict(self) -> dict:
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "items_per_second": round(self.throughput, 3),
+        }
+
+
+class StreamingPipeline:
+    """
+    Streams filings through fetch -> parse -> chunk -> embed -> store.
+
+    Stages are connected by bounded asyncio queues, so a slow stage applies
+    backpressure upstream and peak memory is bounded by `queue_size` filings per
+    stage instead of the whole corpus. While filing N is being embedded, filing
+    N+1 is already downloading and parsing. With the processor's
+    `parse_executor` (a process pool), up to `parse_ahead` filings are parsed
+    in parallel worker processes.
+
+    Tables are written to the processor's TableStore per filing; with
+    `keep_tables` they are also collected into `processor.table_df`, which
+    holds every filing's tables for the whole run.
+
+    With a `manifest`, every stage checkpoints its output per filing, and a
+    rerun resumes each filing after its last completed stage: earlier stages
+    pass it through and the stage that completed last reloads its artifact.
+
+    `embed_lock` and `store_lock` (asyncio locks) serialise embedding and
+    storing with other pipelines sharing the same model and vector db.
+    """
+    def __init__(self, processor: SECDataProcessor, db: "vectordb", queue_size: int = 2, fetch_ahead: int = 2, parse_ahead: int = 4, keep_tables: bool = False, manifest: RunManifest = None, embed_lock: asyncio.Lock = None, store_lock: asyncio.Lock = None):
+        self.processor = processor
+        self.db = db
+        self.manifest = manifest
+        self.embed_lock = embed_lock
+        self.store_lock = store_lock
+        self.queue_size = queue_size
+        self.fetch_ahead = fetch_ahead
+        self.parse_ahead = parse_ahead
+        self.keep_tables = keep_tables
+        self.stats = {name: StageStats(name) for name in ("fetch", "parse", "chunk", "embed", "store")}
+        # Filing index -> chunks staged in the near-duplicate index and not stored yet
+        self._staged = {}
+        # Chunks sent to the vector db and how many of them were new
+        self.chunks = 0
+        self.inserted = 0
+
+
+    def _accession(self, index: int) -> str:
+        return self.processor.sec_api.filing_metadata.iloc[index]['accessionNumber']
+
+
+    def _completed(self, index: int) -> int:
+        """Last stage completed for the filing at `index` by an earlier run, -1 if none."""
+        return self.manifest.stage(self._accession(index)) if self.manifest is not None else -1
+
+
+    async def _checkpoint(self, index: int, stage: int, save=None):
+        """Write the stage's artifact with `save(accession_number)` and mark the stage completed."""
+        if self.manifest is None:
+            return
+        accession_number = self._accession(index)
+        if save is not None:
+            await asyncio.to_thread(save, accession_number)
+        self.manifest.mark(accession_number, STAGES[stage])
+
+
+    async def _fetch_one(self, index: int):
+        completed = self._completed(index)
+        if completed > FETCHED:
+            return _RESUMED
+        if completed == FETCHED:
+            return await asyncio.to_thread(self.manifest.load_html, self._accession(index))
+
+        html = await self.processor.sec_api.fetch_filing(index)
+        if html and html.strip():
+            await self._checkpoint(index, FETCHED, lambda accession: self.manifest.save_html(accession, html))
+        return html
+
+
+    async def _fetch(self, out_queue: asyncio.Queue):
+        """Download filings in metadata order, keeping at most `fetch_ahead` requests in flight."""
+        api = self.processor.sec_api
+        stats = self.stats["fetch"]
+        pending = deque()
+
+        async def emit():
+            index, task, start = pending.popleft()
+            html = await task
+            stats.busy_seconds += time.perf_counter() - start
+            if html is _RESUMED:
+                await out_queue.put((index, html))
+            elif html and html.strip():
+                stats.items += 1
+                await out_queue.put((index, html))
+            else:
+                print(f"⚠️ Warning: Filing {index + 1} is empty. Skipping processing.")
+
+        for index in range(len(api.filing_metadata)):
+            if self._completed(index) == STORED:
+                continue
+            pending.append((index, asyncio.create_task(self._fetch_one(index)), time.perf_counter()))
+            if len(pending) >= self.fetch_ahead:
+                await emit()
+
+        while pending:
+            await emit()
+
+        await out_queue.put(_DONE)
+
+
+    async def _parse_one(self, index: int, html, tables: list):
+        """Text of one filing, parsed in the processor's parse_executor if it has one. Its tables go to the table store."""
+        stats = self.stats["parse"]
+        _, _, form_type, report_date = self.processor.sec_api.get_metadata(index)
+
+        if html is _RESUMED:
+            accession_number = self._accession(index)
+            if self.keep_tables:
+                tables.append(await asyncio.to_thread(self.manifest.load_frame, accession_number, "tables"))
+            if self._completed(index) == PARSED:
+                return await asyncio.to_thread(self.manifest.load_frame, accession_number, "text")
+            return _RESUMED
+
+        start = time.perf_counter()
+        if self.processor.parse_executor is not None:
+            columns = await asyncio.get_running_loop().run_in_executor(
+                self.processor.parse_executor, preprocessor.parse_filing_columns,
+                html, self.processor.company_ticker, form_type, report_date, self.processor.parse_engine
+            )
+            text_df, table_df = (preprocessor.from_columns(c) for c in columns)
+        else:
+            text_df, table_df = await preprocessor.parse_filing(
+                html, self.processor.company_ticker, form_type, report_date, self.processor.parse_engine
+            )
+        table_df["accession_number"] = self._accession(index)
+        await self.processor.store_tables(table_df)
+        await self._checkpoint(index, PARSED, lambda accession: (
+            self.manifest.save_frame(accession, "text", text_df),
+            self.manifest.save_frame(accession, "tables", table_df),
+        ))
+        stats.busy_seconds += time.perf_counter() - start
+        stats.items += 1
+
+        if self.keep_tables:
+            tables.append(table_df)
+        return text_df
+
+
+    async def _parse(self, in_queue: asyncio.Queue, out_queue: asyncio.Queue, tables: list):
+        """Parse filings in order, keeping up to `parse_ahead` in flight when they are parsed in worker processes."""
+        # On the event loop, parses could not overlap anyway
+        ahead = self.parse_ahead if self.processor.parse_executor is not None else 1
+        pending = deque()
+
+        try:
+            while (item := await in_queue.get()) is not _DONE:
+                index, html = item
+                pending.append((index, asyncio.create_task(self._parse_one(index, html, tables))))
+                if len(pending) >= ahead:
+                    index, task = pending.popleft()
+                    await out_queue.put((index, await task))
+
+            while pending:
+                index, task = pending.popleft()
+                await out_queue.put((index, await task))
+        finally:
+            for _, task in pending:
+                task.cancel()
+
+        await out_queue.put(_DONE)
+
+
+    async def _chunk(self, in_queue: asyncio.Queue, out_queue: asyncio.Queue):
+        stats = self.stats["chunk"]
+        metadata = self.processor.sec_api.filing_metadata
+
+        while (item := await in_queue.get()) is not _DONE:
+            index, text_df = item
+            _, _, form_type, report_date = self.processor.sec_api.get_metadata(index)
+
+            if text_df is _RESUMED:
+                chunk_df = _RESUMED
+                if self._completed(index) == CHUNKED:
+                    chunk_df = await asyncio.to_thread(self.manifest.load_frame, self._accession(index), "chunks")
+                await out_queue.put((index, chunk_df))
+                continue
+
+            start = time.perf_counter()
+            chunk_df = await preprocessor.chunk_text(
+                text_df, self.processor.company_ticker, form_type, report_date,
+                min_tokens=self.processor.min_chunk_tokens
+            )
+            chunk_df["accession_number"] = metadata.iloc[index]['accessionNumber']
+            chunk_df = preprocessor.compact_chunks(chunk_df)
+            if self.processor.near_duplicates is not None and not chunk_df.empty:
+                # MinHash/LSH is CPU bound; keep it off the event loop like embedding and storing
+                chunk_df, _ = await asyncio.to_thread(self.processor.near_duplicates.filter, chunk_df)
+                self._staged[index] = chunk_df
+            await self._checkpoint(index, CHUNKED, lambda accession: self.manifest.save_frame(accession, "chunks", chunk_df))
+            stats.busy_seconds += time.perf_counter() - start
+            stats.items += 1
+
+            await out_queue.put((index, chunk_df))
+
+        await out_queue.put(_DONE)
+
+
+    async def _embed(self, in_queue: asyncio.Queue, out_queue: asyncio.Queue):
+        stats = self.stats["embed"]
+
+        while (item := await in_queue.get()) is not _DONE:
+            index, chunk_df = item
+
+            if chunk_df is _RESUMED:
+                chunk_df, embeddings = await asyncio.to_thread(self._load_embedded, self._accession(index))
+                await out_queue.put((index, chunk_df, embeddings))
+                continue
+
+            start = time.perf_counter()
+            embeddings = None
+            if not chunk_df.empty:
+                async with self.embed_lock or nullcontext():
+                    embeddings = await asyncio.to_thread(self.processor.embed_chunks, chunk_df)
+                await self._checkpoint(index, EMBEDDED, lambda accession: self.manifest.save_embeddings(accession, embeddings))
+            else:
+                await self._checkpoint(index, EMBEDDED)
+            stats.busy_seconds += time.perf_counter() - start
+            stats.items += 1
+
+            await out_queue.put((index, chunk_df, embeddings))
+
+        await out_queue.put(_DONE)
+
+
+    def _load_embedded(self, accession_number: str) -> tuple[pd.DataFrame, np.ndarray | None]:
+        """Chunks and embeddings checkpointed by the embed stage of an earlier run."""
+        chunk_df = self.manifest.load_frame(accession_number, "chunks")
+        if chunk_df.empty:
+            return chunk_df, None
+        return chunk_df, self.manifest.load_embeddings(accession_number)
+
+
+    async def _store(self, in_queue: asyncio.Queue):
+        stats = self.stats["store"]
+        metadata = self.processor.sec_api.filing_metadata
+        sync_state = self.processor.sync_state
+
+        while (item := await in_queue.get()) is not _DONE:
+            index, chunk_df, embeddings = item
+            accession_number = metadata.iloc[index]['accessionNumber']
+
+            start = time.perf_counter()
+            if not chunk_df.empty:
+                async with self.store_lock or nullcontext():
+                    stored = await asyncio.to_thread(self.db.store_embeddings, chunk_df, embeddings)
+                self.chunks += len(chunk_df)
+                self.inserted += stored["inserted"]
+            # Also indexes the chunks of a filing resumed after its chunk stage
+            if self.processor.near_duplicates is not None:
+                await asyncio.to_thread(self.processor.near_duplicates.commit, chunk_df)
+            self._staged.pop(index, None)
+            stats.busy_seconds += time.perf_counter() - start
+            stats.items += 1
+
+            await self._checkpoint(index, STORED)
+            self.processor.processed_accessions.append(accession_number)
+            # Advance the watermark per filing so a crash only loses unstored filings
+            if sync_state is not None:
+                sync_state.mark_ingested(self.processor.sec_api.cik, [accession_number])
+
+
+    def _rollback(self):
+        """Unstage the near-duplicate signatures of filings that were not stored, keeping those that were."""
+        near_duplicates = self.processor.near_duplicates
+        if near_duplicates is None:
+            return
+        for chunk_df in self._staged.values():
+            near_duplicates.rollback(chunk_df)
+        self._staged.clear()
+        near_duplicates.save()
+
+
+    async def run(self) -> pd.DataFrame:
+        """Run every stage concurrently and return per-stage throughput."""
+        self.processor.processed_accessions = []
+        self.chunks = self.inserted = 0
+        if not await self.processor.retrieve_metadata():
+            return pd.DataFrame([stats.as_dict() for stats in self.stats.values()])
+
+        queues = [asyncio.Queue(maxsize=self.queue_size) for _ in range(4)]
+        tables = []
+
+        tasks = [
+            asyncio.create_task(self._fetch(queues[0])),
+            asyncio.create_task(self._parse(queues[0], queues[1], tables)),
+            asyncio.create_task(self._chunk(queues[1], queues[2])),
+            asyncio.create_task(self._embed(queues[2], queues[3])),
+            asyncio.create_task(self._store(queues[3])),
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed stage would otherwise leave its neighbours blocked on a full or empty queue
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self._rollback()
+            raise
+
+        if self.processor.near_duplicates is not None:
+            await asyncio.to_thread(self.processor.near_duplicates.save)
+
+        if tables:
+            self.processor.table_df = pd.concat(tables, ignore_index=True)
+
+        return pd.DataFrame([stats.as_dict() for stats in self.stats.values()])
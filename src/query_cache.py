@@ -0,0 +1,96 @@
+import re
+import time
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from utils.atomic import atomic_write
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with per-entry TTL and hit/miss counters.
+
+    When `path` is set, entries are pickled to disk after every write and
+    reloaded on construction, so cached values survive restarts.
+    """
+    def __init__(self, maxsize: int = 256, ttl: float = 3600.0, path: str = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._load()
+
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        self._save()
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        self._save()
+
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+    def _load(self):
+        if not self.path:
+            return
+        try:
+            with open(self.path, "rb") as f:
+                entries = pickle.load(f)
+        except (FileNotFoundError, EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+            return
+
+        now = time.time()
+        self._entries = OrderedDict((key, entry) for key, entry in entries.items() if entry[0] >= now)
+
+
+    def _save(self):
+        if not self.path:
+            return
+
+        with self._lock:
+            snapshot = OrderedDict(self._entries)
+
+        with atomic_write(self.path) as f:
+            pickle.dump(snapshot, f)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Lowercase, collapse whitespace and drop trailing punctuation so trivially different prompts share a key."""
+    return re.sub(r"\s+", " ", prompt.lower()).strip().rstrip("?.! ")
+
+
+def response_key(prompt: str, node_ids: list[str]) -> str:
+    """
+    Response cache key of a prompt and the nodes retrieved for it.
+    New filings change the retrieved nodes, which changes the key.
+    """
+    raw = normalize_prompt(prompt) + "\0" + "\0".join(sorted(node_ids))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
@@ -0,0 +1,201 @@
+import re
+import asyncio
+from typing import Callable, List
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever, VectorIndexAutoRetriever
+from llama_index.core.indices.query.schema import QueryBundle
+from llama_index.core.schema import NodeWithScore
+from llama_index.core.vector_stores.types import FilterOperator, MetadataFilter, MetadataFilters
+
+
+FORM_PATTERNS = {
+    "10-K": re.compile(r"\b10[\s-]?ks?\b|\bannual reports?\b", re.IGNORECASE),
+    "10-Q": re.compile(r"\b10[\s-]?qs?\b|\bquarterly reports?\b", re.IGNORECASE),
+    "8-K": re.compile(r"\b8[\s-]?ks?\b|\bcurrent reports?\b", re.IGNORECASE),
+}
+
+ORDINAL_QUARTERS = {"first": 1, "second": 2, "third": 3, "fourth": 4, "1st": 1, "2nd": 2, "3rd": 3, "4th": 4}
+
+_ISO_DATE = re.compile(r"\b(\d{4}-\d{2}-\d{2})\b")
+_QUARTER = re.compile(r"\bq([1-4])\b(?:\s*(?:of\s+)?(?:fy\s*)?'?(\d{4}|\d{2}))?|\b(first|second|third|fourth|1st|2nd|3rd|4th)\s+quarter\b(?:\s+(?:of\s+)?(?:fiscal\s+)?(\d{4}))?", re.IGNORECASE)
+_YEAR = re.compile(r"\b(?:fy\s*|fiscal\s+(?:year\s+)?)?((?:19|20)\d{2})\b", re.IGNORECASE)
+_DOLLAR_TICKER = re.compile(r"\$([A-Za-z][A-Za-z.-]{0,5})\b")
+# Not the tail of a contraction or possessive ("AAPL's", "don't"), nor part of "S&P"
+_WORD = re.compile(r"(?<!['’&])\b[A-Za-z][A-Za-z.-]{0,5}\b(?!&)")
+# Upper case words that look like a ticker, e.g. "NVDA"
+_TICKER_LIKE = re.compile(r"(?<![\w'’.&-])[A-Z]{1,5}\b(?![.&-]\w)")
+# Capitalised or CamelCase words that may name a company, e.g. "Apple", "MicroStrategy", "eBay"
+_NAME = re.compile(r"\b(?:[A-Z][a-z]{2,}|[a-z]+[A-Z][a-z]+)(?:[A-Z][a-z]+)*\b")
+
+# Short English words that are also tickers; only matched when written in upper case or with a $
+COMMON_WORDS = {
+    "a", "all", "am", "an", "and", "are", "as", "at", "be", "by", "can", "for", "go", "has", "have",
+    "how", "i", "if", "in", "is", "it", "me", "new", "now", "of", "on", "one", "or", "out", "see",
+    "so", "the", "to", "two", "up", "us", "was", "we", "what", "who", "why", "you", "tell", "give",
+}
+
+# Financial terms that are also tickers (NET, CASH, LOW, KEY, ...), matched like COMMON_WORDS.
+# Capitalised, e.g. "Risk Factors" or at the start of a query, they are not company names either.
+FINANCE_WORDS = {
+    "net", "cash", "income", "flow", "flows", "revenue", "revenues", "sales", "cost", "costs", "low",
+    "high", "key", "earn", "gain", "gains", "loss", "debt", "tax", "rate", "rates", "risk", "risks",
+    "margin", "growth", "fund", "bank", "lease", "equity", "stock", "share", "shares", "price",
+    "value", "profit", "capital", "asset", "assets", "pay", "total", "gross", "factors", "management",
+    "discussion", "analysis", "operations", "operating", "results", "statements", "statement",
+    "balance", "sheet", "segment", "segments", "guidance", "outlook", "dividend", "dividends",
+    "earnings", "expenses", "liabilities", "goodwill", "impairment", "inventory", "acquisition",
+    "acquisitions", "legal", "proceedings", "item", "part", "note", "notes", "form", "annual",
+    "quarterly", "report", "reports", "filing", "filings", "fiscal", "quarter", "year",
+}
+
+# Upper case abbreviations that are not tickers
+ACRONYMS = {
+    "a", "i", "ai", "us", "usa", "uk", "eu", "sec", "eps", "ceo", "cfo", "coo",
+    "cto", "gaap", "fy", "ipo", "md", "esg", "ttm", "yoy", "qoq", "ebit", "capex", "opex", "llm",
+}
+
+# Capitalised words that are not company names, mostly words a query starts with
+NON_ENTITY_WORDS = {
+    "january", "february", "march", "april", "may", "june", "july", "august", "september", "october",
+    "november", "december", "buy", "hold", "sell", "sec", "what", "how", "tell", "give", "show", "compare",
+    "which", "where", "when", "who", "why", "list", "find", "get", "summarize", "summarise", "explain",
+    "describe", "did", "does", "do", "is", "are", "was", "were", "has", "have", "had", "can", "could",
+    "should", "would", "will", "please", "the", "this", "that", "these", "those", "any", "all", "in",
+    "for", "from", "during", "between", "since", "over", "latest", "last", "recent", "most", "first",
+    "second", "third", "fourth", "its", "their", "our", "and", "or", "versus", "vs",
+}
+
+
+class ParsedFilters:
+    """Result of the rule-based parse: the filters found and whether the query needs the LLM to interpret it."""
+    def __init__(self, tickers=None, forms=None, dates=None, years=None, quarters=None, ambiguous=False):
+        self.tickers = tickers or []
+        self.forms = forms or []
+        self.dates = dates or []
+        self.years = years or []
+        self.quarters = quarters or []
+        self.ambiguous = ambiguous
+
+
+    def _filter(self, key: str, values: list) -> MetadataFilter:
+        if len(values) == 1:
+            return MetadataFilter(key=key, value=values[0], operator=FilterOperator.EQ)
+        return MetadataFilter(key=key, value=values, operator=FilterOperator.IN)
+
+
+    def to_metadata_filters(self) -> MetadataFilters | None:
+        filters = []
+        for key, values in (
+            ("company_name", self.tickers),
+            ("form_type", self.forms),
+            ("date", self.dates),
+            ("year", self.years),
+            ("quarter", self.quarters),
+        ):
+            if values:
+                filters.append(self._filter(key, values))
+        return MetadataFilters(filters=filters) if filters else None
+
+
+def _unique(values: list) -> list:
+    return list(dict.fromkeys(values))
+
+
+def parse_filters(query: str, known_tickers: set[str]) -> ParsedFilters:
+    """
+    Extract ticker, form type and date filters from a query without an LLM call.
+
+    Tickers are matched against `known_tickers` (lower case, as stored in the
+    `company_name` metadata); words that are also English or financial terms
+    only count in upper case or with a $, and so do one-letter tickers. The
+    parse is marked ambiguous, which the LLM auto-retriever handles better,
+    when the query names a quarter without a year, an upper case word that
+    looks like a ticker but is not a known one, or no known ticker but a
+    capitalised or CamelCase name (anywhere, including the first word).
+    """
+    tickers = [t.lower() for t in _DOLLAR_TICKER.findall(query) if t.lower() in known_tickers]
+    for word in _WORD.findall(query):
+        lowered = word.lower()
+        if len(word) == 1 and not word.isupper():
+            continue
+        if lowered in known_tickers and (word.isupper() or lowered not in COMMON_WORDS | FINANCE_WORDS):
+            tickers.append(lowered)
+
+    forms = [form for form, pattern in FORM_PATTERNS.items() if pattern.search(query)]
+    dates = _ISO_DATE.findall(query)
+
+    ambiguous = False
+    quarters, quarter_years = [], []
+    for match in _QUARTER.finditer(query):
+        quarter = int(match.group(1)) if match.group(1) else ORDINAL_QUARTERS[match.group(3).lower()]
+        year = match.group(2) or match.group(4)
+        quarters.append(quarter)
+        if year:
+            quarter_years.append(int(year) if len(year) == 4 else 2000 + int(year))
+        else:
+            ambiguous = True
+
+    query_without_dates = _ISO_DATE.sub(" ", query)
+    years = _unique(quarter_years + [int(year) for year in _YEAR.findall(query_without_dates)])
+    if quarters and not ambiguous and not years:
+        ambiguous = True
+
+    if len(known_tickers) > 1:
+        unknown_tickers = [
+            word for word in map(str.lower, _TICKER_LIKE.findall(query))
+            if word not in known_tickers and word not in ACRONYMS | COMMON_WORDS
+        ]
+        # Product and place names ("iPhone", "Europe") next to a ticker do not need the LLM
+        names = [] if tickers else [
+            name for name in map(str.lower, _NAME.findall(query))
+            if name not in known_tickers and name not in NON_ENTITY_WORDS | COMMON_WORDS | FINANCE_WORDS
+        ]
+        if unknown_tickers or names:
+            ambiguous = True
+
+    return ParsedFilters(
+        tickers=_unique(tickers),
+        forms=forms,
+        dates=_unique(dates),
+        years=years,
+        quarters=_unique(quarters),
+        ambiguous=ambiguous,
+    )
+
+
+class FastFilterRetriever(BaseRetriever):
+    """
+    Retriever that infers metadata filters with rules and only falls back to
+    LLM auto-retrieval when the rule-based parse is ambiguous.
+    """
+    def __init__(self, index, auto_retriever_factory: Callable[[], VectorIndexAutoRetriever], known_tickers: Callable[[], set[str]], similarity_top_k: int = 20):
+        super().__init__()
+        self._index = index
+        self._auto_retriever_factory = auto_retriever_factory
+        self._auto_retriever = None
+        self._known_tickers = known_tickers
+        self._similarity_top_k = similarity_top_k
+        self.fast_path_queries = 0
+        self.fallback_queries = 0
+
+
+    def _retrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        parsed = parse_filters(query_bundle.query_str, self._known_tickers())
+
+        if parsed.ambiguous:
+            self.fallback_queries += 1
+            if self._auto_retriever is None:
+                self._auto_retriever = self._auto_retriever_factory()
+            return self._auto_retriever.retrieve(query_bundle)
+
+        self.fast_path_queries += 1
+        retriever = VectorIndexRetriever(
+            index=self._index,
+            similarity_top_k=self._similarity_top_k,
+            filters=parsed.to_metadata_filters(),
+        )
+        return retriever.retrieve(query_bundle)
+
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> List[NodeWithScore]:
+        # Embedding and Chroma calls are blocking; run them on a worker thread instead of the event loop
+        return await asyncio.to_thread(self._retrieve, query_bundle)
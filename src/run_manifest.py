@@ -0,0 +1,104 @@
+import os
+import gzip
+import json
+import time
+import shutil
+import threading
+import numpy as np
+import pandas as pd
+from utils.atomic import atomic_write
+
+
+STAGES = ["fetched", "parsed", "chunked", "embedded", "stored"]
+
+
+class RunManifest:
+    """
+    Per-filing stage checkpoints of one company's ingestion run.
+
+    The manifest records the last completed stage of every filing, and each
+    stage's output is kept as a compact artifact (gzipped HTML, Parquet frames,
+    a float32 .npy of embeddings) so a rerun resumes each filing from its last
+    completed stage. Artifacts of a filing are deleted once it is stored.
+    """
+    def __init__(self, cik, root: str = None):
+        self.cik = str(cik).zfill(10)
+        self.root = os.path.join(root or os.path.join(os.getcwd(), "runs"), self.cik)
+        self.path = os.path.join(self.root, "manifest.json")
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
+    def _save(self):
+        with self._lock:
+            data = dict(self._state)
+
+        with atomic_write(self.path, "w") as f:
+            json.dump(data, f, indent=1)
+
+
+    def _dir(self, accession_number: str) -> str:
+        return os.path.join(self.root, accession_number)
+
+
+    def stage(self, accession_number: str) -> int:
+        """Index in STAGES of the filing's last completed stage, -1 if none."""
+        with self._lock:
+            entry = self._state.get(accession_number)
+        return STAGES.index(entry["stage"]) if entry else -1
+
+
+    def mark(self, accession_number: str, stage: str):
+        """Record `stage` as completed once its artifacts are written."""
+        with self._lock:
+            self._state[accession_number] = {"stage": stage, "updated": time.time()}
+        self._save()
+        if stage == "stored":
+            shutil.rmtree(self._dir(accession_number), ignore_errors=True)
+
+
+    def pending(self) -> dict[str, str]:
+        """Filings with a checkpoint that are not stored yet, by accession number."""
+        with self._lock:
+            return {accession: entry["stage"] for accession, entry in self._state.items() if entry["stage"] != "stored"}
+
+
+    def _artifact(self, accession_number: str, name: str) -> str:
+        directory = self._dir(accession_number)
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+
+    def save_html(self, accession_number: str, html: str):
+        with gzip.open(self._artifact(accession_number, "filing.html.gz"), "wt", encoding="utf-8", compresslevel=6) as f:
+            f.write(html)
+
+
+    def load_html(self, accession_number: str) -> str:
+        with gzip.open(self._artifact(accession_number, "filing.html.gz"), "rt", encoding="utf-8") as f:
+            return f.read()
+
+
+    def save_frame(self, accession_number: str, name: str, df: pd.DataFrame):
+        df.to_parquet(self._artifact(accession_number, f"{name}.parquet"), index=False)
+
+
+    def load_frame(self, accession_number: str, name: str) -> pd.DataFrame:
+        path = self._artifact(accession_number, f"{name}.parquet")
+        return pd.read_parquet(path) if os.path.exists(path) else pd.DataFrame()
+
+
+    def save_embeddings(self, accession_number: str, embeddings: np.ndarray):
+        np.save(self._artifact(accession_number, "embeddings.npy"), np.asarray(embeddings, dtype=np.float32))
+
+
+    def load_embeddings(self, accession_number: str) -> np.ndarray:
+        return np.load(self._artifact(accession_number, "embeddings.npy"))
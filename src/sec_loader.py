@@ -1,17 +1,53 @@
-import os
+import asyncio
+from typing import TYPE_CHECKING
+import numpy as np
 import pandas as pd
-from tqdm import tqdm
-from tqdm.asyncio import tqdm_asyncio
+from concurrent.futures import Executor
 from datascrap.sec_edgar import sec_edgar_api
-from analysis import preprocessor, embedding
+from datascrap.downloader import FilingDownloader
+from datascrap.filing_cache import FilingCache
+from analysis import preprocessor
+from analysis.embedding_cache import EmbeddingCache
+from analysis.dedup import NearDuplicateIndex
+from src.sync_state import SyncState
+from src.table_store import TableStore
+
+if TYPE_CHECKING:
+    from analysis.embedding import BAAIEmbeddings
 
 class SECDataProcessor:
-    def __init__(self, company_ticker="aapl"):
+    def __init__(
+        self,
+        company_ticker="aapl",
+        incremental=False,
+        sync_state: SyncState = None,
+        downloader: FilingDownloader = None,
+        cache: FilingCache = None,
+        embed_model: "BAAIEmbeddings" = None,
+        parse_executor: Executor = None,
+        parse_engine: str = "bs4",
+        min_chunk_tokens: int = 0,
+        embedding_cache: EmbeddingCache = None,
+        use_embedding_cache: bool = True,
+        near_duplicates: NearDuplicateIndex = None,
+        table_store: TableStore = None,
+        sec_api: sec_edgar_api = None,
+    ):
         self._company_ticker = company_ticker
-        self.sec_api = sec_edgar_api(company_ticker)
-        self.filings = []
-        self.chunk_df = pd.DataFrame()
-        self.text_df = pd.DataFrame()
+        # e.g. a BulkEdgarApi to ingest from local EDGAR bulk archives
+        self.sec_api = sec_api or sec_edgar_api(company_ticker, downloader=downloader, cache=cache)
+        self.embed_model = embed_model
+        self.parse_executor = parse_executor
+        self.parse_engine = parse_engine
+        self.min_chunk_tokens = min_chunk_tokens
+        self.embedding_cache = embedding_cache
+        self.use_embedding_cache = use_embedding_cache
+        self.near_duplicates = near_duplicates
+        self.table_store = table_store
+        self.incremental = incremental
+        self.sync_state = sync_state or (SyncState() if incremental else None)
+        self.processed_accessions = []
+        # Every filing's tables, when StreamingPipeline is asked to keep them
         self.table_df = pd.DataFrame()
 
 
@@ -25,45 +61,60 @@ class SECDataProcessor:
         self._company_ticker = ticker
 
 
-    async def fetch_filings(self):
-        """Retrieve company filings asynchronously and store them."""
-        self.sec_api.retrieve_company_filing_metadata()
-        await self.sec_api.get_filings()
-        self.filings = self.sec_api.filings
+    async def retrieve_metadata(self) -> bool:
+        """
+        Retrieve the filing metadata to ingest. Returns False if there is nothing to do.
+        In incremental mode filings already stored in the vector db are skipped.
+        """
+        exclude = self.sync_state.ingested(self.sec_api.cik) if self.incremental else None
+        await self.sec_api.fetch_company_filing_metadata(exclude_accessions=exclude)
+
+        if self.incremental and self.sec_api.filing_metadata.empty:
+            print(f"✅ {self.ticker}: no new filings since the last sync.")
+            return False
+        return not self.sec_api.filing_metadata.empty
+
+
+    async def store_tables(self, table_df: pd.DataFrame):
+        """Write one filing's tables to the table store, if there is one, off the event loop."""
+        if self.table_store is not None and not table_df.empty:
+            await asyncio.to_thread(self.table_store.write, table_df)
+
 
+    def setup_embeddings(self, embed_model: "BAAIEmbeddings" = None):
+        """Use `embed_model` if given (e.g. one shared across processors), otherwise load a new model."""
+        # Imported here so fetching and parsing do not load llama_index and the model stack
+        from llama_index.core.settings import Settings
+        from analysis.embedding import BAAIEmbeddings
 
-    async def process_filings(self):
-        """Processes all filings using preprocessor."""
-        all_chunk_dfs, all_text_dfs, all_table_dfs = [], [], []
+        self.embed_model = embed_model or self.embed_model or BAAIEmbeddings()
+        Settings.embed_model = self.embed_model
 
-        for index, filing_html in enumerate(tqdm_asyncio(self.filings, desc="Processing Filings")):
-            if not filing_html.strip():
-                print(f"⚠️ Warning: Filing {index + 1} is empty. Skipping processing.")
-                continue
 
-            accession_number, primary_document, form_type, report_date = self.sec_api.get_metadata(index)
+    def _embed_with_cache(self, texts: list[str]):
+        """Embed `texts`, sending only embedding cache misses to the model."""
+        if not self.use_embedding_cache:
+            return self.embed_model._get_text_embeddings(texts)
 
-            chunk_df, text_df, table_df = await preprocessor.clean_data(
-                filing_html, self.company_ticker, form_type, report_date
-            )
+        if self.embedding_cache is None:
+            self.embedding_cache = EmbeddingCache(self.embed_model._model_name, self.embed_model._instruction)
 
-            all_chunk_dfs.append(chunk_df)
-            all_text_dfs.append(text_df)
-            all_table_dfs.append(table_df)
+        embeddings, missing = self.embedding_cache.get_many(texts)
+        print(f"Embedding cache: {len(texts) - len(missing)} hits, {len(missing)} misses")
 
-        # Combine all processed data into single DataFrames
-        self.chunk_df = pd.concat(all_chunk_dfs, ignore_index=True)
-        self.text_df = pd.concat(all_text_dfs, ignore_index=True)
-        self.table_df = pd.concat(all_table_dfs, ignore_index=True)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            new_embeddings = self.embed_model._get_text_embeddings(missing_texts)
+            self.embedding_cache.put_many(missing_texts, new_embeddings)
 
+            if embeddings is None:
+                return new_embeddings
+            embeddings[missing] = new_embeddings
 
-    def setup_embeddings(self):
-        self.embed_model = embedding.BAAIEmbeddings()
-        embedding.Settings.embed_model = self.embed_model
+        return embeddings
 
 
-    def encode_texts(self):
-        temp_dict = [item["content_chunk"] for item in self.chunk_df.to_dict("records")]
-        self.embed_texts = pd.DataFrame(self.embed_model._get_text_embeddings(temp_dict))
-        self.chunk_df["embedding"] = self.embed_texts.apply(lambda row: row.tolist(), axis=1)
-        print(self.chunk_df.head())
\ No newline at end of file
+    def embed_chunks(self, chunk_df: pd.DataFrame) -> np.ndarray:
+        """Embeddings of `chunk_df`'s chunks as one contiguous float32 (n_chunks, dim) array, in row order."""
+        embeddings = self._embed_with_cache(chunk_df["content_chunk"].tolist())
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
@@ -0,0 +1,214 @@
+import sys
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from llama_index.core.settings import Settings
+from analysis import embedding
+from src.database import vectordb
+from src.query_cache import normalize_prompt
+
+
+class RequestCoalescer:
+    """
+    Runs identical in-flight requests once.
+
+    The first caller for a key computes the result; callers arriving with the
+    same key before it finishes wait on the same future instead of repeating
+    the work.
+    """
+    def __init__(self):
+        self.coalesced = 0
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+
+    def run(self, key, fn):
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = fn()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+
+class QueryService:
+    """
+    Keeps one embedding model and one vector db warm for repeated queries.
+
+    Models load on a background thread so the health endpoint answers at once;
+    `ready` is set when queries can be served.
+    """
+    def __init__(self, db_kwargs: dict = None):
+        self.db_kwargs = db_kwargs or {}
+        self.embed_model = None
+        self.db = None
+        self.error = None
+        self.ready = threading.Event()
+        self.coalescer = RequestCoalescer()
+        self.started = time.time()
+        self.queries = 0
+
+
+    def load(self):
+        try:
+            self.embed_model = embedding.BAAIEmbeddings()
+            Settings.embed_model = self.embed_model
+            self.db = vectordb(self.embed_model, **self.db_kwargs)
+            self.ready.set()
+        except Exception as e:
+            self.error = repr(e)
+            print(f"Failed to load query service: {e}")
+
+
+    def query(self, prompt: str, use_cache: bool = True) -> dict:
+        key = (normalize_prompt(prompt), use_cache)
+        return self.coalescer.run(key, lambda: self._query(prompt, use_cache))
+
+
+    def _query(self, prompt: str, use_cache: bool) -> dict:
+        start = time.perf_counter()
+        response = self.db.query(prompt, use_cache=use_cache)
+        self.queries += 1
+        return {
+            "response": str(response),
+            "sources": [node.node.metadata for node in getattr(response, "source_nodes", [])],
+            "seconds": time.perf_counter() - start,
+        }
+
+
+    def health(self) -> dict:
+        return {
+            "status": "ready" if self.ready.is_set() else ("failed" if self.error else "loading"),
+            "error": self.error,
+            "uptime": time.time() - self.started,
+            "queries": self.queries,
+            "coalesced": self.coalescer.coalesced,
+        }
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """
+    GET  /health  liveness and load status, always 200
+    GET  /ready   200 once models are loaded, 503 before
+    GET  /stats   cache hit/miss counters
+    POST /query   {"prompt": "...", "use_cache": true}
+    """
+
+    def _send(self, status: int, body: dict):
+        payload = json.dumps(body, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+    def do_GET(self):
+        service = self.server.service
+        if self.path == "/health":
+            self._send(200, service.health())
+        elif self.path == "/ready":
+            self._send(200 if service.ready.is_set() else 503, service.health())
+        elif self.path == "/stats" and service.ready.is_set():
+            self._send(200, service.db.cache_stats())
+        else:
+            self._send(404, {"error": f"Unknown path {self.path}"})
+
+
+    def do_POST(self):
+        service = self.server.service
+        if self.path != "/query":
+            self._send(404, {"error": f"Unknown path {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            request = json.loads(self.rfile.read(length) or b"{}")
+            prompt = request["prompt"]
+        except (ValueError, KeyError, TypeError):
+            self._send(400, {"error": "Expected a JSON body with a 'prompt'."})
+            return
+
+        if not service.ready.is_set():
+            self._send(503, service.health())
+            return
+
+        try:
+            self._send(200, service.query(prompt, use_cache=request.get("use_cache", True)))
+        except Exception as e:
+            self._send(500, {"error": repr(e)})
+
+
+class QueryServer(HTTPServer):
+    """
+    HTTP server that handles connections on a bounded thread pool.
+
+    At most `workers` requests run at once and `backlog` more may wait; further
+    connections are refused with 503 instead of queueing without bound.
+    """
+    def __init__(self, address: tuple, service: QueryService, workers: int = 4, backlog: int = 16):
+        super().__init__(address, QueryHandler)
+        self.service = service
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="query")
+        self._slots = threading.BoundedSemaphore(workers + backlog)
+
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(b"HTTP/1.0 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            finally:
+                self.shutdown_request(request)
+            return
+        self.executor.submit(self._process, request, client_address)
+
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def serve(host: str = "127.0.0.1", port: int = 8765, workers: int = 4, backlog: int = 16, **db_kwargs):
+    service = QueryService(db_kwargs)
+    threading.Thread(target=service.load, daemon=True).start()
+
+    server = QueryServer((host, port), service, workers=workers, backlog=backlog)
+    print(f"Serving queries on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    serve(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
@@ -0,0 +1,46 @@
+import os
+import json
+import threading
+from utils.atomic import atomic_write
+
+
+class SyncState:
+    """
+    Per-CIK watermark of accession numbers that have been stored in the vector db.
+
+    Used by incremental runs to skip fetching, parsing and embedding filings
+    that were ingested by a previous run.
+    """
+    def __init__(self, path: str = None):
+        self.path = path or os.path.join(os.getcwd(), "chroma_db", "sync_state.json")
+        self._lock = threading.Lock()
+        self._state = self._load()
+
+
+    def _load(self) -> dict[str, set[str]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return {cik: set(accessions) for cik, accessions in json.load(f).items()}
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+
+    def save(self):
+        with self._lock:
+            data = {cik: sorted(accessions) for cik, accessions in self._state.items()}
+
+        with atomic_write(self.path, "w") as f:
+            json.dump(data, f)
+
+
+    def ingested(self, cik) -> set[str]:
+        """Accession numbers already stored for `cik`"""
+        with self._lock:
+            return set(self._state.get(str(cik).zfill(10), ()))
+
+
+    def mark_ingested(self, cik, accession_numbers):
+        """Record accession numbers as stored and persist the watermark."""
+        with self._lock:
+            self._state.setdefault(str(cik).zfill(10), set()).update(accession_numbers)
+        self.save()
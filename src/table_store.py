@@ -0,0 +1,93 @@
+import os
+import pandas as pd
+from analysis.tables import positional_columns, reconstruct, to_frame
+from src.fact_index import FactIndex
+
+
+class TableStore:
+    """
+    Reconstructed filing tables in a hive-partitioned Parquet dataset.
+
+    Each filing is written to its own ticker/form_type/accession_number
+    partition as soon as it is parsed, replacing any earlier write of the same
+    filing. Reads pass their filters to pyarrow, so only matching partitions
+    (and row groups, for table_number) are scanned. When `facts` is given,
+    every write also updates that FactIndex.
+    """
+    PARTITIONS = ["ticker", "form_type", "accession_number"]
+
+    def __init__(self, root: str = None, facts: FactIndex = None):
+        self.root = root or os.path.join(os.getcwd(), "table_store")
+        self.facts = facts
+
+
+    def write(self, table_df: pd.DataFrame) -> int:
+        """Reconstruct and persist the tables of one or more filings. Returns the number of table rows written."""
+        if table_df.empty:
+            return 0
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        rows = reconstruct(table_df).rename(columns={"company_name": "ticker"})
+        missing = [column for column in self.PARTITIONS if column not in rows.columns]
+        if missing:
+            raise ValueError(f"table_df is missing partition columns {missing}.")
+
+        pq.write_to_dataset(
+            pa.Table.from_pandas(rows, preserve_index=False),
+            self.root,
+            partition_cols=self.PARTITIONS,
+            existing_data_behavior="delete_matching",
+            basename_template="part-{i}.parquet",
+        )
+
+        if self.facts is not None:
+            self.facts.add(rows)
+            self.facts.save()
+        return len(rows)
+
+
+    def read(self, ticker: str = None, form_type: str = None, accession_number: str = None, table_number: int = None, columns: list[str] = None) -> pd.DataFrame:
+        """Table rows matching every given key, with filters pushed down to the Parquet scan."""
+        if not os.path.isdir(self.root):
+            return pd.DataFrame()
+
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+
+        filters = [
+            (column, "=", value)
+            for column, value in (
+                ("ticker", ticker),
+                ("form_type", form_type),
+                ("accession_number", accession_number),
+                ("table_number", table_number),
+            )
+            if value is not None
+        ]
+        # Partition values are always strings; inference would turn accession numbers like "0001" into ints
+        partitioning = ds.partitioning(pa.schema([(column, pa.string()) for column in self.PARTITIONS]), flavor="hive")
+        dataset = ds.dataset(self.root, format="parquet", partitioning=partitioning)
+        expression = pq.filters_to_expression(filters) if filters else None
+
+        # Filings are written with as many value_<i>/column_<i> columns as their widest
+        # table, so read with the union of the matching files' schemas, not the first one's
+        fragments = list(dataset.get_fragments(filter=expression))
+        if not fragments:
+            return pd.DataFrame()
+        schema = pa.unify_schemas([dataset.schema] + [fragment.physical_schema for fragment in fragments])
+        positional = positional_columns(schema.names, "value_") + positional_columns(schema.names, "column_")
+        schema = pa.schema([field for field in schema if field.name not in positional] + [schema.field(name) for name in positional])
+
+        dataset = ds.dataset(self.root, schema=schema, format="parquet", partitioning=partitioning)
+        return dataset.to_table(columns=columns, filter=expression).to_pandas()
+
+
+    def table(self, ticker: str, accession_number: str, table_number: int) -> pd.DataFrame:
+        """One table as a 2-D frame of line items by numeric column."""
+        rows = self.read(ticker=ticker, accession_number=accession_number, table_number=table_number)
+        if rows.empty:
+            return rows
+        return to_frame(rows.sort_values("row"))
@@ -0,0 +1,28 @@
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+import pytest
+
+
+# Run the suite against the working tree without installing it
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def http_server():
+    """Start a local HTTP server for a request handler class and return its base url. Servers stop after the test."""
+    servers = []
+
+    def start(handler) -> str:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+
+    for server in servers:
+        server.shutdown()
+        server.server_close()
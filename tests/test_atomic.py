@@ -0,0 +1,45 @@
+import os
+import pytest
+from utils.atomic import atomic_write
+from src.sync_state import SyncState
+from datascrap.filing_cache import FilingCache
+
+
+def test_atomic_write_replaces_file(tmp_path):
+    path = tmp_path / "nested" / "state.json"
+
+    with atomic_write(str(path), "w") as f:
+        f.write("first")
+    with atomic_write(str(path), "w") as f:
+        f.write("second")
+
+    assert path.read_text(encoding="utf-8") == "second"
+    assert os.listdir(path.parent) == ["state.json"]
+
+
+def test_atomic_write_keeps_old_file_on_error(tmp_path):
+    path = tmp_path / "state.bin"
+    path.write_bytes(b"old")
+
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path), fsync=True) as f:
+            f.write(b"partial")
+            raise RuntimeError("crash while writing")
+
+    assert path.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["state.bin"]
+
+
+def test_sync_state_round_trip(tmp_path):
+    path = str(tmp_path / "sync_state.json")
+    SyncState(path).mark_ingested(320193, ["0000320193-24-000001"])
+
+    assert SyncState(path).ingested("0000320193") == {"0000320193-24-000001"}
+
+
+def test_filing_cache_round_trip(tmp_path):
+    cache = FilingCache(root=str(tmp_path))
+    cache.put(320193, "0000320193-24-000001", "q2.htm", "<html>Q2</html>")
+
+    assert cache.get(320193, "0000320193-24-000001", "q2.htm") == "<html>Q2</html>"
+    assert cache.size() > 0
@@ -0,0 +1,88 @@
+import pickle
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from src.bm25 import BM25Index
+
+
+def test_saves_append_only_new_documents(tmp_path):
+    path = str(tmp_path / "bm25.pkl")
+    index = BM25Index(path)
+    index.add(["a"], ["net sales increased"], [{"company_name": "aapl"}])
+    index.save()
+    first = (tmp_path / "bm25.pkl").read_bytes()
+
+    index.add(["b"], ["operating income decreased"], [{"company_name": "msft"}])
+    index.save()
+    index.save()
+
+    saved = (tmp_path / "bm25.pkl").read_bytes()
+    assert saved.startswith(first)
+    assert pickle.loads(saved[len(first):])["ids"] == ["b"]
+    restored = BM25Index(path)
+    assert restored.ids == ["a", "b"]
+    assert restored.search("income", filters={"company_name": {"msft"}})[0][0] == "b"
+
+
+def test_torn_segment_is_dropped(tmp_path):
+    path = tmp_path / "bm25.pkl"
+    index = BM25Index(str(path))
+    index.add(["a"], ["net sales increased"])
+    index.save()
+    index.add(["b"], ["operating income decreased"])
+    index.save()
+    # Crash halfway through appending the second segment
+    path.write_bytes(path.read_bytes()[:-20])
+
+    restored = BM25Index(str(path))
+    assert restored.ids == ["a"]
+
+    restored.add(["c"], ["gross margin"])
+    restored.save()
+    assert BM25Index(str(path)).ids == ["a", "c"]
+
+
+def test_loads_whole_index_snapshot(tmp_path):
+    path = tmp_path / "bm25.pkl"
+    state = {"ids": ["a"], "lengths": [3], "metadata": [{}], "postings": {"net": {0: 1}, "sales": {0: 1}, "increased": {0: 1}}}
+    path.write_bytes(pickle.dumps(state))
+
+    index = BM25Index(str(path))
+    index.add(["b"], ["operating income decreased"])
+    index.save()
+
+    assert BM25Index(str(path)).search("sales")[0][0] == "a"
+    assert BM25Index(str(path)).ids == ["a", "b"]
+
+
+class FailingCollection:
+    """Chroma collection whose writes fail."""
+    def __init__(self, collection):
+        self._collection = collection
+
+    def get(self, **kwargs):
+        return self._collection.get(**kwargs)
+
+    def upsert(self, **kwargs):
+        raise RuntimeError("chroma write failed")
+
+
+@pytest.mark.parametrize("use_worker_thread", [False, True])
+def test_failed_upsert_is_not_indexed(tmp_path, monkeypatch, use_worker_thread):
+    pytest.importorskip("chromadb")
+    from llama_index.core.embeddings import MockEmbedding
+    from src.database import vectordb
+
+    monkeypatch.chdir(tmp_path)
+    db = vectordb(MockEmbedding(embed_dim=8))
+    db.collection = FailingCollection(db.collection)
+    chunk_df = pd.DataFrame({"company_name": ["aapl"], "content_chunk": ["net sales increased"]})
+
+    with pytest.raises(RuntimeError):
+        db.store_embeddings(chunk_df, np.ones((1, 8), dtype=np.float32), use_worker_thread=use_worker_thread)
+
+    assert len(db.bm25) == 0
+    assert len(BM25Index()) == 0
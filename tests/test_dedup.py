@@ -0,0 +1,57 @@
+import pandas as pd
+from analysis.dedup import NearDuplicateIndex, chunk_id
+
+
+RISK = "Our business depends on the continued demand for our products and services in the markets where we operate {}."
+
+
+def chunks(company: str, *texts: str) -> pd.DataFrame:
+    return pd.DataFrame({"company_name": company, "content_chunk": list(texts)})
+
+
+def reloaded(index: NearDuplicateIndex) -> NearDuplicateIndex:
+    index.save()
+    return NearDuplicateIndex(path=index.path)
+
+
+def test_near_duplicates_only_match_within_a_company(tmp_path):
+    index = NearDuplicateIndex(path=str(tmp_path))
+
+    kept, dropped = index.filter(chunks("aapl", RISK.format(2023), RISK.format(2024)))
+    assert len(kept) == 1
+    assert dropped["canonical_id"].tolist() == [chunk_id(RISK.format(2023))]
+
+    kept, dropped = index.filter(chunks("msft", RISK.format(2024)))
+    assert len(kept) == 1 and dropped.empty
+
+
+def test_staged_chunks_are_saved_only_once_committed(tmp_path):
+    index = NearDuplicateIndex(path=str(tmp_path))
+    kept, _ = index.filter(chunks("aapl", RISK.format(2023), RISK.format(2024)))
+
+    assert reloaded(index).ids == []
+
+    index.commit(kept)
+    restored = reloaded(index)
+    assert restored.ids == [chunk_id(RISK.format(2023))]
+    assert restored.provenance == {chunk_id(RISK.format(2024)): chunk_id(RISK.format(2023))}
+
+
+def test_rollback_unstages_chunks_of_a_failed_store(tmp_path):
+    index = NearDuplicateIndex(path=str(tmp_path))
+    kept, _ = index.filter(chunks("aapl", RISK.format(2023)))
+
+    index.rollback(kept)
+
+    kept, dropped = index.filter(chunks("aapl", RISK.format(2024)))
+    assert len(kept) == 1 and dropped.empty
+    assert reloaded(index).provenance == {}
+
+
+def test_commit_indexes_chunks_filtered_by_an_earlier_process(tmp_path):
+    # A resumed filing was filtered before a crash, so nothing was staged in this process
+    index = NearDuplicateIndex(path=str(tmp_path))
+    index.commit(chunks("aapl", RISK.format(2023)))
+
+    kept, dropped = reloaded(index).filter(chunks("aapl", RISK.format(2024)))
+    assert kept.empty and len(dropped) == 1
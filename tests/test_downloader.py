@@ -0,0 +1,158 @@
+import json
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler
+from datascrap import ticker_index
+from datascrap.downloader import FilingDownloader
+from datascrap.sec_edgar import sec_edgar_api
+
+
+def make_handler(routes: dict, hits: list):
+    """
+    Handler serving `routes`: path -> list of (status, body, delay) responses.
+    Each request takes the next response, the last one repeats. Requests are logged to `hits`.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits.append((self.path, time.monotonic()))
+            responses = routes.get(self.path, [(404, "", 0)])
+            status, body, delay = responses.pop(0) if len(responses) > 1 else responses[0]
+            time.sleep(delay)
+
+            payload = body.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def paths(hits: list) -> list[str]:
+    return [path for path, _ in hits]
+
+
+def test_fetch_retries_transient_errors(http_server):
+    hits = []
+    url = http_server(make_handler({"/flaky": [(503, "", 0), (500, "", 0), (200, "filing", 0)]}, hits))
+    downloader = FilingDownloader(max_retries=3, backoff_base=0.01)
+
+    assert asyncio.run(downloader.fetch(f"{url}/flaky")) == "filing"
+    assert paths(hits) == ["/flaky"] * 3
+
+
+def test_fetch_gives_up_after_max_retries(http_server):
+    hits = []
+    url = http_server(make_handler({"/down": [(503, "", 0)]}, hits))
+    downloader = FilingDownloader(max_retries=2, backoff_base=0.01)
+
+    assert asyncio.run(downloader.fetch(f"{url}/down")) == ""
+    assert len(hits) == 3
+
+
+def test_fetch_does_not_retry_client_errors(http_server):
+    hits = []
+    url = http_server(make_handler({}, hits))
+    downloader = FilingDownloader(max_retries=3, backoff_base=0.01)
+
+    assert asyncio.run(downloader.fetch(f"{url}/missing")) == ""
+    assert paths(hits) == ["/missing"]
+
+
+def test_fetch_all_returns_urls_in_order(http_server):
+    hits = []
+    # Earlier documents answer last
+    routes = {f"/doc/{i}": [(200, f"doc {i}", 0.05 * (4 - i))] for i in range(5)}
+    url = http_server(make_handler(routes, hits))
+    downloader = FilingDownloader()
+
+    documents = asyncio.run(downloader.fetch_all([f"{url}/doc/{i}" for i in range(5)]))
+
+    assert documents == [f"doc {i}" for i in range(5)]
+
+
+def test_fetch_all_is_rate_limited(http_server):
+    hits = []
+    routes = {f"/doc/{i}": [(200, "ok", 0)] for i in range(30)}
+    url = http_server(make_handler(routes, hits))
+    # A burst of `rate` requests, then one every 1/rate seconds
+    downloader = FilingDownloader(rate=20.0)
+
+    start = time.monotonic()
+    asyncio.run(downloader.fetch_all([f"{url}/doc/{i}" for i in range(30)]))
+    elapsed = time.monotonic() - start
+
+    assert len(hits) == 30
+    assert elapsed >= 0.45
+    # No more than the burst plus what refilled in the first 0.2s
+    assert sum(at - start < 0.2 for _, at in hits) <= 20 + 0.2 * 20 + 1
+
+
+def test_blocking_get_shares_the_rate_limit(http_server):
+    hits = []
+    url = http_server(make_handler({"/doc": [(200, "ok", 0)]}, hits))
+    downloader = FilingDownloader(rate=20.0)
+
+    async def mixed():
+        # Worker threads using the blocking client draw from the same bucket as async fetches
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            blocking = [asyncio.get_running_loop().run_in_executor(pool, downloader.get, f"{url}/doc") for _ in range(15)]
+            await asyncio.gather(downloader.fetch_all([f"{url}/doc"] * 15), *blocking)
+
+    start = time.monotonic()
+    asyncio.run(mixed())
+
+    assert len(hits) == 30
+    assert time.monotonic() - start >= 0.45
+
+
+def test_sec_edgar_api_against_local_server(http_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(ticker_index, "_index", None)
+
+    submissions = {
+        "filings": {
+            "recent": {
+                "accessionNumber": ["0000320193-24-000002", "0000320193-24-000001", "0000320193-23-000009"],
+                "form": ["10-Q", "10-Q", "10-K"],
+                "filingDate": ["2024-08-02", "2024-05-03", "2023-11-03"],
+                "reportDate": ["2024-06-29", "2024-03-30", "2023-09-30"],
+                "primaryDocument": ["q3.htm", "q2.htm", "k.htm"],
+            }
+        }
+    }
+    routes = {
+        "/files/company_tickers.json": [(200, json.dumps({"0": {"cik_str": 320193, "ticker": "AAPL", "title": "Apple Inc."}}), 0)],
+        "/submissions/CIK0000320193.json": [(503, "", 0), (200, json.dumps(submissions), 0)],
+        "/Archives/320193/000032019323000009/k.htm": [(200, "<html>10-K</html>", 0.1)],
+        "/Archives/320193/000032019324000002/q3.htm": [(503, "", 0), (200, "<html>Q3</html>", 0)],
+        "/Archives/320193/000032019324000001/q2.htm": [(200, "<html>Q2</html>", 0)],
+    }
+    hits = []
+    url = http_server(make_handler(routes, hits))
+
+    api = sec_edgar_api(
+        "aapl",
+        downloader=FilingDownloader(backoff_base=0.01),
+        use_cache=False,
+        archives_url=f"{url}/Archives",
+        submissions_url=f"{url}/submissions",
+        company_tickers_url=f"{url}/files/company_tickers.json",
+    )
+    assert api.cik == "0000320193"
+
+    async def ingest():
+        await api.fetch_company_filing_metadata()
+        await api.get_filings()
+
+    asyncio.run(ingest())
+
+    # Metadata is ordered by form, newest first, and filings follow it
+    assert api.filing_metadata["primaryDocument"].tolist() == ["k.htm", "q3.htm", "q2.htm"]
+    assert api.filings == ["<html>10-K</html>", "<html>Q3</html>", "<html>Q2</html>"]
+    assert paths(hits).count("/submissions/CIK0000320193.json") == 2
+    assert paths(hits).count("/Archives/320193/000032019324000002/q3.htm") == 2
@@ -0,0 +1,66 @@
+import os
+import numpy as np
+import pytest
+from analysis.embedding_cache import EmbeddingCache
+
+
+def vector(value: float) -> np.ndarray:
+    return np.full((1, 4), value, dtype=np.float32)
+
+
+def make_cache(tmp_path, **kwargs) -> EmbeddingCache:
+    return EmbeddingCache("model", "", root=str(tmp_path), capacity=2, **kwargs)
+
+
+def test_crash_while_evicting_never_returns_another_texts_vector(tmp_path, monkeypatch):
+    cache = make_cache(tmp_path)
+    cache.put_many(["a"], vector(1))
+    cache.put_many(["b"], vector(2))
+    cache.get("a")
+
+    append_log = cache._append_log
+
+    def crash_before_logging_keys(slots, sync=False):
+        if not sync:
+            raise KeyboardInterrupt("killed after the vectors were written")
+        append_log(slots, sync=sync)
+
+    monkeypatch.setattr(cache, "_append_log", crash_before_logging_keys)
+    with pytest.raises(KeyboardInterrupt):
+        # Evicts "b" and writes "c" into its slot
+        cache.put_many(["c"], vector(3))
+
+    restored = make_cache(tmp_path)
+    assert restored.get("b") is None
+    assert restored.get("c") is None
+    np.testing.assert_array_equal(restored.get("a"), vector(1)[0])
+
+
+def test_puts_append_to_the_index_log(tmp_path):
+    cache = make_cache(tmp_path, compact_every=4)
+    cache.put_many(["a"], vector(1))
+    cache.put_many(["b"], vector(2))
+
+    assert not os.path.exists(cache._index_path)
+    assert len(make_cache(tmp_path)) == 2
+
+    # Two more puts evict twice and reach compact_every, folding the log into a snapshot
+    cache.put_many(["c"], vector(3))
+    assert os.path.getsize(cache._log_path) == 0
+
+    restored = make_cache(tmp_path)
+    assert restored.get("a") is None
+    np.testing.assert_array_equal(restored.get("b"), vector(2)[0])
+    np.testing.assert_array_equal(restored.get("c"), vector(3)[0])
+
+
+def test_torn_log_record_is_dropped(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(["a"], vector(1))
+    cache.put_many(["b"], vector(2))
+    with open(cache._log_path, "r+b") as f:
+        f.truncate(os.path.getsize(cache._log_path) - 5)
+
+    restored = make_cache(tmp_path)
+    assert len(restored) == 1
+    np.testing.assert_array_equal(restored.get("a"), vector(1)[0])
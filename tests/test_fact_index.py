@@ -0,0 +1,90 @@
+import pytest
+from analysis.tables import reconstruct
+from src.fact_index import FactIndex, LOOKUP_COLUMNS
+from tests.test_tables import cells
+
+
+def index(tmp_path, *tables) -> FactIndex:
+    facts = FactIndex(path=str(tmp_path / "_facts.pkl"))
+    for table_df in tables:
+        facts.add(reconstruct(table_df).rename(columns={"company_name": "ticker"}))
+    return facts
+
+
+def test_dash_in_current_period_gives_no_fact(tmp_path):
+    facts = index(tmp_path, cells([
+        ["", "2024", "", "2023"],
+        ["Net sales", "$", "391,035", "$", "383,285"],
+        ["Goodwill impairment", "—", "", "$", "1,200"],
+    ]))
+
+    assert facts.facts[("aapl", "revenue")] == {
+        "2024-09-28": {"value": 391035.0, "form_type": "10-K", "accession_number": "0000320193-24-000123", "table_number": 0, "source_label": "Net sales"},
+    }
+    assert ("aapl", "goodwill impairment") not in facts.facts
+
+
+def test_value_comes_from_the_column_of_the_report_period(tmp_path):
+    facts = index(tmp_path, cells([
+        ["Three Months Ended"],
+        ["", "September 30, 2023", "September 28, 2024"],
+        ["Net sales", "89,498", "94,930"],
+    ]))
+
+    assert facts.lookup("aapl", "revenue")["value"].tolist() == [94930.0]
+
+
+def test_unresolved_period_is_skipped(tmp_path):
+    facts = index(
+        tmp_path,
+        cells([["Net sales", "$", "391,035"]]),
+        cells([["", "2024", "2023"], ["Net sales", "391,035"]]),
+        cells([["", "2022", "2021"], ["Net sales", "394,328", "365,817"]]),
+    )
+
+    assert len(facts) == 0
+
+
+def annual_revenue(tmp_path) -> FactIndex:
+    return index(tmp_path, cells([["", "2024", "2023"], ["Net sales", "391,035", "383,285"]]))
+
+
+def test_year_matching_no_period_falls_back_to_the_llm(tmp_path):
+    facts = annual_revenue(tmp_path)
+
+    assert facts.lookup("aapl", "revenue", years=[2019]).columns.tolist() == LOOKUP_COLUMNS
+    assert facts.lookup("aapl", "revenue", years=[2019]).empty
+
+    pytest.importorskip("llama_index.core")
+    assert facts.answer("AAPL revenue in 2019", {"aapl"}) is None
+    assert facts.answer("AAPL revenue in 2024", {"aapl"}).facts["value"].tolist() == [391035.0]
+
+
+def test_form_matching_no_fact_falls_back_to_the_llm(tmp_path):
+    facts = annual_revenue(tmp_path)
+
+    assert facts.lookup("aapl", "revenue", form_type=["10-Q"]).columns.tolist() == LOOKUP_COLUMNS
+    assert facts.lookup("aapl", "revenue", form_type=["10-Q"]).empty
+
+    pytest.importorskip("llama_index.core")
+    assert facts.answer("AAPL revenue over the last five 10-Qs", {"aapl"}) is None
+
+
+def test_saves_append_only_new_facts(tmp_path):
+    path = tmp_path / "_facts.pkl"
+    facts = index(tmp_path, cells([["", "2024", "2023"], ["Net sales", "391,035", "383,285"]]))
+    facts.save()
+    first = path.read_bytes()
+
+    facts.add(reconstruct(cells([["", "2023", "2022"], ["Net sales", "383,285", "394,328"]], "2023-09-30", "0000320193-23-000106")).rename(columns={"company_name": "ticker"}))
+    facts.save()
+    facts.save()
+
+    saved = path.read_bytes()
+    assert saved.startswith(first)
+    restored = FactIndex(path=str(path))
+    assert restored.lookup("aapl", "net sales")["value"].tolist() == [391035.0, 383285.0]
+
+    # Crash halfway through appending a segment
+    path.write_bytes(saved[:-10])
+    assert FactIndex(path=str(path)).lookup("aapl", "revenue")["value"].tolist() == [391035.0]
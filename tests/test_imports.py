@@ -0,0 +1,29 @@
+import os
+import sys
+import subprocess
+import pytest
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only needed to embed, store or query, never to fetch and parse
+HEAVY_PACKAGES = ("llama_index", "chromadb", "FlagEmbedding", "torch", "transformers")
+
+
+def imported_modules(module: str) -> list[str]:
+    """Modules loaded by `import module` in a fresh interpreter, from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stderr
+    # Lines look like "import time:       123 |        456 |   package.module"
+    return [line.rsplit("|", 1)[1].strip() for line in result.stderr.splitlines() if line.startswith("import time:") and line.count("|") == 2]
+
+
+@pytest.mark.parametrize("module", ["src.sec_loader", "src.pipeline", "src.batch"])
+def test_ingestion_modules_import_without_the_model_stack(module):
+    modules = imported_modules(module)
+
+    assert module in modules
+    assert [name for name in modules if name.split(".")[0] in HEAVY_PACKAGES] == []
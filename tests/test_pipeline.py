@@ -0,0 +1,219 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from analysis import preprocessor
+from analysis.dedup import NearDuplicateIndex, chunk_id
+from src.pipeline import StreamingPipeline, STORED, CHUNKED
+from src.run_manifest import RunManifest
+from src.sec_loader import SECDataProcessor
+from src.sync_state import SyncState
+
+
+CIK = "0000320193"
+
+FILINGS = {
+    "0000320193-23-000106": ["Revenue from services grew on subscriptions across every geographic segment", "Gross margin narrowed as component costs rose during the second half"],
+    "0000320193-24-000123": ["Research spending expanded following new silicon programs and hiring", "Liquidity remained strong with commercial paper repaid before maturity"],
+}
+
+
+class FakeTickerIndex:
+    def cik(self, ticker):
+        return CIK
+
+
+class FakeApi:
+    """sec_edgar_api serving FILINGS from memory and counting downloads."""
+    def __init__(self):
+        self.cik = CIK
+        self.ticker_index = FakeTickerIndex()
+        self.fetched = []
+        self.filing_metadata = pd.DataFrame()
+
+    async def fetch_company_filing_metadata(self, exclude_accessions=None):
+        accessions = [accession for accession in FILINGS if accession not in (exclude_accessions or ())]
+        self.filing_metadata = pd.DataFrame({
+            "accessionNumber": accessions,
+            "primaryDocument": [f"{accession}.htm" for accession in accessions],
+            "form": "10-K",
+            "reportDate": [f"20{accession[11:13]}-09-30" for accession in accessions],
+        })
+
+    def get_metadata(self, index):
+        row = self.filing_metadata.iloc[index]
+        return row["accessionNumber"], row["primaryDocument"], row["form"], row["reportDate"]
+
+    async def fetch_filing(self, index):
+        accession_number = self.filing_metadata.iloc[index]["accessionNumber"]
+        self.fetched.append(accession_number)
+        # The cover page, before the first page break, is not ingested
+        pages = "".join(f"<hr/><p>{page}</p>" for page in FILINGS[accession_number])
+        return f"<html><body><p>Cover page</p>{pages}</body></html>"
+
+
+class FakeEmbedding:
+    """Embedding model that fails while `broken` is set."""
+    _model_name = "fake"
+    _instruction = ""
+
+    def __init__(self, broken: bool = False):
+        self.broken = broken
+
+    def _get_text_embeddings(self, texts):
+        if self.broken:
+            raise RuntimeError("embedding model crashed")
+        return [[1.0, 0.0, 0.0, 0.0]] * len(texts)
+
+
+class FakeDb:
+    def __init__(self):
+        self.chunks = {}
+
+    def store_embeddings(self, chunk_df, embeddings):
+        assert len(chunk_df) == len(embeddings)
+        new = [text for text in chunk_df["content_chunk"] if text not in self.chunks]
+        self.chunks.update(dict.fromkeys(new, True))
+        return {"inserted": len(new), "skipped": len(chunk_df) - len(new)}
+
+
+@pytest.fixture
+def chunked(monkeypatch):
+    """One chunk per page, logging the report date of every chunked filing."""
+    calls = []
+
+    async def chunk_text(text_df, company_name, form_type, report_date, min_tokens=0):
+        calls.append(report_date)
+        return pd.DataFrame({
+            "company_name": company_name,
+            "form_type": form_type,
+            "date": report_date,
+            "page_number": text_df["page_number"].to_numpy(),
+            "content_chunk": text_df["content"].str.strip().to_numpy(),
+        })
+
+    monkeypatch.setattr(preprocessor, "chunk_text", chunk_text)
+    return calls
+
+
+def make_pipeline(tmp_path, db: FakeDb, broken: bool = False, parse_executor=None) -> StreamingPipeline:
+    """A fresh processor and pipeline over the state a previous run left in `tmp_path`, as after a restart."""
+    processor = SECDataProcessor(
+        "aapl",
+        incremental=True,
+        sync_state=SyncState(str(tmp_path / "sync_state.json")),
+        embed_model=FakeEmbedding(broken),
+        use_embedding_cache=False,
+        near_duplicates=NearDuplicateIndex(path=str(tmp_path / "dedup")),
+        sec_api=FakeApi(),
+        parse_executor=parse_executor,
+    )
+    return StreamingPipeline(processor, db, manifest=RunManifest(CIK, root=str(tmp_path / "runs")))
+
+
+def test_crashed_run_resumes_from_checkpoints(tmp_path, chunked):
+    db = FakeDb()
+
+    with pytest.raises(RuntimeError, match="embedding model crashed"):
+        asyncio.run(make_pipeline(tmp_path, db, broken=True).run())
+
+    manifest = RunManifest(CIK, root=str(tmp_path / "runs"))
+    stages = {accession: manifest.stage(accession) for accession in FILINGS}
+    assert db.chunks == {} and all(0 <= stage < STORED for stage in stages.values())
+    assert NearDuplicateIndex(path=str(tmp_path / "dedup")).ids == []
+
+    chunked.clear()
+    pipeline = make_pipeline(tmp_path, db)
+    asyncio.run(pipeline.run())
+
+    # Nothing checkpointed is downloaded or chunked again
+    assert pipeline.processor.sec_api.fetched == []
+    assert len(chunked) == sum(stage < CHUNKED for stage in stages.values())
+
+    texts = [text for pages in FILINGS.values() for text in pages]
+    assert sorted(db.chunks) == sorted(texts)
+    assert (pipeline.chunks, pipeline.inserted) == (4, 4)
+    assert SyncState(str(tmp_path / "sync_state.json")).ingested(CIK) == set(FILINGS)
+    assert RunManifest(CIK, root=str(tmp_path / "runs")).pending() == {}
+    # Chunks of filings resumed after chunking are still indexed against future near-duplicates
+    assert sorted(NearDuplicateIndex(path=str(tmp_path / "dedup")).ids) == sorted(chunk_id(text) for text in texts)
+
+
+def test_filings_are_parsed_in_parallel_in_the_executor(tmp_path, monkeypatch, chunked):
+    parse_filing_columns = preprocessor.parse_filing_columns
+    lock = threading.Lock()
+    running = []
+    overlap = []
+
+    def slow_parse(*args):
+        with lock:
+            running.append(1)
+            overlap.append(len(running))
+        time.sleep(0.2)
+        try:
+            return parse_filing_columns(*args)
+        finally:
+            with lock:
+                running.pop()
+
+    monkeypatch.setattr(preprocessor, "parse_filing_columns", slow_parse)
+    db = FakeDb()
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pipeline = make_pipeline(tmp_path, db, parse_executor=executor)
+        asyncio.run(pipeline.run())
+
+    assert max(overlap) == len(FILINGS)
+    assert len(db.chunks) == 4
+    assert pipeline.processor.processed_accessions == list(FILINGS)
+
+
+def test_batch_ingestor_resumes_from_checkpoints(tmp_path, monkeypatch, chunked):
+    pytest.importorskip("llama_index.core")
+    from llama_index.core.embeddings import MockEmbedding
+    from src.batch import BatchIngestor
+
+    class BatchEmbedding(MockEmbedding):
+        broken: bool = False
+        _model_name: str = "mock"
+        _instruction: str = ""
+
+        def _get_text_embeddings(self, texts):
+            if self.broken:
+                raise RuntimeError("embedding model crashed")
+            return super()._get_text_embeddings(texts)
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("HEADERS", '{"User-Agent": "test test@example.com"}')
+    api = FakeApi()
+
+    class Ingestor(BatchIngestor):
+        def _processor(self, ticker):
+            return SECDataProcessor(
+                ticker,
+                incremental=True,
+                sync_state=self.sync_state,
+                embed_model=self.embed_model,
+                use_embedding_cache=False,
+                near_duplicates=self.near_duplicates,
+                sec_api=api,
+            )
+
+    def ingest(embed_model) -> pd.DataFrame:
+        ingestor = Ingestor(embed_model=embed_model, db=db)
+        try:
+            return asyncio.run(ingestor.run(["aapl"]))
+        finally:
+            ingestor.close()
+
+    db = FakeDb()
+    first = ingest(BatchEmbedding(embed_dim=4, broken=True))
+    assert first.loc[0, "status"] == "failed"
+
+    api.fetched.clear()
+    second = ingest(BatchEmbedding(embed_dim=4))
+
+    assert second.loc[0, ["status", "filings", "chunks", "inserted"]].tolist() == ["ok", 2, 4, 4]
+    assert api.fetched == []
+    assert len(db.chunks) == 4
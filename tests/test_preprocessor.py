@@ -0,0 +1,17 @@
+import numpy as np
+import pandas as pd
+from analysis.preprocessor import compact_chunks
+
+
+def test_compact_chunks_keeps_missing_metadata_missing():
+    chunk_df = compact_chunks(pd.DataFrame({
+        "company_name": ["aapl", "aapl", "msft"],
+        "date": ["2024-09-28", None, np.nan],
+        "page_number": [1, 2, 3],
+        "content_chunk": ["a", "b", "c"],
+    }))
+
+    assert chunk_df["company_name"].cat.categories.tolist() == ["aapl", "msft"]
+    assert chunk_df["date"].cat.categories.tolist() == ["2024-09-28"]
+    assert chunk_df["date"].isna().tolist() == [False, True, True]
+    assert chunk_df["page_number"].dtype == np.int32
@@ -0,0 +1,56 @@
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from src.query_filters import parse_filters
+
+
+KNOWN = {"aapl", "msft", "mstr", "net", "cash", "key", "low", "s", "t"}
+
+
+@pytest.mark.parametrize("query, tickers", [
+    ("Microsoft risk factors in the latest 10-K", []),
+    ("Apple revenue in 2024", []),
+    ("MicroStrategy", []),
+    ("What did Microsoft say about AI?", []),
+    ("Compare AAPL with NVDA", ["aapl"]),
+])
+def test_unresolved_company_names_are_ambiguous(query, tickers):
+    parsed = parse_filters(query, KNOWN)
+
+    assert parsed.tickers == tickers
+    assert parsed.ambiguous
+
+
+@pytest.mark.parametrize("query, tickers", [
+    ("AAPL net income in 2024", ["aapl"]),
+    ("MSFT cash flow in the latest 10-K", ["msft"]),
+    ("What are the key risks in the low margin segment of MSTR?", ["mstr"]),
+    ("NET revenue in 2024", ["net"]),
+    ("$cash operating margin", ["cash"]),
+    ("Summarize the Risk Factors of aapl", ["aapl"]),
+    ("What is AAPL's revenue in 2024?", ["aapl"]),
+    ("Why don't margins at MSFT improve?", ["msft"]),
+    ("MSFT weight in the S&P 500", ["msft"]),
+    ("T dividend in 2024", ["t"]),
+])
+def test_finance_words_are_tickers_only_when_marked(query, tickers):
+    parsed = parse_filters(query, KNOWN)
+
+    assert parsed.tickers == tickers
+    assert not parsed.ambiguous
+
+
+def test_fast_path_filters():
+    parsed = parse_filters("AAPL revenue in the 10-K for fiscal 2024", KNOWN)
+
+    assert (parsed.tickers, parsed.forms, parsed.years, parsed.ambiguous) == (["aapl"], ["10-K"], [2024], False)
+
+
+@pytest.mark.parametrize("query", [
+    "AAPL iPhone revenue in Europe",
+    "AAPL R&D spending in the 10-K",
+    "MSFT EPS in FY 2024 per the SEC filing",
+])
+def test_names_next_to_a_ticker_are_not_ambiguous(query):
+    assert not parse_filters(query, KNOWN).ambiguous
@@ -0,0 +1,121 @@
+import json
+import time
+import asyncio
+from http.server import BaseHTTPRequestHandler
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("llama_index.llms.ollama")
+
+from llama_index.core.embeddings import MockEmbedding
+from src.database import vectordb
+
+
+class SlowEmbedding(MockEmbedding):
+    """Query embedding that blocks like a real model on CPU."""
+    def _get_query_embedding(self, query: str) -> list[float]:
+        time.sleep(0.3)
+        return super()._get_query_embedding(query)
+
+
+def make_ollama_handler(tokens: list[str], delay: float, requests: list):
+    """Handler streaming `tokens` from /api/chat as Ollama does, one NDJSON line every `delay` seconds. Chat requests are logged to `requests`."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            if self.path == "/api/show":
+                # Asked for the context window when the query engine is built
+                payload = json.dumps({"model_info": {"llama.context_length": 8192}}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+                return
+
+            requests.append(body)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+
+            lines = [{"message": {"role": "assistant", "content": token}, "done": False} for token in tokens]
+            lines.append({"message": {"role": "assistant", "content": ""}, "done": True, "done_reason": "stop"})
+            try:
+                for line in lines:
+                    time.sleep(delay)
+                    self.wfile.write((json.dumps({"model": "llama3.2", "created_at": "2024-11-01T00:00:00Z", **line}) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def make_db(url: str, embed_model=None) -> vectordb:
+    embed_model = embed_model or MockEmbedding(embed_dim=8)
+    # No context packing, its tokenizer would be downloaded
+    db = vectordb(embed_model, llm_base_url=url, context_token_budget=0)
+    chunk_df = pd.DataFrame({
+        "company_name": ["aapl", "msft"],
+        "form_type": ["10-K", "10-K"],
+        "date": ["2024-09-28", "2024-06-30"],
+        "page_number": [1, 1],
+        "content_chunk": ["Net sales increased due to iPhone demand.", "Cloud revenue grew."],
+    })
+    db.store_embeddings(chunk_df, np.ones((2, 8), dtype=np.float32))
+    return db
+
+
+async def collect(db: vectordb, query: str, timeout: float = None) -> tuple[list[str], int]:
+    """Stream `query`, counting how often the event loop got to run meanwhile."""
+    ticks = 0
+    done = False
+
+    async def tick():
+        nonlocal ticks
+        while not done:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    try:
+        tokens = [token async for token in db.astream_query(query, timeout=timeout)]
+    finally:
+        done = True
+        await ticker
+    return tokens, ticks
+
+
+def test_stream_query_yields_tokens_without_blocking_the_loop(http_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    requests = []
+    url = http_server(make_ollama_handler(["Net ", "sales ", "grew."], 0.05, requests))
+    db = make_db(url, SlowEmbedding(embed_dim=8))
+
+    tokens, ticks = asyncio.run(collect(db, "What drove AAPL net sales in the 10-K?"))
+
+    assert tokens == ["Net ", "sales ", "grew."]
+    assert "iPhone demand" in requests[0]["messages"][-1]["content"]
+    # Other tasks keep running through 0.3s of query embedding and 0.2s of streaming; a blocked loop only ticks while streaming
+    assert ticks >= 40
+    stats = db.last_stream_stats
+    assert stats["completed"] and stats["chunks"] == 3
+    assert 0.3 <= stats["time_to_first_token"] < stats["seconds"]
+
+
+def test_stream_query_times_out(http_server, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    url = http_server(make_ollama_handler(["late"], 2.0, []))
+    db = make_db(url)
+
+    start = time.perf_counter()
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(collect(db, "What drove AAPL net sales?", timeout=0.5))
+
+    assert time.perf_counter() - start < 1.5
+    assert not db.last_stream_stats["completed"]
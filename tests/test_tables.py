@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from analysis.tables import parse_period, reconstruct, to_frame
+from src.table_store import TableStore
+
+
+def cells(rows: list[list[str]], date: str = "2024-09-28", accession_number: str = "0000320193-24-000123") -> pd.DataFrame:
+    """Long-format table_df of one table, as parse_filing produces it."""
+    return pd.DataFrame(
+        [(0, r, c, text) for r, row in enumerate(rows) for c, text in enumerate(row)],
+        columns=["table_number", "row", "column", "data"],
+    ).assign(company_name="aapl", form_type="10-K", date=date, accession_number=accession_number)
+
+
+STATEMENT = [
+    ["", "2024", "", "2023"],
+    ["Net sales", "$", "391,035", "$", "383,285"],
+    ["Goodwill impairment", "—", "", "$", "1,200"],
+    ["Other income/(expense), net", "(", "269", ")", "(565)"],
+]
+
+
+def test_reconstruct_keeps_value_positions():
+    rows = reconstruct(cells(STATEMENT))
+
+    assert rows["header"].tolist() == [True, False, False, False]
+    assert rows["width"].tolist() == [2, 2, 2, 2]
+    np.testing.assert_array_equal(rows[["value_0", "value_1"]].to_numpy()[1:], [[391035, 383285], [np.nan, 1200], [-269, -565]])
+    assert rows[["column_0", "column_1"]].to_numpy().tolist() == [["2024", "2023"]] * 4
+
+
+def test_header_years_are_labels_not_values():
+    frame = to_frame(reconstruct(cells(STATEMENT)))
+
+    assert frame.columns.tolist() == ["2024", "2023"]
+    assert frame.index.tolist() == ["Net sales", "Goodwill impairment", "Other income/(expense), net"]
+    assert np.isnan(frame.loc["Goodwill impairment", "2024"])
+
+
+def test_parse_period():
+    assert parse_period("Fiscal 2024") == (2024, None)
+    assert parse_period("Sept. 28, 2024") == (2024, 9)
+    assert parse_period("391,035") is None
+    assert parse_period("Net sales") is None
+
+
+def test_store_reads_filings_of_different_widths(tmp_path):
+    store = TableStore(root=str(tmp_path))
+    store.write(cells(STATEMENT))
+    store.write(cells([["", "2023", "2022", "2021"], ["Net sales", "383,285", "394,328", "365,817"]], "2023-09-30", "0000320193-23-000106"))
+
+    rows = store.read(ticker="aapl")
+    assert rows["value_2"].notna().sum() == 1
+    assert store.table("aapl", "0000320193-23-000106", 0).loc["Net sales"].tolist() == [383285, 394328, 365817]
+    assert store.table("aapl", "0000320193-24-000123", 0).columns.tolist() == ["2024", "2023"]
@@ -0,0 +1,30 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import IO, Iterator
+
+
+@contextmanager
+def atomic_write(path: str, mode: str = "wb", fsync: bool = False) -> Iterator[IO]:
+    """
+    Write `path` atomically: yields a temp file in the same directory, which
+    replaces `path` once the block exits cleanly, so readers only ever see the
+    old or the new file. The temp file is removed if the block raises.
+
+    Text modes are utf-8. With `fsync` the data is flushed to disk before the rename.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # "_" prefix keeps temp files out of pyarrow dataset discovery
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix="_", suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else "utf-8") as f:
+            yield f
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise